@@ -0,0 +1,147 @@
+# Authored by Athena Osborne
+# Content addressed on-disk cache of finished layouts, so re-running a seed with the same scene and engine parameters is instant.
+# Safe to share between worker processes: entries are written atomically and eviction tolerates entries vanishing underneath it.
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Callable
+from Generation import RoomGraph
+from Physics import Engine, SoftBody
+
+def bodyDefinition(b: SoftBody) -> list:
+    '''
+    Everything that determines how a body behaves: its starting point positions and every constraint
+    '''
+    return [[[p.position.x, p.position.y, p.velocity.x, p.velocity.y] for p in b.points],
+            [[c.index0, c.index1, c.distance, c.hard, c.springConst] for c in b.outerConstraints],
+            [[c.index0, c.index1, c.distance, c.hard, c.springConst] for c in b.innerConstraints]]
+
+def engineDefinition(e: Engine) -> dict:
+    '''
+    Every parameter of the engine which changes its results, including its bodies and walls
+    '''
+    return {"elasticity": e.elasticity, "friction": e.friction, "springDamping": e.springDamping,
+            "WIDTH": e.WIDTH, "HEIGHT": e.HEIGHT, "substeps": e.substeps, "minSubsteps": e.minSubsteps,
+            "warmStart": e.warmStart, "settledDepth": e.settledDepth, "solver": e.solver, "xpbdIterations": e.xpbdIterations,
+            "implicitIterations": e.implicitIterations, "implicitTolerance": e.implicitTolerance,
+            "xpbdRelaxation": e.xpbdRelaxation, "hardCompliance": e.hardCompliance, "wakeDepth": e.wakeDepth, "sleepSpeed": e.sleepSpeed, "sleepSteps": e.sleepSteps,
+            "walls": [[w.pos0.x, w.pos0.y, w.pos1.x, w.pos1.y, w.radius] for w in e.walls],
+            "bodies": [bodyDefinition(b) for b in e.softBodies]}
+
+def cacheKey(seed: int, G: RoomGraph | None, e: Engine, extra: dict | None = None) -> str:
+    '''
+    Hashes the seed, room graph and engine (which must not have been stepped yet) into a cache key.
+
+    Parameters
+    ----------
+    extra : dict | None (Default = None)
+        Anything else which changes the result, such as the step budget or convergence criteria
+    '''
+    content = {"seed": seed,
+               "graph": None if G == None else {"rooms": [G.names[t] for t in G.types], "edges": G.edges()},
+               "engine": engineDefinition(e),
+               "extra": extra}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def graphKey(G: RoomGraph, e: Engine, extra: dict | None = None) -> str:
+    '''
+    Hashes the room graph up to room numbering (RoomGraph.canonicalHash) and the engine's settings into a cache key shared
+    by every job laying out the same graph, whatever its seed. Where the bodies start is left out since it only follows
+    from the seed and graph. Different graphs can share a hash, so entries under the key hold a list of layout records
+    ({"layouts": [...]}): find the one whose graph RoomGraph.matchTo confirms is a relabelling of G, renumber it with
+    Export.relabelRecord, and append to the list on a miss.
+    '''
+    settings = engineDefinition(e)
+    del settings["bodies"]
+    content = {"graph": G.canonicalHash(),
+               "engine": settings,
+               "extra": extra}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class LayoutCache:
+    '''
+    Directory of layout records, one JSON file per key, with least recently used eviction once the directory grows past maxBytes.
+    File modification times act as the LRU clock: reading an entry touches it.
+    '''
+
+    def __init__(self, directory: str, maxBytes: int = 256 << 20):
+        self.directory: str = directory
+        self.maxBytes: int = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> dict | None:
+        '''
+        Returns the stored record for the key, or None if there isn't one
+        '''
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                record = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return record
+
+    def put(self, key: str, record: dict):
+        '''
+        Stores the record under the key. The record is written to a temporary file and renamed into place, so other
+        processes only ever see the old entry or the complete new one.
+        '''
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(record, separators=(",", ":")).encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, path)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        '''
+        Deletes the least recently used entries until the cache fits in maxBytes
+        '''
+        entries: list[tuple[float, int, str]] = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # Another worker evicted it first
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(e[1] for e in entries)
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def getOrCompute(self, key: str, compute: Callable[[], dict]) -> dict:
+        '''
+        Returns the stored record for the key, calling compute and storing its result on a miss
+        '''
+        record = self.get(key)
+        if record == None:
+            record = compute()
+            self.put(key, record)
+        return record
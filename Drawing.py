@@ -0,0 +1,62 @@
+# Authored by Athena Osborne
+# Drawing an Engine onto a surface, shared by the interactive viewer and headless recording
+
+import pygame as pg
+from Physics import Engine, PointMass
+
+def drawEngine(e: Engine, window):
+
+    for b in e.softBodies:
+
+        for c in b.innerConstraints: # Loop to draw inner constraints as single lines
+        
+            # Get points so we can grab their position and also calculate the distance between them
+            point0: PointMass = e.points[c.index0]
+            point1: PointMass = e.points[c.index1]
+
+            if c.hard: # The coloring procedure we want to use for hard constraints
+                deltaLength = (point0.position - point1.position).length()
+                # Use the distance to scale the color of the constraint from 0 to 1: 
+                # 0 is as close together as possible (GREEN) (not possible because they'd be inside each other)
+                # 1 is as far apart as possible (RED)
+                colorScale = deltaLength/c.distance
+                if colorScale > 1: colorScale = 1
+                #print(colorScale)
+                # Draw a line from point0 to point1, colored according to how close they are to violating the constraint
+                pg.draw.aaline(window, (int(255*colorScale), int(255*(1-colorScale)), 0), point0.position, point1.position)
+            else:
+                deltaLength = (point0.position - point1.position).length()
+                # Use the distance to scale the color of the constraint along the parabola.
+                # 2 * c.distance is max, 0 is also max, c.distance is min
+                colorScale = (((deltaLength - c.distance) * (1/c.distance))  ** 2)
+                if colorScale > 1: colorScale = 1 # Cap the value at 1
+                
+                # Draw a line from point0 to point1, colored according to how far away from neutral they are
+                pg.draw.aaline(window, (50, 50, int(255 * colorScale)), point0.position, point1.position)
+
+        for c in b.outerConstraints: # Loop to draw the outer constraints as a filled
+            
+            # Get points so we can grab their position and also calculate the distance between them
+            point0: PointMass = e.points[c.index0]
+            point1: PointMass = e.points[c.index1]
+
+            offset: pg.Vector2 = (point1.position - point0.position).rotate(90) # Grab the delta between them rotate that delta 90 degrees to get the offset vector
+            offset.scale_to_length(point0.radius * 0.7) # Scale the offset to nearly the radius length
+
+            # Create the four points based on the position +/- the offset
+            point0L: pg.Vector2 = point0.position + offset
+            point0R: pg.Vector2 = point0.position - offset
+            point1L: pg.Vector2 = point1.position - offset
+            point1R: pg.Vector2 = point1.position + offset
+
+            # Draw the two lines
+            pg.draw.aaline(window, (0,0,0), point0L, point1R)
+            pg.draw.polygon(window, b.color, [point0L, point0R, point1L, point1R])
+
+    for p in e.points: # Loop to draw each point
+        #print(str(p) + " @ " + str(p.position))
+        pg.draw.circle(window, (0, 0, 0), p.position, p.radius)
+
+    ids, targets = e.dragTargets()
+    for i, target in zip(ids, targets): # Draw each dragged point's spring to where it's being dragged
+        pg.draw.aaline(window, (255, 0, 0), e.points[i].position, (float(target[0]), float(target[1])))
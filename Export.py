@@ -0,0 +1,177 @@
+# Authored by Athena Osborne
+# Streams finished layouts to disk one at a time, as JSON Lines or a compact binary format.
+# Both formats keep a sidecar index (<path>.idx) of little-endian uint64 record offsets so single layouts can be read without parsing the whole file.
+
+import json
+import struct
+import numpy as np
+from Generation import RoomGraph
+from Partition import Partition
+from Physics import Metrics
+
+BUFFER_SIZE = 1 << 20
+BINARY_MAGIC = b"SBLAYOUT1\n"
+
+# seed, rooms, edges, vertices, kineticEnergy, maxPenetration, strain, steps
+BINARY_HEADER = struct.Struct("<qIIIdddd")
+
+def layoutRecord(seed: int, G: RoomGraph, partition: Partition, metrics: Metrics | None = None, steps: int = 0) -> dict:
+    '''
+    Bundles a finished layout into the dict both formats store. Room n of the graph is polygon n.
+    '''
+    record = {"seed": seed,
+              "rooms": [G.names[t] for t in G.types],
+              "edges": [list(e) for e in G.edges()],
+              "polygons": [p.tolist() for p in partition.polygons],
+              "metrics": {"kineticEnergy": 0.0, "maxPenetration": 0.0, "strain": 0.0, "steps": steps}}
+    if metrics != None:
+        record["metrics"].update(kineticEnergy=metrics.kineticEnergy, maxPenetration=metrics.maxPenetration, strain=metrics.strain)
+    return record
+
+def relabelRecord(record: dict, mapping: dict[int, int], seed: int, G: RoomGraph) -> dict:
+    '''
+    Reuses a layout record for G, a relabelling of the record's room graph, under another seed.
+    mapping is which room of G each of the record's rooms is (see RoomGraph.matchTo); polygons move to G's numbering.
+    '''
+    polygons: list = [None] * len(record["polygons"])
+    for room, match in mapping.items():
+        polygons[match] = record["polygons"][room]
+    return {**record,
+            "seed": seed,
+            "rooms": [G.names[t] for t in G.types],
+            "edges": [list(e) for e in G.edges()],
+            "polygons": polygons}
+
+class LayoutWriter:
+    '''
+    Base for the streaming writers. Records are written as soon as write() is called (through a buffer), and only
+    the current record is ever held in memory.
+    '''
+
+    def __init__(self, path: str, append: bool = False):
+        self.path: str = path
+        mode = "ab" if append else "wb"
+        self.file = open(path, mode, buffering=BUFFER_SIZE)
+        self.index = open(path + ".idx", mode, buffering=BUFFER_SIZE)
+        if not append or self.file.tell() == 0:
+            self.writeHeader()
+
+    def writeHeader(self):
+        pass
+
+    def encode(self, record: dict) -> bytes:
+        raise NotImplementedError
+
+    def write(self, record: dict):
+        self.index.write(struct.pack("<Q", self.file.tell()))
+        self.file.write(self.encode(record))
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class JsonlWriter(LayoutWriter):
+
+    def encode(self, record: dict) -> bytes:
+        return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+class BinaryWriter(LayoutWriter):
+    '''
+    Each record is a uint32 byte length followed by a fixed header, the room names, then its columns:
+    edges as uint32 pairs, ring lengths as uint32 and every polygon's vertices back to back as float32 pairs.
+    '''
+
+    def writeHeader(self):
+        self.file.write(BINARY_MAGIC)
+
+    def encode(self, record: dict) -> bytes:
+        names = "\n".join(record["rooms"]).encode()
+        edges = np.asarray(record["edges"], dtype="<u4").reshape(-1, 2)
+        ringLengths = np.array([len(p) for p in record["polygons"]], dtype="<u4")
+        vertices = np.concatenate([np.asarray(p, dtype="<f4").reshape(-1, 2) for p in record["polygons"]]) if len(record["polygons"]) > 0 else np.zeros((0, 2), dtype="<f4")
+        m = record["metrics"]
+
+        body = b"".join((BINARY_HEADER.pack(record["seed"], len(record["rooms"]), len(edges), len(vertices),
+                                            m["kineticEnergy"], m["maxPenetration"], m["strain"], m["steps"]),
+                         struct.pack("<I", len(names)), names,
+                         edges.tobytes(), ringLengths.tobytes(), vertices.astype("<f4").tobytes()))
+        return struct.pack("<I", len(body)) + body
+
+def decodeBinary(body: bytes) -> dict:
+    seed, rooms, edgeCount, vertexCount, kineticEnergy, maxPenetration, strain, steps = BINARY_HEADER.unpack_from(body, 0)
+    at = BINARY_HEADER.size
+    nameLength, = struct.unpack_from("<I", body, at)
+    at += 4
+    names = body[at:at + nameLength].decode().split("\n") if rooms > 0 else []
+    at += nameLength
+    edges = np.frombuffer(body, dtype="<u4", count=edgeCount * 2, offset=at).reshape(-1, 2)
+    at += edges.nbytes
+    ringLengths = np.frombuffer(body, dtype="<u4", count=rooms, offset=at)
+    at += ringLengths.nbytes
+    vertices = np.frombuffer(body, dtype="<f4", count=vertexCount * 2, offset=at).reshape(-1, 2)
+    polygons = np.split(vertices, np.cumsum(ringLengths)[:-1]) if rooms > 0 else []
+    return {"seed": seed, "rooms": names, "edges": edges.tolist(), "polygons": [p.tolist() for p in polygons],
+            "metrics": {"kineticEnergy": kineticEnergy, "maxPenetration": maxPenetration, "strain": strain, "steps": int(steps)}}
+
+def isBinary(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+def openWriter(path: str, append: bool = False) -> LayoutWriter:
+    '''
+    Opens a JsonlWriter for .jsonl paths and a BinaryWriter for anything else
+    '''
+    if path.endswith(".jsonl"):
+        return JsonlWriter(path, append)
+    return BinaryWriter(path, append)
+
+def count(path: str) -> int:
+    '''
+    How many layouts the file holds, from its index
+    '''
+    with open(path + ".idx", "rb") as f:
+        f.seek(0, 2)
+        return f.tell() // 8
+
+def readLayout(path: str, i: int) -> dict:
+    '''
+    Reads only the i-th layout in the file, seeking straight to it through the index
+    '''
+    with open(path + ".idx", "rb") as f:
+        f.seek(i * 8)
+        offset, = struct.unpack("<Q", f.read(8))
+    binary = isBinary(path)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        if binary:
+            length, = struct.unpack("<I", f.read(4))
+            return decodeBinary(f.read(length))
+        return json.loads(f.readline())
+
+def readLayouts(path: str):
+    '''
+    Yields every layout in the file in order, one at a time
+    '''
+    binary = isBinary(path)
+    with open(path, "rb", buffering=BUFFER_SIZE) as f:
+        if binary:
+            f.seek(len(BINARY_MAGIC))
+            while True:
+                header = f.read(4)
+                if len(header) < 4:
+                    return
+                length, = struct.unpack("<I", header)
+                yield decodeBinary(f.read(length))
+        else:
+            for line in f:
+                yield json.loads(line)
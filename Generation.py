@@ -1,16 +1,222 @@
 import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher, categorical_node_match
+import random
+import hashlib
+import zlib
+from collections import deque
+from typing import Callable
+import Room
 
 # Authored by Athena Osborne
 
+def bits(mask: int):
+    '''
+    Yields the index of every set bit in the provided mask, lowest first
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class RoomGraph:
+    '''
+    A generated room structure. Rooms are numbered in the order they were placed (the anchor is room 0), and each room's neighbours are stored as a bitmask over room numbers.
+    '''
+
+    def __init__(self, names: list[str]):
+        self.names: list[str] = names # Type names, indexed by type ID. Shared with the Generation that made this graph
+        self.types: list[int] = [] # The type ID of each room
+        self.adjacency: list[int] = [] # Bitmask of each room's neighbours
+
+    def __len__(self):
+        return len(self.types)
+
+    def __str__(self):
+        return str([self.names[t] for t in self.types]) + " " + str(self.edges())
+
+    def addRoom(self, roomType: int) -> int:
+        '''
+        Adds a room of the provided type ID and returns its room number
+        '''
+        self.types.append(roomType)
+        self.adjacency.append(0)
+        return len(self.types) - 1
+
+    def connect(self, room0: int, room1: int):
+        self.adjacency[room0] |= 1 << room1
+        self.adjacency[room1] |= 1 << room0
+
+    def edges(self) -> list[tuple[int, int]]:
+        '''
+        Returns every connection as a (lower, higher) pair of room numbers
+        '''
+        return [(a, b) for a in range(len(self.types)) for b in bits(self.adjacency[a] >> (a + 1) << (a + 1))]
+
+    def toNetworkx(self) -> nx.Graph:
+        '''
+        Exports the graph as an nx.Graph whose nodes are room numbers with a "type" attribute holding the type name
+        '''
+        G = nx.Graph()
+        G.add_nodes_from((i, {"type": self.names[t]}) for i, t in enumerate(self.types))
+        G.add_edges_from(self.edges())
+        return G
+
+    def canonicalHash(self, iterations: int = 3) -> str:
+        '''
+        Weisfeiler-Lehman hash of the graph with rooms labelled by type name. Graphs that are the same up to relabelling of
+        their rooms always hash the same. Different graphs almost never do, but use matchTo to confirm.
+        '''
+        # Start every room off with a colour from its type name (crc32 rather than hash() so it's stable between processes)
+        colours: list[int] = [zlib.crc32(self.names[t].encode()) for t in self.types]
+        for i in range(iterations):
+            # Recolour each room from its own colour and the sorted colours of its neighbours
+            colours = [hash((colours[r], tuple(sorted(colours[n] for n in bits(self.adjacency[r]))))) for r in range(len(colours))]
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str((len(self.types), sorted(colours))).encode())
+        return digest.hexdigest()
+
+    def matchTo(self, other: "RoomGraph") -> dict[int, int] | None:
+        '''
+        Exactly checks whether the other graph is this one with its rooms relabelled.
+
+        Returns
+        -------
+        dict[int, int] | None
+            Which room in other each room in this graph corresponds to, or None if the graphs differ
+        '''
+        if len(self) != len(other) or sorted(self.names[t] for t in self.types) != sorted(other.names[t] for t in other.types):
+            return None
+        matcher = GraphMatcher(self.toNetworkx(), other.toNetworkx(), node_match=categorical_node_match("type", None))
+        if matcher.is_isomorphic():
+            return matcher.mapping
+        return None
+
+def relabelRooms(layout: list, mapping: dict[int, int]) -> list:
+    '''
+    Reorders a layout with one entry per room so that the entry of each stored room moves to the room it maps to (see RoomGraph.matchTo)
+    '''
+    relabelled: list = [None] * len(layout)
+    for room, match in mapping.items():
+        relabelled[match] = layout[room]
+    return relabelled
+
+class GraphDedup:
+    '''
+    Remembers the layout of every room graph simulated so far so that graphs which only differ by room numbering are simulated once.
+    By default a layout is a list with one entry per room (a polygon, a position, etc.), indexed by room number. Anything else
+    (such as a whole layout record) can be stored if lookup and get are given a relabel function for it.
+    '''
+
+    def __init__(self):
+        self.buckets: dict[str, list[tuple[RoomGraph, object]]] = {} # Stored graphs and their layouts, by canonical hash
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def lookup(self, G: RoomGraph, relabel: Callable[[object, dict[int, int]], object] = relabelRooms) -> object | None:
+        '''
+        Returns the stored layout for a graph matching G, renumbered to G's rooms by relabel, or None if no such graph has been stored
+        '''
+        for stored, layout in self.buckets.get(G.canonicalHash(), []):
+            mapping = stored.matchTo(G)
+            if mapping != None:
+                return relabel(layout, mapping)
+        return None
+
+    def store(self, G: RoomGraph, layout: object):
+        self.buckets.setdefault(G.canonicalHash(), []).append((G, layout))
+
+    def get(self, G: RoomGraph, simulate: Callable[[RoomGraph], object], relabel: Callable[[object, dict[int, int]], object] = relabelRooms) -> object:
+        '''
+        Returns the layout for G, only calling simulate (and storing its result) if no matching graph has been seen before
+        '''
+        layout = self.lookup(G, relabel)
+        if layout != None:
+            self.hits += 1
+            return layout
+        self.misses += 1
+        layout = simulate(G)
+        self.store(G, layout)
+        return layout
+
 class Generation:
     
-    def __init__(self, Adj: nx.Graph, capacity: int, anchor: str):
+    def __init__(self, Adj: nx.Graph, capacity: int, anchor: str, branching: float = 0.5, magicNum: int = 25):
+        '''
+        Compiles the allowed adjacency graph into integer type IDs and bitmasks, narrowed by the attaching rooms in each type's Statistic,
+        and looks up how many of each type are allowed, so that generate() never touches networkx or the Statistic table.
 
-        # Initialize an nx graph to put our room nodes into. This is the room structure we are generating
-        G = nx.Graph()
-        G.add_node(anchor)
+        Parameters
+        ----------
+        Adj : nx.Graph
+            Graph of which room types are allowed to be adjacent to each other. Of two types in Room.ROOM_NAMES, only those
+            where at least one's Statistic attaches the other are kept
+        capacity : int
+            The most rooms a generated graph can have
+        anchor : str
+            The type of the room every graph grows from
+        branching : float (Default = 0.5)
+            The chance that each allowed neighbour type is rolled onto a room as it's expanded
+        magicNum : int (Default = 25)
+            Passed to Room.bounds to find the most rooms of each type. Types missing from Room.ROOM_NAMES are limited to one
+        '''
+        self.names: list[str] = list(Adj.nodes)
+        self.ids: dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.allowed: list[int] = [0] * len(self.names) # Bitmask of the types each type is allowed to be adjacent to
+        for a, b in Adj.edges:
+            if a in Room.ROOM_NAMES and b in Room.ROOM_NAMES and not Room.canAttach(Room.ROOM_NAMES[a], Room.ROOM_NAMES[b]):
+                continue # Ruled out by the Statistic table
+            self.allowed[self.ids[a]] |= 1 << self.ids[b]
+            self.allowed[self.ids[b]] |= 1 << self.ids[a]
+        self.capacity: int = capacity
+        self.anchor: int = self.ids[anchor]
+        self.branching: float = branching
 
-def main():
+        _, maxs = Room.bounds(magicNum)
+        self.maxCounts: list[int] = [int(maxs[Room.ROOM_NAMES[name].typeID]) if name in Room.ROOM_NAMES else 1 for name in self.names]
+
+    def generate(self, seed: int | None = None) -> RoomGraph:
+        '''
+        Grows a room graph breadth first from the anchor. Each room rolls the allowed types which haven't reached their maximum count yet,
+        and each new room is also connected to any neighbour of its parent that it is allowed to be adjacent to.
+        '''
+        rng = random.Random(seed)
+        G = RoomGraph(self.names)
+        G.addRoom(self.anchor)
+        counts: list[int] = [0] * len(self.names)
+        counts[self.anchor] = 1
+        full: int = 0 # Bitmask of the types which have reached their maximum count
+        for t in range(len(self.names)):
+            if counts[t] >= self.maxCounts[t]:
+                full |= 1 << t
+
+        queue: deque[int] = deque([0])
+        while queue and len(G) < self.capacity:
+            parent = queue.popleft()
+            candidates = list(bits(self.allowed[G.types[parent]] & ~full))
+            rng.shuffle(candidates)
+
+            for t in candidates:
+                if len(G) >= self.capacity:
+                    break
+                if rng.random() >= self.branching:
+                    continue
+
+                room = G.addRoom(t)
+                counts[t] += 1
+                if counts[t] >= self.maxCounts[t]:
+                    full |= 1 << t
+                G.connect(parent, room)
+                for sibling in bits(G.adjacency[parent]):
+                    if self.allowed[t] >> G.types[sibling] & 1:
+                        G.connect(room, sibling)
+                queue.append(room)
+
+        return G
+
+def defaultAdjacency() -> nx.Graph:
+    '''
+    The allowed adjacency graph for a 17 room house
+    '''
     Adj = nx.Graph()
     Adj.add_nodes_from(["FOYER", "DINING", "LIVING", "FULLBATH", "HALFBATH", "MASTERBED", 
                         "BEDROOM", "GUESTBED", "OFFICE", "KITCHEN", "FAMILY", "GAME", "GARAGE", 
@@ -29,6 +235,17 @@ def main():
                         ("GARAGE", "GYM"), ("GARAGE", "LAUNDRY"), ("GARAGE", "UTILITY"),
                         ("GYM", "LAUNDRY"), ("GYM", "UTILITY"),
                         ("LAUNDRY", "UTILITY")])
+    return Adj
+
+def main():
+    Adj = defaultAdjacency()
+
+    gen = Generation(Adj, 17, "FOYER")
+    print(gen.generate(0))
+
+if __name__ == "__main__":
+    main()
+
 # High level idea, places where edges cross are where hallways are placed, no edge cross indicates direct connection
 # Alternatively, place hallways where rooms touch that aren't meant to be adjacent? (sometimes) (PENISES)
 # When we place down room x from room y, see if room z connected to y is in x's acceptable adjacent rooms, if so, connect them.
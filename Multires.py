@@ -0,0 +1,116 @@
+# Authored by Athena Osborne
+# Coarse to fine simulation: rooms are first simulated as cheap low point count ngons until the arrangement settles,
+# then swapped in place for full edgeSupportedRect lattices carrying over each room's position, rotation and velocity
+
+import math
+import numpy as np
+import pygame as pg
+from Generation import RoomGraph
+from Physics import Engine, SoftBody, PointMass, Convergence
+from Placement import targetAreas, forceDirectedLayout
+
+def coarseRoom(side: float, pos: pg.Vector2, n: int = 6) -> SoftBody:
+    '''
+    An n sided ngon with a center point and the same area as a square room of the provided side
+    '''
+    radius = math.sqrt(2 * side * side / (n * math.sin(2 * math.pi / n)))
+    return SoftBody().ngon(radius, n, pos, centerPoint=True, interiorSpringConst=10)
+
+def fineRoom(side: float, pos: pg.Vector2) -> SoftBody:
+    return SoftBody().edgeSupportedRect(side, side, pos, 2, 10)
+
+def seedCoarseBodies(G: RoomGraph, WIDTH: int, HEIGHT: int, areas: dict[str, float] | None = None, fill: float = 0.5,
+                     iterations: int = 300, seed: int | None = None, n: int = 6) -> tuple[list[SoftBody], np.ndarray]:
+    '''
+    Placement.seedSoftBodies, but with coarseRoom proxies. PointMass.IDCounter should be reset beforehand.
+
+    Returns
+    -------
+    tuple[list[SoftBody], np.ndarray]
+        One proxy per room in room number order, and the side of each room's full size square, for refine
+    '''
+    sides = np.sqrt(targetAreas(G, WIDTH, HEIGHT, areas, fill))
+    radii = sides / 2 * math.sqrt(2) * 0.8
+    pos = forceDirectedLayout(G, radii, WIDTH, HEIGHT, iterations, seed)
+    return [coarseRoom(float(sides[r]), pg.Vector2(float(pos[r, 0]), float(pos[r, 1])), n) for r in range(len(G))], sides
+
+def rigidMotion(pos: np.ndarray, vel: np.ndarray, rest: np.ndarray) -> tuple[np.ndarray, float, np.ndarray, float]:
+    '''
+    Fits a rigid motion to a body's points.
+
+    Parameters
+    ----------
+    pos, vel : np.ndarray
+        (k, 2) current positions and velocities of the body's points
+    rest : np.ndarray
+        (k, 2) positions of the same points when the body was created
+
+    Returns
+    -------
+    tuple[np.ndarray, float, np.ndarray, float]
+        Center, rotation (radians) from the rest pose, mean velocity and angular velocity
+    '''
+    center = pos.mean(axis=0)
+    arm = pos - center
+    restArm = rest - rest.mean(axis=0)
+    # Best fit rotation in 2D is the angle of sum(restArm x arm, restArm . arm)
+    angle = math.atan2(float((restArm[:, 0] * arm[:, 1] - restArm[:, 1] * arm[:, 0]).sum()), float((restArm * arm).sum()))
+    meanVel = vel.mean(axis=0)
+    relVel = vel - meanVel
+    spin = float((arm[:, 0] * relVel[:, 1] - arm[:, 1] * relVel[:, 0]).sum() / max((arm * arm).sum(), 1e-9))
+    return center, angle, meanVel, spin
+
+def refine(e: Engine, sides: np.ndarray, rest: list[np.ndarray]):
+    '''
+    Swaps every coarse body in the engine for its full lattice, in place. Each lattice is placed and rotated to match the
+    best fit rigid motion of its proxy, and given the proxy's linear and angular velocity.
+
+    Parameters
+    ----------
+    rest : list[np.ndarray]
+        The rest positions of each proxy's points, from restPositions before the coarse phase
+    '''
+    pos = e.positions()
+    vel = e.velocities()
+    motions = [rigidMotion(pos[[p.id for p in b.points]], vel[[p.id for p in b.points]], rest[i]) for i, b in enumerate(e.softBodies)]
+
+    PointMass.IDCounter = 0
+    bodies: list[SoftBody] = []
+    for (center, angle, meanVel, spin), side in zip(motions, sides):
+        b = fineRoom(float(side), pg.Vector2(float(center[0]), float(center[1])))
+        for p in b.points:
+            arm = (p.position - pg.Vector2(float(center[0]), float(center[1]))).rotate_rad(angle)
+            p.position = pg.Vector2(float(center[0]), float(center[1])) + arm
+            p.velocity = pg.Vector2(float(meanVel[0]) - spin * arm.y, float(meanVel[1]) + spin * arm.x)
+        bodies.append(b)
+    e.setSoftBodies(bodies)
+
+def restPositions(e: Engine) -> list[np.ndarray]:
+    pos = e.positions()
+    return [pos[[p.id for p in b.points]] for b in e.softBodies]
+
+def coarseCriteria() -> Convergence:
+    '''
+    The criteria for ending the coarse phase. Looser than the fine phase's, since it only needs the arrangement to settle, and
+    waiting out the spin up, since the proxies start at rest
+    '''
+    return Convergence(kineticEnergy=10, maxPenetration=2, strain=0.1, spinUp=True)
+
+def runMultires(e: Engine, sides: np.ndarray, dt: float, coarseSteps: int, fineSteps: int,
+                coarseConvergence: Convergence | None = None, fineConvergence: Convergence | None = None) -> tuple[int, int]:
+    '''
+    Runs an engine of coarse proxies until it converges (or coarseSteps), refines it, then runs the full lattices until they converge (or fineSteps).
+    The coarse phase defaults to coarseCriteria.
+
+    Returns
+    -------
+    tuple[int, int]
+        Steps taken in the coarse and fine phases
+    '''
+    if coarseConvergence == None:
+        coarseConvergence = coarseCriteria()
+    rest = restPositions(e)
+    coarse = e.run(dt, coarseSteps, coarseConvergence)
+    refine(e, sides, rest)
+    fine = e.run(dt, fineSteps, fineConvergence)
+    return coarse, fine
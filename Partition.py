@@ -0,0 +1,178 @@
+# Authored by Athena Osborne
+# SoftBody to partition translation: turns a settled Engine into room polygons, shared walls and door candidates
+
+import numpy as np
+from Physics import Engine, SoftBody, PointMass, candidatePairs
+
+def ring(b: SoftBody) -> np.ndarray:
+    '''
+    Chains a body's outer constraints into the ordered cycle of point ids around its outside.
+    Bodies whose outer constraints don't form a single cycle (dots, lines) give back whatever chain could be walked.
+    '''
+    neighbours: dict[int, list[int]] = {}
+    for c in b.outerConstraints:
+        neighbours.setdefault(c.index0, []).append(c.index1)
+        neighbours.setdefault(c.index1, []).append(c.index0)
+    if len(neighbours) == 0:
+        return np.array([p.id for p in b.points], dtype=int)
+
+    start = min(neighbours)
+    order = [start]
+    prev, current = -1, start
+    while True:
+        nexts = [n for n in neighbours[current] if n != prev]
+        if len(nexts) == 0 or nexts[0] == start:
+            break
+        prev, current = current, nexts[0]
+        order.append(current)
+    return np.array(order, dtype=int)
+
+def rings(e: Engine) -> list[np.ndarray]:
+    return [ring(b) for b in e.softBodies]
+
+def flatten(ringList: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Flattens rings so that per vertex and per edge work can be done in one pass.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        Every ring's point ids back to back, the id each of those points connects to next, which ring each belongs to,
+        and the offset each ring starts at
+    '''
+    lengths = np.array([len(r) for r in ringList], dtype=int)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(int)
+    ids = np.concatenate(ringList) if len(ringList) > 0 else np.zeros(0, dtype=int)
+    owner = np.repeat(np.arange(len(ringList)), lengths)
+    nexts = np.arange(len(ids)) + 1
+    last = offsets + lengths - 1
+    nexts[last[lengths > 0]] = offsets[lengths > 0] # The last vertex of each ring connects back to its first
+    return ids, ids[nexts] if len(ids) > 0 else ids, owner, offsets
+
+def areas(pos: np.ndarray, ringList: list[np.ndarray]) -> np.ndarray:
+    '''
+    Shoelace area of every ring at once
+    '''
+    ids, nexts, owner, offsets = flatten(ringList)
+    cross = pos[ids, 0] * pos[nexts, 1] - pos[nexts, 0] * pos[ids, 1]
+    result = np.zeros(len(ringList))
+    np.add.at(result, owner, cross)
+    return np.abs(result) / 2
+
+class Partition:
+    '''
+    The rooms and walls read off a settled Engine. Room n is the Engine's SoftBody n.
+    '''
+
+    def __init__(self, polygons: list[np.ndarray], areas: np.ndarray, wallRooms: np.ndarray, wallSegments: np.ndarray):
+        self.polygons: list[np.ndarray] = polygons # (k, 2) vertex arrays, one per room, in ring order
+        self.areas: np.ndarray = areas
+        self.wallRooms: np.ndarray = wallRooms # (w, 2) pairs of rooms which share each wall segment, lower room first
+        self.wallSegments: np.ndarray = wallSegments # (w, 2, 2) start and end of each shared wall segment
+
+        # Total shared wall length between every pair of rooms
+        self.sharedLength: np.ndarray = np.zeros((len(polygons), len(polygons)))
+        lengths = np.linalg.norm(wallSegments[:, 1] - wallSegments[:, 0], axis=1)
+        np.add.at(self.sharedLength, (wallRooms[:, 0], wallRooms[:, 1]), lengths)
+        self.sharedLength += self.sharedLength.T
+
+    def adjacency(self, minLength: float = 0) -> np.ndarray:
+        '''
+        Boolean matrix of which rooms share more than minLength of wall
+        '''
+        return self.sharedLength > minLength
+
+    def doors(self, doorWidth: float) -> list[tuple[int, int, np.ndarray]]:
+        '''
+        Finds a door candidate for every pair of rooms with a shared wall segment long enough to fit a door
+
+        Returns
+        -------
+        list[tuple[int, int, np.ndarray]]
+            The two rooms and the door's center, at the middle of their longest shared segment
+        '''
+        lengths = np.linalg.norm(self.wallSegments[:, 1] - self.wallSegments[:, 0], axis=1)
+        fits = np.flatnonzero(lengths >= doorWidth)
+        # Keep the longest segment per pair of rooms: sort by length, then take the last of each pair
+        fits = fits[np.argsort(lengths[fits], kind="stable")]
+        best: dict[tuple[int, int], int] = {}
+        for w in fits:
+            best[(int(self.wallRooms[w, 0]), int(self.wallRooms[w, 1]))] = w
+        return [(a, b, self.wallSegments[w].mean(axis=0)) for (a, b), w in best.items()]
+
+def sharedWalls(p0: np.ndarray, p1: np.ndarray, owner: np.ndarray, gap: float, parallel: float, minLength: float) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Finds where edges of different rooms run alongside each other, closer than gap, as one wall
+
+    Parameters
+    ----------
+    p0, p1 : np.ndarray
+        (k, 2) start and end of every edge
+    owner : np.ndarray
+        The room each edge belongs to
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        (w, 2) pairs of rooms sharing each wall segment, lower room first, and (w, 2, 2) the start and end of each segment
+    '''
+    # Broad phase: edges of different rooms whose boxes, grown by the gap, overlap
+    lo = np.minimum(p0, p1) - gap / 2
+    hi = np.maximum(p0, p1) + gap / 2
+    a, b = candidatePairs(lo, hi)
+    different = owner[a] != owner[b]
+    a, b = a[different], b[different]
+
+    # Narrow phase, for every candidate pair at once
+    direction = p1[a] - p0[a]
+    length = np.maximum(np.linalg.norm(direction, axis=1), 1e-9)
+    unit = direction / length[:, None]
+    otherDirection = p1[b] - p0[b]
+    otherUnit = otherDirection / np.maximum(np.linalg.norm(otherDirection, axis=1), 1e-9)[:, None]
+    normal = np.stack((-unit[:, 1], unit[:, 0]), axis=1)
+
+    sine = np.abs(unit[:, 0] * otherUnit[:, 1] - unit[:, 1] * otherUnit[:, 0])
+    offset0 = ((p0[b] - p0[a]) * normal).sum(axis=1) # How far each end of edge b sits off the line of edge a
+    offset1 = ((p1[b] - p0[a]) * normal).sum(axis=1)
+    separation = (offset0 + offset1) / 2
+
+    # Project edge b onto edge a and keep the overlapping interval
+    t0 = ((p0[b] - p0[a]) * unit).sum(axis=1)
+    t1 = ((p1[b] - p0[a]) * unit).sum(axis=1)
+    start = np.maximum(np.minimum(t0, t1), 0)
+    end = np.minimum(np.maximum(t0, t1), length)
+
+    shared = (sine <= parallel) & (np.abs(separation) <= gap) & (end - start >= minLength)
+    a, b = a[shared], b[shared]
+    start, end = start[shared], end[shared]
+    base = p0[a] + normal[shared] * (separation[shared] / 2)[:, None] # The wall runs down the middle of the two edges
+    segments = np.stack((base + unit[shared] * start[:, None], base + unit[shared] * end[:, None]), axis=1)
+    wallRooms = np.sort(np.stack((owner[a], owner[b]), axis=1), axis=1)
+    return wallRooms.reshape(-1, 2), segments.reshape(-1, 2, 2)
+
+def extract(e: Engine, gap: float | None = None, parallel: float = 0.2, minLength: float = 1) -> Partition:
+    '''
+    Reads the partition off the engine's current positions.
+
+    Parameters
+    ----------
+    gap : float | None (Default = None)
+        How far apart two edges of different rooms can be while still counting as one wall. Defaults to the width of two drawn edges plus a point
+    parallel : float (Default = 0.2)
+        Largest |sin| of the angle between two edges which still counts as parallel
+    minLength : float (Default = 1)
+        Shared segments shorter than this are discarded
+    '''
+    if gap == None:
+        gap = PointMass.radius * 0.7 * 4 + PointMass.radius
+    pos = e.positions()
+    ringList = rings(e)
+    polygons = [pos[r] for r in ringList]
+
+    # Every outer edge as a segment, remembering which room it belongs to
+    ids, nexts, owner, offsets = flatten(ringList)
+    keep = ids != nexts
+    p0, p1, owner = pos[ids[keep]], pos[nexts[keep]], owner[keep]
+
+    wallRooms, segments = sharedWalls(p0, p1, owner, gap, parallel, minLength)
+    return Partition(polygons, areas(pos, ringList), wallRooms, segments)
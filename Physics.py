@@ -2,11 +2,322 @@
 # Implementation of PointMass, Constraint, Engine, Collision, and collision detection and resolution derived from Nikita Lisitsa's "Making a 2D soft-body physics engine"
 # https://lisyarus.github.io/blog/posts/soft-body-physics.html
 
+import array
 import math
+import numpy as np
 import pygame as pg
 import random
+from Trace import Tracer, NO_TRACE
+
+def candidatePairs(lo: np.ndarray, hi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Sweep and prune over axis aligned boxes. Boxes are sorted by their left edge once, then every box finds the run of
+    boxes starting inside its x extent with a binary search, and those runs are expanded and filtered on y without a Python loop.
+
+    Parameters
+    ----------
+    lo, hi : np.ndarray
+        (m, 2) arrays of each box's minimum and maximum corner
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Indexes of every pair of overlapping boxes, each pair given once
+    '''
+    order = np.argsort(lo[:, 0], kind="stable")
+    sortedLo = lo[order, 0]
+    start = np.arange(len(order)) + 1
+    stop = np.searchsorted(sortedLo, hi[order, 0], side="right")
+    counts = np.maximum(stop - start, 0)
+
+    first = np.repeat(np.arange(len(order)), counts)
+    second = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(start, counts)
+    a, b = order[first], order[second]
+
+    overlapY = (lo[a, 1] <= hi[b, 1]) & (lo[b, 1] <= hi[a, 1])
+    return a[overlapY], b[overlapY]
+
+# Extended position based dynamics kernels. Each works on whichever constraints or contacts it's given and accumulates into
+# per point arrays, so the same code serves Engine.updateXPBD (given everything) and Domain's workers (each given their own share)
+
+def findContacts(pos: np.ndarray, points: np.ndarray, edges: np.ndarray, i0: np.ndarray, i1: np.ndarray, walls: np.ndarray,
+                 wallIndex: "WallIndex", r: float, margin: float) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Finds every point pair, point/edge pair and point/wall pair among the provided points, edges and walls that could come into
+    contact this substep. Points and edges are found with one sweep over their boxes, and walls by looking up each point's
+    cells in the static wall index, so the cost doesn't grow with the number of walls. Follows the same rules as the impulse
+    solver: points don't collide with their own edges, and a point touching a vertex doesn't collide with the edges on either side of it.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        Ids of the points to consider, in increasing order
+    edges : np.ndarray
+        Indexes (into i0 and i1) of the edges to consider
+    walls : np.ndarray
+        (w, 5) walls as rows of x0, y0, x1, y1, radius
+    wallIndex : WallIndex
+        Index over the same walls, in the same order
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        (k, 2) point pairs, the distance between each, (k, 3) point/edge start/edge end triples, the edge index of each,
+        and (k, 2) point/wall pairs
+    '''
+    n = len(points)
+    P = pos[points]
+    e0, e1 = pos[i0[edges]], pos[i1[edges]]
+    reach = r * 1.7 + margin
+
+    lo = np.concatenate((P - reach, np.minimum(e0, e1)))
+    hi = np.concatenate((P + reach, np.maximum(e0, e1)))
+    a, b = candidatePairs(lo, hi)
+    a, b = np.minimum(a, b), np.maximum(a, b) # Points come first, so a is always the point in mixed pairs
+
+    isPoint = b < n
+    pointPairs = np.stack((points[a[isPoint]], points[b[isPoint]]), axis=1)
+    isEdge = (a < n) & (b >= n)
+    edgePoint, edge = points[a[isEdge]], edges[b[isEdge] - n]
+
+    # The index finds the walls near each point, then their boxes are checked as with everything else
+    wallPairs = wallIndex.pairs(pos, points, reach)
+    W = walls[wallPairs[:, 1]]
+    Q = pos[wallPairs[:, 0]]
+    near = ((Q + reach >= np.minimum(W[:, 0:2], W[:, 2:4]) - W[:, 4:5]) & (Q - reach <= np.maximum(W[:, 0:2], W[:, 2:4]) + W[:, 4:5])).all(axis=1)
+    wallPairs = wallPairs[near]
+
+    # Point to point contacts already touching decide which edges are culled
+    N = len(pos)
+    distance = np.linalg.norm(pos[pointPairs[:, 1]] - pos[pointPairs[:, 0]], axis=1)
+    touching = distance < 2 * r
+    touchKeys = np.concatenate((pointPairs[touching, 0] * N + pointPairs[touching, 1], pointPairs[touching, 1] * N + pointPairs[touching, 0]))
+
+    a, b = i0[edge], i1[edge]
+    keep = (edgePoint != a) & (edgePoint != b)
+    keep &= ~np.isin(edgePoint * N + a, touchKeys) & ~np.isin(edgePoint * N + b, touchKeys)
+    edgePoint, edge = edgePoint[keep], edge[keep]
+    return pointPairs, distance, np.stack((edgePoint, i0[edge], i1[edge]), axis=1), edge, wallPairs
+
+def projectConstraints(pos: np.ndarray, i0: np.ndarray, i1: np.ndarray, distance: np.ndarray, hard: np.ndarray, compliance: np.ndarray,
+                       lambdas: np.ndarray, w: np.ndarray, correction: np.ndarray, counts: np.ndarray):
+    '''
+    C = length - distance. Hard constraints only act when stretched. Updates lambdas in place
+    '''
+    delta = pos[i1] - pos[i0]
+    length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+    normal = delta / length[:, None]
+    C = length - distance
+    weight = w[i0] + w[i1] + compliance
+    active = (~hard | (C > 0)) & (weight > 0)
+    dl = np.where(active, (-C - compliance * lambdas) / np.maximum(weight, 1e-12), 0)
+    lambdas += dl
+    np.add.at(correction, i0, -normal * (w[i0] * dl)[:, None])
+    np.add.at(correction, i1, normal * (w[i1] * dl)[:, None])
+    np.add.at(counts, i0, active)
+    np.add.at(counts, i1, active)
+
+def projectPointContacts(pos: np.ndarray, pairs: np.ndarray, r: float, compliance: float, w: np.ndarray, fresh: np.ndarray, correction: np.ndarray,
+                         oldCorrection: np.ndarray, counts: np.ndarray):
+    '''
+    C = distance - 2 * radius, only while overlapping. The part of each contact's correction undoing old overlap (see splitOverlap)
+    is also accumulated into oldCorrection
+    '''
+    p, q = pairs[:, 0], pairs[:, 1]
+    delta = pos[q] - pos[p]
+    length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+    normal = delta / length[:, None]
+    C = length - 2 * r
+    weight = w[p] + w[q] + compliance
+    active = (C < 0) & (weight > 0)
+    dl = np.where(active, -C / np.maximum(weight, 1e-12), 0)
+    old = splitOverlap(np.where(active, -C, 0), fresh)
+    for target, scale in ((correction, dl), (oldCorrection, dl * old)):
+        np.add.at(target, p, -normal * (w[p] * scale)[:, None])
+        np.add.at(target, q, normal * (w[q] * scale)[:, None])
+    np.add.at(counts, p, active)
+    np.add.at(counts, q, active)
+
+def projectEdgeContacts(pos: np.ndarray, edgePairs: np.ndarray, r: float, compliance: float, w: np.ndarray, fresh: np.ndarray, correction: np.ndarray,
+                        oldCorrection: np.ndarray, counts: np.ndarray):
+    '''
+    C = distance from the edge - 1.7 * radius, only where the point projects onto the edge
+    '''
+    p, a, b = edgePairs[:, 0], edgePairs[:, 1], edgePairs[:, 2]
+    surf = pos[b] - pos[a]
+    slider = ((pos[p] - pos[a]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9)
+    delta = pos[p] - (pos[a] + surf * slider[:, None])
+    length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+    normal = delta / length[:, None]
+    C = length - 1.7 * r
+    weight = w[p] + (1 - slider) ** 2 * w[a] + slider ** 2 * w[b] + compliance
+    active = (C < 0) & (slider > 0) & (slider < 1) & (weight > 0)
+    dl = np.where(active, -C / np.maximum(weight, 1e-12), 0)
+    old = splitOverlap(np.where(active, -C, 0), fresh)
+    for target, scale in ((correction, dl), (oldCorrection, dl * old)):
+        np.add.at(target, p, normal * (w[p] * scale)[:, None])
+        np.add.at(target, a, -normal * (w[a] * (1 - slider) * scale)[:, None])
+        np.add.at(target, b, -normal * (w[b] * slider * scale)[:, None])
+    np.add.at(counts, p, active)
+    np.add.at(counts, a, active)
+    np.add.at(counts, b, active)
+
+def projectWallContacts(pos: np.ndarray, wallPairs: np.ndarray, walls: np.ndarray, r: float, compliance: float, w: np.ndarray, fresh: np.ndarray,
+                        correction: np.ndarray, oldCorrection: np.ndarray, counts: np.ndarray):
+    '''
+    C = distance from the wall - (radius + wall radius). Walls don't move. walls holds the wall of each pair
+    '''
+    p = wallPairs[:, 0]
+    surf = walls[:, 2:4] - walls[:, 0:2]
+    slider = np.clip(((pos[p] - walls[:, 0:2]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9), 0, 1)
+    delta = pos[p] - (walls[:, 0:2] + surf * slider[:, None])
+    length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+    normal = delta / length[:, None]
+    C = length - (r + walls[:, 4])
+    weight = w[p] + compliance
+    active = (C < 0) & (weight > 0)
+    dl = np.where(active, -C / np.maximum(weight, 1e-12), 0)
+    np.add.at(correction, p, normal * (w[p] * dl)[:, None])
+    np.add.at(oldCorrection, p, normal * (w[p] * dl * splitOverlap(np.where(active, -C, 0), fresh))[:, None])
+    np.add.at(counts, p, active)
+
+def contactDepths(pos: np.ndarray, pointPairs: np.ndarray, edgePairs: np.ndarray, wallPairs: np.ndarray, walls: np.ndarray,
+                  r: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    How deep each contact overlaps with the points at pos, or 0 where it doesn't. Edges are measured to their closest point, so a
+    point sliding past an edge's end onto the edge keeps the overlap it already had. walls holds the wall of each wall pair
+    '''
+    p, q = pointPairs[:, 0], pointPairs[:, 1]
+    pointDepth = np.maximum(2 * r - np.linalg.norm(pos[q] - pos[p], axis=1), 0)
+
+    p, a, b = edgePairs[:, 0], edgePairs[:, 1], edgePairs[:, 2]
+    surf = pos[b] - pos[a]
+    slider = np.clip(((pos[p] - pos[a]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9), 0, 1)
+    edgeDepth = np.maximum(1.7 * r - np.linalg.norm(pos[p] - (pos[a] + surf * slider[:, None]), axis=1), 0)
+
+    p = wallPairs[:, 0]
+    surf = walls[:, 2:4] - walls[:, 0:2]
+    slider = np.clip(((pos[p] - walls[:, 0:2]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9), 0, 1)
+    wallDepth = np.maximum(r + walls[:, 4] - np.linalg.norm(pos[p] - (walls[:, 0:2] + surf * slider[:, None]), axis=1), 0)
+    return pointDepth, edgeDepth, wallDepth
+
+def splitOverlap(depth: np.ndarray, fresh: np.ndarray) -> np.ndarray:
+    '''
+    The fraction of each contact's push out of depth which undoes old overlap. fresh holds how much of each contact's overlap came
+    from its points moving into each other this substep, and is used up by the pushes that undo it. The contact projections set the
+    old part of their pushes aside and velocities leave it out: pushing apart an old overlap, or one the projections pushed points
+    into, doesn't fling points apart, while points moving into each other are stopped by the push and lose that velocity
+    '''
+    new = np.minimum(depth, fresh)
+    fresh -= new
+    return 1 - new / np.maximum(depth, 1e-12)
+
+def pushFreeVelocity(move: np.ndarray, shift: np.ndarray, dt: float) -> np.ndarray:
+    '''
+    Velocities from each point's move over a substep, leaving out the shift contacts made to undo old overlap. Only as much of the
+    shift as the point actually travelled along it is left out, so springs pulling a point back against a push don't turn into velocity
+    '''
+    travelled = np.clip((move * shift).sum(axis=1) / np.maximum((shift * shift).sum(axis=1), 1e-12), 0, 1)
+    return (move - shift * travelled[:, None]) / dt
+
+def dampSprings(pos: np.ndarray, vel: np.ndarray, i0: np.ndarray, i1: np.ndarray, springDamping: float, dt: float, damping: np.ndarray):
+    '''
+    Damps relative velocity along soft constraints, as the impulse solver does
+    '''
+    delta = pos[i1] - pos[i0]
+    normal = delta / np.maximum(np.linalg.norm(delta, axis=1), 1e-9)[:, None]
+    relN = ((vel[i1] - vel[i0]) * normal).sum(axis=1)
+    change = relN * (math.exp(-springDamping * dt) - 1) / 2
+    np.add.at(damping, i0, -normal * change[:, None])
+    np.add.at(damping, i1, normal * change[:, None])
+
+def bouncePointContacts(pos: np.ndarray, vel: np.ndarray, before: np.ndarray, pairs: np.ndarray, r: float, elasticity: float, friction: float,
+                        bounce: np.ndarray, counts: np.ndarray):
+    '''
+    Bounces points which are still touching and were approaching, at the start of the substep (before) or still, apart according
+    to elasticity, and removes part of their tangential relative velocity. Like the projections, changes are accumulated along with
+    how many contacts each point is in, to be averaged
+    '''
+    p, q = pairs[:, 0], pairs[:, 1]
+    delta = pos[q] - pos[p]
+    length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+    normal = delta / length[:, None]
+    touching = length < 2 * r * 1.01
+    rel = vel[q] - vel[p]
+    relN = (rel * normal).sum(axis=1)
+    approach = np.minimum(relN, ((before[q] - before[p]) * normal).sum(axis=1))
+    relT = (rel - relN[:, None] * normal) * touching[:, None]
+    change = np.where(touching & (approach < 0), np.maximum(-elasticity * approach - relN, 0) / 2, 0)[:, None] * normal
+    np.add.at(bounce, p, relT * friction / 2 - change)
+    np.add.at(bounce, q, -relT * friction / 2 + change)
+    np.add.at(counts, p, touching)
+    np.add.at(counts, q, touching)
+
+def bounceEdgeContacts(pos: np.ndarray, vel: np.ndarray, before: np.ndarray, edgePairs: np.ndarray, r: float, elasticity: float, friction: float,
+                       bounce: np.ndarray, counts: np.ndarray):
+    '''
+    bouncePointContacts for points touching edges, sharing each change between the point and the edge's ends as an impulse would
+    '''
+    p, a, b = edgePairs[:, 0], edgePairs[:, 1], edgePairs[:, 2]
+    surf = pos[b] - pos[a]
+    slider = ((pos[p] - pos[a]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9)
+    delta = pos[p] - (pos[a] + surf * slider[:, None])
+    length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+    normal = delta / length[:, None]
+    touching = (length < 1.7 * r * 1.01) & (slider > 0) & (slider < 1)
+    s = np.clip(slider, 0, 1)[:, None]
+    rel = vel[p] - (vel[a] * (1 - s) + vel[b] * s)
+    relN = (rel * normal).sum(axis=1)
+    approach = np.minimum(relN, ((before[p] - (before[a] * (1 - s) + before[b] * s)) * normal).sum(axis=1))
+    relT = (rel - relN[:, None] * normal) * touching[:, None]
+    change = np.where(touching & (approach < 0), np.maximum(-elasticity * approach - relN, 0), 0)[:, None] * normal
+    impulse = (change - relT * friction / 2) / (1 + (1 - s) ** 2 + s ** 2)
+    np.add.at(bounce, p, impulse)
+    np.add.at(bounce, a, -impulse * (1 - s))
+    np.add.at(bounce, b, -impulse * s)
+    np.add.at(counts, p, touching)
+    np.add.at(counts, a, touching)
+    np.add.at(counts, b, touching)
+
+def bounceWalls(pos: np.ndarray, vel: np.ndarray, before: np.ndarray, points: np.ndarray, wallPairs: np.ndarray, walls: np.ndarray, r: float,
+                elasticity: float, friction: float, WIDTH: int, HEIGHT: int, bounce: np.ndarray, counts: np.ndarray):
+    '''
+    bouncePointContacts for points against walls and the bounding box, where only the point moves.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        Ids of the points to bounce, in increasing order. Every point of wallPairs must be one of them
+    '''
+    near = np.zeros(len(points), dtype=bool)
+    wallNormal = np.zeros((len(points), 2))
+    if len(wallPairs) > 0:
+        p = wallPairs[:, 0]
+        surf = walls[:, 2:4] - walls[:, 0:2]
+        slider = np.clip(((pos[p] - walls[:, 0:2]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9), 0, 1)
+        delta = pos[p] - (walls[:, 0:2] + surf * slider[:, None])
+        length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+        touchingWall = length < (r + walls[:, 4]) * 1.01
+        local = np.searchsorted(points, p[touchingWall])
+        near[local] = True
+        wallNormal[local] = delta[touchingWall] / length[touchingWall, None]
+    P = pos[points]
+    for axis, limit, direction in ((0, r, 1), (0, WIDTH - r, -1), (1, r, 1), (1, HEIGHT - r, -1)):
+        atBound = np.abs(P[:, axis] - limit) < 1e-6
+        near |= atBound
+        wallNormal[atBound] = 0
+        wallNormal[atBound, axis] = direction
+    V = vel[points]
+    velN = (V * wallNormal).sum(axis=1)
+    approach = np.minimum(velN, (before[points] * wallNormal).sum(axis=1))
+    hitting = near & (approach < 0)
+    velT = V - velN[:, None] * wallNormal
+    bounce[points[hitting]] += np.maximum(-elasticity * approach - velN, 0)[hitting, None] * wallNormal[hitting] - velT[hitting] * friction / 2
+    counts[points[hitting]] += 1
 
 class Resolution:
+    __slots__ = ("position", "velocity", "acceleration")
+
     def __init__(self, pos: pg.Vector2, vel: pg.Vector2, accel: pg.Vector2) -> None:
         self.position = pos
         self.velocity = vel
@@ -21,20 +332,87 @@ class Resolution:
     def __str__(self):
         return str("@" + str(self.position) + "w/" + str(self.velocity))
 
+class PointStore:
+    '''
+    Storage for PointMasses: FIELDS doubles per point, holding its position, velocity, acceleration and the position, velocity and
+    acceleration of its pending resolution, in that order. Points read and write their own row, and array is a numpy view of the
+    same memory so that every point in a store can be read and written at once.
+    '''
+    FIELDS = 12
+    CHUNK = 1024 # Capacity of the stores new points are created in, before an engine moves them into its own
+
+    def __init__(self, capacity: int):
+        self.data: array.array = array.array("d", bytes(8 * PointStore.FIELDS * capacity))
+        self.array: np.ndarray = np.frombuffer(self.data, dtype=float).reshape(capacity, PointStore.FIELDS)
+        self.count: int = 0 # How many rows have been handed out to new points
+
+ZERO_RESOLUTION = array.array("d", bytes(8 * 6))
+
+def storedVector(column: int) -> property:
+    '''
+    A PointMass property reading two columns of its row as a new Vector2, and writing any pair of numbers back to them
+    '''
+    def get(self) -> pg.Vector2:
+        d, i = self.store.data, self.offset + column
+        return pg.Vector2(d[i], d[i + 1])
+
+    def set(self, value: pg.Vector2):
+        d, i = self.store.data, self.offset + column
+        d[i] = value[0]
+        d[i + 1] = value[1]
+
+    return property(get, set)
 
 class PointMass:
+    '''
+    A view of one row of a PointStore. Points are created in a shared store, then moved into their engine's store by Engine.setSoftBodies.
+    position, velocity and acceleration are copied into new Vector2s when read and copied back when assigned, so p.position += v
+    updates the point but p.position.x += 1 only changes the copy. Assign a whole vector instead.
+    '''
+    __slots__ = ("id", "store", "offset")
     radius = 10
     IDCounter = 0
+    spare: PointStore | None = None # The store new points are created in. Replaced by a fresh one when full
 
     def __init__(self, position: pg.Vector2, velocity: pg.Vector2, acceleration: pg.Vector2):
-        self.position: pg.Vector2 = position
-        self.velocity: pg.Vector2 = velocity
-        self.acceleration: pg.Vector2 = acceleration # Not currently using. Will eventually shift to exerting all forces as accelerations
+        store = PointMass.spare
+        if store == None or store.count == len(store.array):
+            store = PointMass.spare = PointStore(PointStore.CHUNK)
+        self.store: PointStore = store
+        self.offset: int = store.count * PointStore.FIELDS # Index of the point's first field in store.data
+        store.count += 1
+        self.position = position
+        self.velocity = velocity
+        self.acceleration = acceleration # Not currently using. Will eventually shift to exerting all forces as accelerations
         self.id = self.IDCounter
-        self.resolution: Resolution = Resolution(pg.Vector2(0,0), pg.Vector2(0,0), pg.Vector2(0,0))
         #print("Created PointMass with id " + str(self.IDCounter))
         PointMass.IDCounter += 1
-    
+
+    position = storedVector(0)
+    velocity = storedVector(2)
+    acceleration = storedVector(4)
+
+    @property
+    def resolution(self) -> Resolution:
+        d, i = self.store.data, self.offset
+        return Resolution(pg.Vector2(d[i + 6], d[i + 7]), pg.Vector2(d[i + 8], d[i + 9]), pg.Vector2(d[i + 10], d[i + 11]))
+
+    @resolution.setter
+    def resolution(self, resolution: Resolution):
+        d, i = self.store.data, self.offset
+        d[i + 6], d[i + 7] = resolution.position
+        d[i + 8], d[i + 9] = resolution.velocity
+        d[i + 10], d[i + 11] = resolution.acceleration
+
+    def moveTo(self, store: PointStore, row: int):
+        '''
+        Copies the point's fields into the provided row of another store and makes it a view of that row from then on
+        '''
+        offset = row * PointStore.FIELDS
+        store.data[offset:offset + PointStore.FIELDS] = self.store.data[self.offset:self.offset + PointStore.FIELDS]
+        self.store = store
+        self.offset = offset
+
     def __str__(self):
         return "Point" + str(self.id)
     
@@ -44,21 +422,27 @@ class PointMass:
         return False
     
     def clearResolution(self):
-        self.resolution = Resolution(pg.Vector2(0,0), pg.Vector2(0,0), pg.Vector2(0,0))
+        self.store.data[self.offset + 6:self.offset + 12] = ZERO_RESOLUTION
 
     def amendResolution(self, resolution: Resolution):
         '''
         Performs the add operation on the current and provided resolution in place
         '''
-        self.resolution += resolution
+        d, i = self.store.data, self.offset
+        d[i + 6] += resolution.position.x
+        d[i + 7] += resolution.position.y
+        d[i + 8] += resolution.velocity.x
+        d[i + 9] += resolution.velocity.y
+        d[i + 10] += resolution.acceleration.x
+        d[i + 11] += resolution.acceleration.y
 
     def applyResolution(self):
         '''
         Applies the current resolution in place, then clears the resolution
         '''
-        self.position += self.resolution.position
-        self.velocity += self.resolution.velocity
-        self.acceleration += self.resolution.acceleration
+        d, i = self.store.data, self.offset
+        for k in range(i, i + 6):
+            d[k] += d[k + 6]
         self.clearResolution()
 
 class Wall:
@@ -81,20 +465,214 @@ class Wall:
     def __str__(self):
         return "Wall" + str(self.id)
 
+    def closestPoint(self, pos: pg.Vector2) -> pg.Vector2:
+        '''
+        Returns the point on the wall's center line closest to the provided position
+        '''
+        surf: pg.Vector2 = self.pos1 - self.pos0
+        slider: float = (pos - self.pos0).dot(surf) / surf.length_squared()
+        slider = min(max(slider, 0), 1)
+        return self.pos0 + surf * slider
+
+class WallIndex:
+    '''
+    Static uniform grid over a list of Walls. It is built once, and each cell stores every wall that a point inside that cell could possibly touch, so a query is a single cell lookup no matter how many walls there are.
+    query serves the impulse solver one point at a time, and pairs serves the xpbd contact search for every point at once.
+    '''
+
+    def __init__(self, walls: list[Wall], reach: float, cellSize: float | None = None):
+        '''
+        Parameters
+        ----------
+        walls : list[Wall]
+            The walls to index. These are treated as static, so the index must be rebuilt if any of them move.
+        reach : float
+            The largest radius of anything which will query the index
+        cellSize : float | None (Default = None)
+            Side length of a grid cell. Defaults to four times the reach
+        '''
+        self.walls: list[Wall] = walls
+        self.reach: float = reach
+        self.cellSize: float = cellSize if cellSize != None else reach * 4
+        self.cells: dict[tuple[int, int], list[Wall]] = {}
+        wallIDs: dict[tuple[int, int], list[int]] = {} # The same cells, holding each wall's index in walls
+
+        halfDiagonal: float = self.cellSize * math.sqrt(2) / 2
+        for i, w in enumerate(walls):
+            inflate: float = w.radius + reach # How far from the center line a point can be while still touching the wall
+
+            # Walk every cell in the wall's inflated bounding box...
+            x0 = math.floor((min(w.pos0.x, w.pos1.x) - inflate) / self.cellSize)
+            x1 = math.floor((max(w.pos0.x, w.pos1.x) + inflate) / self.cellSize)
+            y0 = math.floor((min(w.pos0.y, w.pos1.y) - inflate) / self.cellSize)
+            y1 = math.floor((max(w.pos0.y, w.pos1.y) + inflate) / self.cellSize)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    # ...but only keep the ones the inflated wall actually reaches, so long diagonal walls don't fill their whole box
+                    center = pg.Vector2((cx + 0.5) * self.cellSize, (cy + 0.5) * self.cellSize)
+                    if center.distance_to(w.closestPoint(center)) <= inflate + halfDiagonal:
+                        self.cells.setdefault((cx, cy), []).append(w)
+                        wallIDs.setdefault((cx, cy), []).append(i)
+
+        # The cells again as flat arrays for pairs: cell keys in increasing order, and where each cell's run of wall indexes starts
+        # and ends in cellWalls. Keys number the cells row by row across the grid's extent, plus a ring of empty cells around it
+        cells = np.array(list(wallIDs), dtype=np.int64).reshape(-1, 2)
+        self.cellMin: np.ndarray = cells.min(axis=0) - 1 if len(cells) > 0 else np.zeros(2, dtype=np.int64)
+        self.cellMax: np.ndarray = cells.max(axis=0) + 1 if len(cells) > 0 else np.zeros(2, dtype=np.int64)
+        keys = self.cellKey(cells)
+        order = np.argsort(keys)
+        self.cellKeys: np.ndarray = keys[order]
+        runs = [wallIDs[tuple(c)] for c in cells[order].tolist()]
+        self.cellEnds: np.ndarray = np.cumsum([len(run) for run in runs], dtype=np.int64)
+        self.cellStarts: np.ndarray = self.cellEnds - [len(run) for run in runs]
+        self.cellWalls: np.ndarray = np.array([i for run in runs for i in run], dtype=int)
+
+    def cellKey(self, cells: np.ndarray) -> np.ndarray:
+        '''
+        Numbers (k, 2) cells. Cells outside the grid are moved onto its empty outer ring first
+        '''
+        cells = np.clip(cells, self.cellMin, self.cellMax)
+        return (cells[:, 0] - self.cellMin[0]) * (self.cellMax[1] - self.cellMin[1] + 1) + cells[:, 1] - self.cellMin[1]
+
+    def pairs(self, pos: np.ndarray, points: np.ndarray, reach: float) -> np.ndarray:
+        '''
+        Finds every wall each of the provided points could touch with the provided reach, by looking up only the cells around it.
+        Reaches beyond the one the index was built for also look in neighbouring cells. Points at non-finite positions touch nothing.
+
+        Returns
+        -------
+        np.ndarray
+            (k, 2) pairs of point id and index in walls, in increasing order
+        '''
+        points = points[np.isfinite(pos[points]).all(axis=1)]
+        if len(self.cellKeys) == 0 or len(points) == 0:
+            return np.zeros((0, 2), dtype=int)
+        base = np.clip(np.floor(pos[points] / self.cellSize), self.cellMin - 1, self.cellMax + 1).astype(np.int64)
+        span = max(math.ceil((reach - self.reach) / self.cellSize), 0)
+        found = []
+        for dx in range(-span, span + 1):
+            for dy in range(-span, span + 1):
+                keys = self.cellKey(base + (dx, dy))
+                at = np.minimum(np.searchsorted(self.cellKeys, keys), len(self.cellKeys) - 1)
+                hit = self.cellKeys[at] == keys
+                starts, ends = self.cellStarts[at[hit]], self.cellEnds[at[hit]]
+                counts = ends - starts
+                # Expand each hit cell's run of walls without a Python loop, as in candidatePairs
+                runs = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+                found.append(np.stack((np.repeat(points[hit], counts), self.cellWalls[runs]), axis=1))
+        return np.unique(np.concatenate(found), axis=0)
+
+    def query(self, pos: pg.Vector2) -> list[Wall]:
+        '''
+        Returns every wall which a point at the provided position could be touching. A point at a non-finite position touches none
+        '''
+        if not (math.isfinite(pos.x) and math.isfinite(pos.y)):
+            return []
+        return self.cells.get((math.floor(pos.x / self.cellSize), math.floor(pos.y / self.cellSize)), [])
+
+class PointIndex:
+    '''
+    Uniform grid over a snapshot of point positions, for picking points under the cursor and finding the impulse solver's point
+    collisions. Points are sorted by cell, so a query binary searches the few cells around it instead of scanning every point.
+    Build a new one whenever the points have moved. Points at non-finite positions (from a blown up simulation) are left out.
+    '''
+
+    cellLimit: int = 1 << 30 # Cells further out than this share the outermost ones, so far flung points can't overflow the keys
+
+    def __init__(self, pos: np.ndarray, cellSize: float):
+        '''
+        Parameters
+        ----------
+        pos : np.ndarray
+            (n, 2) positions, indexed by point id
+        cellSize : float
+            Side length of a grid cell. Queries only look in neighbouring cells, so this should be at least the largest query radius
+        '''
+        self.pos: np.ndarray = pos
+        self.cellSize: float = cellSize
+        finite = np.flatnonzero(np.isfinite(pos).all(axis=1))
+        keys = self.key(self.cells(pos[finite]))
+        order = np.argsort(keys, kind="stable")
+        self.order: np.ndarray = finite[order]
+        self.keys: np.ndarray = keys[order]
+
+    def cells(self, pos: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor(pos / self.cellSize), -self.cellLimit, self.cellLimit).astype(np.int64)
+
+    def key(self, cells: np.ndarray) -> np.ndarray:
+        return cells[..., 0] * 1000003 + cells[..., 1]
+
+    def near(self, pos: pg.Vector2) -> np.ndarray:
+        '''
+        Returns the ids, in increasing order, of every point in the cells around the provided position. This includes every point
+        within cellSize of it. Nothing is near a non-finite position
+        '''
+        if not (math.isfinite(pos.x) and math.isfinite(pos.y)):
+            return np.zeros(0, dtype=int)
+        cx, cy = self.cells(np.array([pos.x, pos.y]))
+        cells = self.key(np.array([[cx + dx, cy + dy] for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64))
+        start = np.searchsorted(self.keys, cells, "left")
+        end = np.searchsorted(self.keys, cells, "right")
+        return np.sort(np.concatenate([self.order[s:e] for s, e in zip(start, end)]))
+
+    def nearest(self, pos: pg.Vector2, radius: float) -> int | None:
+        '''
+        Returns the id of the closest point within radius of the provided position, or None if there isn't one
+        '''
+        candidates = self.near(pos)
+        if len(candidates) == 0:
+            return None
+        distance = np.linalg.norm(self.pos[candidates] - (pos.x, pos.y), axis=1)
+        best = int(np.argmin(distance))
+        return int(candidates[best]) if distance[best] <= radius else None
+
 class Collision:
-    def __init__(self, normal: pg.Vector2, depth: float, vel1: pg.Vector2, vel2: pg.Vector2, wall: bool):
+    __slots__ = ("normal", "depth", "v2", "v1", "momentum", "wall", "key")
+
+    def __init__(self, normal: pg.Vector2, depth: float, vel1: pg.Vector2, vel2: pg.Vector2, wall: bool, key: tuple | None = None):
         self.normal: pg.Vector2 = normal
         self.depth: float = depth
         self.v2: pg.Vector2 = vel2
         self.v1: pg.Vector2 = vel1
         self.momentum: pg.Vector2 = vel1 + vel2
         self.wall: bool = wall
+        self.key: tuple | None = key # Key of the persistent Contact this collision belongs to, if any
 
     def __str__(self):
         return str(self.normal) + ", " + str(self.depth) + ", " + str(self.v1) + ", " + str(self.v2) + ", " + str(self.wall)
 
+class Contact:
+    '''
+    A contact which persists between substeps for as long as its two participants keep touching.
+    Keys are ("point", pointID, otherPointID) for point to point contacts, ("edge", pointID, index0, index1) for point to edge contacts and ("wall", pointID, wallID) for point to wall contacts.
+    '''
+    __slots__ = ("key", "normal", "depth", "impulse", "age")
+
+    def __init__(self, key: tuple):
+        self.key: tuple = key
+        self.normal: pg.Vector2 = pg.Vector2(0,0)
+        self.depth: float = 0
+        self.impulse: pg.Vector2 = pg.Vector2(0,0) # The velocity change this contact applied to its point on the last substep
+        self.age: int = 0 # How many consecutive substeps this contact has existed for
+
+    def clamp(self, impulse: pg.Vector2) -> pg.Vector2:
+        '''
+        Clamps the impulse accumulated on this contact during a substep (its warm start plus whatever was solved on top) so the
+        contact only ever pushes its point out along the normal, never pulls it in, and stores it for the next substep's warm start.
+        Without the clamp a warm start keeps reapplying part of an old push after the points have started separating.
+        '''
+        push = impulse.dot(self.normal)
+        if push < 0:
+            impulse = impulse - self.normal * push
+        self.impulse = impulse
+        return impulse
+
+    def __str__(self):
+        return str(self.key) + " depth " + str(self.depth) + " age " + str(self.age)
+
 class Constraint:
-    
+    __slots__ = ("index0", "index1", "distance", "hard", "springConst")
+
     def __init__(self, index0: int, index1: int, distance: float, hard:bool =False, springConst: float=5):
         self.index0: int = index0
         self.index1: int = index1
@@ -374,10 +952,126 @@ class SoftBody:
     
     '''
 
+class Metrics:
+    '''
+    Global measurements of how settled an Engine is
+    '''
+
+    def __init__(self, kineticEnergy: float, maxPenetration: float, strain: float, points: int):
+        self.kineticEnergy: float = kineticEnergy # Total kinetic energy of every point, treating each as unit mass
+        self.points: int = points # How many points were measured
+        self.maxPenetration: float = maxPenetration # Depth of the deepest contact found during the last substep
+        self.strain: float = strain # RMS over all constraints of how far each is from its distance, relative to that distance
+
+    def __str__(self):
+        return "KE " + str(self.kineticEnergy) + ", penetration " + str(self.maxPenetration) + ", strain " + str(self.strain)
+
+class Convergence:
+    '''
+    Criteria for deciding that a layout is done. An Engine has converged once every metric has stayed under its threshold for patience checks in a row.
+    The kinetic energy threshold is per point, so the same criteria work for scenes of any size.
+    With spinUp, checks don't count while the kinetic energy is at its highest yet, so a scene which starts at rest and is only
+    just getting moving isn't mistaken for a settled one.
+    '''
+
+    def __init__(self, kineticEnergy: float = 2, maxPenetration: float = 1, strain: float = 0.05, patience: int = 10, spinUp: bool = False):
+        self.kineticEnergy: float = kineticEnergy
+        self.maxPenetration: float = maxPenetration
+        self.strain: float = strain
+        self.patience: int = patience
+        self.spinUp: bool = spinUp
+        self.streak: int = 0 # How many checks in a row have been under every threshold
+        self.peak: float = 0 # The highest kinetic energy checked so far
+
+    def check(self, metrics: Metrics) -> bool:
+        '''
+        Records the provided metrics and returns whether the run has converged
+        '''
+        rising = self.spinUp and metrics.kineticEnergy > 0 and metrics.kineticEnergy >= self.peak
+        self.peak = max(self.peak, metrics.kineticEnergy)
+        if (not rising
+            and metrics.kineticEnergy <= self.kineticEnergy * metrics.points 
+            and metrics.maxPenetration <= self.maxPenetration 
+            and metrics.strain <= self.strain):
+            self.streak += 1
+        else:
+            self.streak = 0
+        return self.streak >= self.patience
+
 class Engine:
     
     def __init__(self, softBodies: list[SoftBody], walls: list[Wall], elasticity: float, friction: float, springDamping: float, WIDTH: int, HEIGHT: int):
         
+        self.walls: list[Wall] = walls
+        self.wallIndex: WallIndex = WallIndex(walls, PointMass.radius)
+        self.wallArray: np.ndarray = np.array([[w.pos0.x, w.pos0.y, w.pos1.x, w.pos1.y, w.radius] for w in walls], dtype=float).reshape(-1, 5)
+        self.elasticity: float = elasticity
+        self.friction: float = friction
+        self.springDamping: float = springDamping
+        self.WIDTH: int = WIDTH
+        self.HEIGHT: int = HEIGHT
+
+        # Persistent contacts, carried over between substeps so responses can be warm started from the previous impulse
+        self.contacts: dict[tuple, Contact] = {}
+        self.touchedContacts: set[tuple] = set() # Keys of the contacts touched during the current substep
+        self.warmStart: float = 0.5 # Fraction of a persisting contact's previous impulse that is reapplied before solving for the new one
+        self.newContacts: int = 0 # How many contacts were created during the last substep
+        self.maxDepth: float = 0 # The deepest contact found during the last substep
+        self.maxSpeed: float = 0 # The fastest point speed at the start of the last substep
+        self.stepped: bool = False # Whether a substep has run since the bodies were set, so that the three fields above describe them
+
+        # Vector2 copies of every point's position and velocity, taken by each impulse or implicit substep once points have moved,
+        # since its collision and constraint checks read them for every pair. Points then don't move again until their resolutions
+        # are applied at the end of the substep
+        self.positionVectors: list[pg.Vector2] = []
+        self.velocityVectors: list[pg.Vector2] = []
+        self.pointIndex: PointIndex | None = None # Grid over the same positions, for finding which points collide
+
+        # Substepping. step() drops to minSubsteps while the scene is settled
+        self.substeps: int = 4
+        self.minSubsteps: int = 1
+        self.settledDepth: float = 1 # Contacts shallower than this count as resting
+
+        # How soft constraints are integrated. "impulse" applies each spring explicitly with exponential damping,
+        # "implicit" solves all springs together with backward Euler, which stays stable for stiff springs and large dt,
+        # and "xpbd" replaces the whole update with position based projection of constraints and contacts
+        self.solver: str = "impulse"
+        self.implicitIterations: int = 50 # Most conjugate gradient iterations per implicit solve
+        self.implicitTolerance: float = 1e-6 # Relative residual at which the implicit solve stops
+        self.xpbdIterations: int = 4 # Projection passes per substep. More is stiffer and more accurate, fewer is cheaper
+        self.xpbdRelaxation: float = 1 # Scale on each averaged Jacobi correction
+        self.hardCompliance: float = 0 # Compliance of hard constraints and contacts. Soft constraints use 1/springConst
+
+        # Region limited simulation, for re-settling after a local edit. While active is a set of body indices, only those bodies
+        # are simulated and every other body is held still as an obstacle. A frozen body touching (deeper than wakeDepth) an active
+        # body which is still moving faster than sleepSpeed joins the region, and an active body slower than sleepSpeed for
+        # sleepSteps substeps in a row leaves it again. None simulates everything
+        self.active: set[int] | None = None
+        self.wakeDepth: float = 0
+        self.sleepSpeed: float = 5
+        self.sleepSteps: int = 30
+
+        # Dragging. Grabbed points are pulled towards the grab anchor plus their offset from it by damped zero length springs
+        self.dragSpring: float = 50
+        self.dragDamping: float = 5
+        self.grabAnchor: pg.Vector2 | None = None
+        self.grabOffsets: dict[int, pg.Vector2] = {} # Offset of each grabbed point's target from the anchor, by point id
+
+        self.tracer: Tracer | None = None # If set, substeps and their phases are recorded on its timeline
+
+        self.lastMetrics: Metrics | None = None
+        self.setSoftBodies(softBodies)
+
+    def setSoftBodies(self, softBodies: list[SoftBody]):
+        '''
+        Replaces every body in the engine, keeping its settings. Point ids must run from 0 in the order of the bodies, as when
+        PointMass.IDCounter is reset before creating them. Contacts are forgotten, since they refer to the old points.
+        '''
+        # The store, constraints, contacts and self.points all find points by id, so ids have to be their positions
+        for i, p in enumerate(p for b in softBodies for p in b.points):
+            if p.id != i:
+                raise ValueError("Point ids must run from 0 in the order of the bodies, but point " + str(i) + " has id " + str(p.id) + " (reset PointMass.IDCounter before creating the bodies)")
+
         self.softBodies: list[SoftBody] = softBodies
         self.points: list[PointMass] = []
         self.outerConstraints: list[Constraint] = []
@@ -386,50 +1080,364 @@ class Engine:
             self.points.extend(b.points)
             self.outerConstraints.extend(b.outerConstraints)
             self.innerConstraints.extend(b.innerConstraints)
-        self.walls: list[Wall] = walls
-        self.elasticity: float = elasticity
-        self.friction: float = friction
-        self.springDamping: float = springDamping
-        self.WIDTH: int = WIDTH
-        self.HEIGHT: int = HEIGHT
+
+        # Every point moves into one store, a row per point by id, so the whole engine's state can be read and written as arrays
+        self.store: PointStore = PointStore(len(self.points))
+        for p in self.points:
+            p.moveTo(self.store, p.id)
+        self.store.count = len(self.points)
+        self.contacts.clear()
+        self.touchedContacts.clear()
+        self.stepped = False
+        self.release()
+        self.active = None
+        self.quiet: dict[int, int] = {} # How many substeps in a row each active body has been below sleepSpeed
+
+        # Which body each point belongs to, by id
+        self.pointBody: np.ndarray = np.repeat(np.arange(len(softBodies)), [len(b.points) for b in softBodies]).astype(int)
+
+        # Constraint endpoints as arrays so that metrics can be computed for every constraint at once
+        constraints = self.outerConstraints + self.innerConstraints
+        self.constraintIndex0: np.ndarray = np.array([c.index0 for c in constraints], dtype=int)
+        self.constraintIndex1: np.ndarray = np.array([c.index1 for c in constraints], dtype=int)
+        self.constraintHard: np.ndarray = np.array([c.hard for c in constraints], dtype=bool)
+        self.constraintDistance: np.ndarray = np.array([c.distance for c in constraints], dtype=float)
+        self.constraintSpring: np.ndarray = np.array([c.springConst for c in constraints], dtype=float)
+        self.outerCount: int = len(self.outerConstraints) # The outer constraints (edges) come first in the arrays above
+        self.constraintBody: np.ndarray = np.concatenate((np.repeat(np.arange(len(softBodies)), [len(b.outerConstraints) for b in softBodies]),
+                                                          np.repeat(np.arange(len(softBodies)), [len(b.innerConstraints) for b in softBodies]))).astype(int)
+
+    def freeze(self):
+        '''
+        Stops every body where it is and starts region limited simulation with nothing active. Bodies are then woken with activate
+        '''
+        self.active = set()
+        self.quiet.clear()
+        self.store.array[:, 2:4] = 0
+
+    def thaw(self):
+        '''
+        Goes back to simulating every body
+        '''
+        self.active = None
+        self.quiet.clear()
+
+    def activate(self, body: int, neighbourhood: bool = True):
+        '''
+        Adds a body to the active region, along with every body it is currently in contact with if neighbourhood is set.
+        Does nothing while every body is being simulated.
+        '''
+        if self.active == None:
+            return
+        bodies = {body}
+        if neighbourhood:
+            for key in self.contacts:
+                if key[0] == "wall":
+                    continue
+                a, b = int(self.pointBody[key[1]]), int(self.pointBody[key[2]])
+                if a == body or b == body:
+                    bodies.update((a, b))
+        for b in bodies:
+            self.active.add(b)
+            self.quiet[b] = 0
+
+    def grab(self, ids: list[int], anchor: pg.Vector2):
+        '''
+        Starts dragging the provided points from the anchor, keeping their current offsets from it. Their bodies are woken
+        if only part of the engine is being simulated.
+        '''
+        self.grabAnchor = pg.Vector2(anchor)
+        self.grabOffsets = {i: self.points[i].position - anchor for i in ids}
+        for b in set(int(self.pointBody[i]) for i in ids):
+            self.activate(b)
+
+    def moveGrab(self, anchor: pg.Vector2):
+        if self.grabAnchor != None:
+            self.grabAnchor = pg.Vector2(anchor)
+
+    def release(self):
+        self.grabAnchor = None
+        self.grabOffsets = {}
+
+    def dragTargets(self) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns the ids of the grabbed points and an (k, 2) array of where each is being dragged to
+        '''
+        ids = np.array(list(self.grabOffsets), dtype=int)
+        if self.grabAnchor == None or len(ids) == 0:
+            return np.zeros(0, dtype=int), np.zeros((0, 2))
+        offsets = np.array([(o.x, o.y) for o in self.grabOffsets.values()], dtype=float)
+        return ids, offsets + (self.grabAnchor.x, self.grabAnchor.y)
+
+    def resolveDrags(self, dt):
+        '''
+        Amends each grabbed point's resolution with the velocity change from its drag spring, damping its velocity as it goes
+        '''
+        ids, targets = self.dragTargets()
+        dampingFactor: float = math.exp(-self.dragDamping * dt)
+        for i, target in zip(ids, targets):
+            p = self.points[i]
+            force: pg.Vector2 = (pg.Vector2(float(target[0]), float(target[1])) - p.position) * self.dragSpring
+            sumVel: pg.Vector2 = force * dt
+            sumVel -= (p.velocity + sumVel) * (1 - dampingFactor)
+            p.amendResolution(Resolution(pg.Vector2(0,0), sumVel, pg.Vector2(0,0)))
+
+    def frozen(self, p: PointMass) -> bool:
+        return self.active != None and int(self.pointBody[p.id]) not in self.active
+
+    def activePoints(self) -> list[PointMass]:
+        if self.active == None:
+            return self.points
+        return [p for b in sorted(self.active) for p in self.softBodies[b].points]
+
+    def activeConstraints(self) -> list[Constraint]:
+        if self.active == None:
+            return self.outerConstraints + self.innerConstraints
+        return [c for b in sorted(self.active) for c in self.softBodies[b].outerConstraints + self.softBodies[b].innerConstraints]
+
+    def updateRegion(self, pairs: np.ndarray, speed: np.ndarray):
+        '''
+        Grows and shrinks the active region after a substep.
+
+        Parameters
+        ----------
+        pairs : np.ndarray
+            (k, 2) ids of points in contacts deeper than wakeDepth. Wherever one point is frozen and the other belongs to an active
+            body which hasn't slowed below sleepSpeed, the frozen body wakes
+        speed : np.ndarray
+            Speed of every point, by id
+        '''
+        if self.active == None:
+            return
+        fastest = np.zeros(len(self.softBodies))
+        np.maximum.at(fastest, self.pointBody, speed)
+
+        bodies = self.pointBody[pairs.reshape(-1, 2)]
+        moving = np.isin(bodies, [b for b in self.active if fastest[b] >= self.sleepSpeed])
+        frozen = ~np.isin(bodies, list(self.active))
+        woken = np.concatenate((bodies[moving[:, 0] & frozen[:, 1], 1], bodies[moving[:, 1] & frozen[:, 0], 0]))
+        for b in np.unique(woken):
+            self.active.add(int(b))
+            self.quiet[int(b)] = 0
+
+        held = set(int(self.pointBody[i]) for i in self.grabOffsets)
+        for b in list(self.active):
+            self.quiet[b] = self.quiet.get(b, 0) + 1 if fastest[b] < self.sleepSpeed and b not in held else 0
+            if self.quiet[b] >= self.sleepSteps:
+                self.active.discard(b)
+                del self.quiet[b]
+                for p in self.softBodies[b].points:
+                    p.velocity = pg.Vector2(0,0)
+
+    def trace(self, name: str, args: dict | None = None, cat: str = "engine"):
+        '''
+        A span on the tracer's timeline, or a with block that does nothing if there is no tracer
+        '''
+        return NO_TRACE if self.tracer == None else self.tracer.span(name, cat, args)
+
+    def phase(self, name: str | None):
+        if self.tracer != None:
+            self.tracer.phase(name)
+
+    def traceCounters(self):
+        if self.tracer != None:
+            self.tracer.counter("contacts", {"contacts": len(self.contacts), "new": self.newContacts})
+            self.tracer.counter("constraints", {"constraints": len(self.constraintIndex0)})
+            self.tracer.counter("active points", {"points": len(self.points) if self.active == None else len(self.activePoints())})
+
+    def positions(self) -> np.ndarray:
+        '''
+        Returns an (n, 2) copy of every point's position
+        '''
+        return self.store.array[:, 0:2].copy()
+
+    def velocities(self) -> np.ndarray:
+        '''
+        Returns an (n, 2) copy of every point's velocity
+        '''
+        return self.store.array[:, 2:4].copy()
+
+    def setState(self, pos: np.ndarray, vel: np.ndarray):
+        '''
+        Sets every point's position and velocity from (n, 2) arrays and clears their resolutions
+        '''
+        self.store.array[:, 0:2] = pos
+        self.store.array[:, 2:4] = vel
+        self.store.array[:, 6:12] = 0
+
+    def metrics(self) -> Metrics:
+        '''
+        Measures kinetic energy, penetration and constraint strain for the whole engine at once
+        '''
+        pos = self.positions()
+        vel = self.velocities()
+        kineticEnergy = 0.5 * float((vel * vel).sum())
+
+        maxPenetration = max((c.depth for c in self.contacts.values()), default=0)
+        self.lastMetrics = Metrics(kineticEnergy, maxPenetration, self.strain(pos), len(self.points))
+        return self.lastMetrics
+
+    def strain(self, pos: np.ndarray) -> float:
+        '''
+        Root mean square relative stretch of every constraint with the points at pos
+        '''
+        if len(self.constraintDistance) == 0:
+            return 0.0
+        length = np.linalg.norm(pos[self.constraintIndex1] - pos[self.constraintIndex0], axis=1)
+        relative = (length - self.constraintDistance) / self.constraintDistance
+        relative = np.where(self.constraintHard, np.maximum(relative, 0), relative) # Hard constraints are only strained when stretched past their distance
+        return float(np.sqrt((relative * relative).mean()))
+
+    def run(self, dt: float, maxSteps: int, convergence: Convergence | None = None, checkEvery: int = 1) -> int:
+        '''
+        Steps the engine without drawing anything until it converges or maxSteps is reached.
+
+        Parameters
+        ----------
+        convergence : Convergence | None (Default = None)
+            Criteria to stop early on. If None, always runs maxSteps
+        checkEvery : int (Default = 1)
+            How many steps to take between convergence checks
+
+        Returns
+        -------
+        int
+            The number of steps taken
+        '''
+        for i in range(maxSteps):
+            self.step(dt)
+            if convergence != None and (i + 1) % checkEvery == 0 and convergence.check(self.metrics()):
+                return i + 1
+        return maxSteps
+
+    def step(self, dt):
+        '''
+        Advances the simulation by dt, split into substeps. While the scene is settled the step is split into minSubsteps instead of substeps.
+
+        Returns
+        -------
+        int
+            The number of substeps taken
+        '''
+        substeps = self.minSubsteps if self.settled(dt) else self.substeps
+        with self.trace("step", {"substeps": substeps}):
+            for i in range(substeps):
+                with self.trace("substep"):
+                    self.update(dt/substeps)
+        return substeps
+
+    def settled(self, dt) -> bool:
+        '''
+        Whether the last substep found no new contacts, no deep contacts, and no point fast enough to tunnel through another when stepping dt in minSubsteps.
+        An engine which hasn't taken a substep since its bodies were set knows nothing about them yet, so it isn't settled.
+        '''
+        return (self.stepped
+                and self.newContacts == 0 
+                and self.maxDepth < self.settledDepth 
+                and self.maxSpeed * dt / self.minSubsteps < PointMass.radius / 2)
+
+    def touchContact(self, key: tuple, normal: pg.Vector2, depth: float) -> Contact:
+        '''
+        Fetches the persistent contact with the provided key, creating it if it didn't exist last substep, and refreshes its normal and depth.
+        '''
+        contact = self.contacts.get(key)
+        if contact == None:
+            contact = Contact(key)
+            self.contacts[key] = contact
+            self.newContacts += 1
+        contact.normal = normal
+        contact.depth = depth
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+        self.touchedContacts.add(key)
+        return contact
+
+    def ageContacts(self):
+        '''
+        Drops every contact which wasn't touched during this substep and ages the rest.
+        '''
+        for key in list(self.contacts):
+            if key in self.touchedContacts:
+                self.contacts[key].age += 1
+            else:
+                del self.contacts[key]
+        self.touchedContacts.clear()
 
     def update(self, dt):
         '''
         Function that simulates one "tick" of physics, where the length of the tick is dictated by the dt variable.
         '''
+        self.stepped = True
+
+        if self.solver == "xpbd":
+            self.updateXPBD(dt)
+            return
+
+        self.phase("integrate")
+        self.newContacts = 0
+        self.maxDepth = 0
+        self.maxSpeed = 0
+        points = self.activePoints()
 
         #update position as the current position plus the velocity x the change in time.
-        for p in self.points:
+        for p in points:
             p.position += p.velocity * dt
+            speed = p.velocity.length()
+            if speed > self.maxSpeed:
+                self.maxSpeed = speed
+        self.positionVectors = [p.position for p in self.points]
+        self.velocityVectors = [p.velocity for p in self.points]
+        self.pointIndex = PointIndex(self.positions(), PointMass.radius * 2)
 
         # NOTE: I think during the expansion step this won't work. This may require more exhaustive collision detection/resolution
 
+        self.phase("collisions")
         # Check for the various types of forces and other things we need to apply to each point
-        for p in self.points:
+        for p in points:
 
             # Create a list of point2point collisions for point p
             collisions = self.findCollision(p)
             r = self.resolveCollisions(p, collisions) # Based on that list of collisions, create a resolution for point p
             if r != None: # If there actually is a resulting resolution
                 p.amendResolution(r) # Amend p's current resolution
+
+            # A point touching a vertex is already pushed away from it, so skip the edges on either side of that vertex
+            touching: set[int] = {c.key[2] for c in collisions if c.depth > 0 and c.key != None and c.key[0] == "point"}
             
-            resolution = self.checkAndResolveEdgeCollisions(p)
+            resolution = self.checkAndResolveEdgeCollisions(p, touching)
             if resolution != None: # If there actually is a resolution
                 p.amendResolution(resolution[0]) # Amend the resolution of the current point
 
                 for r in range(len(resolution[1])):
                     self.points[resolution[1][r][1]].amendResolution(resolution[1][r][0])
-            
+
+        # Frozen points never move, but active edges can still run into them, so check them against the active edges only
+        if self.active != None:
+            edges = [c for b in sorted(self.active) for c in self.softBodies[b].outerConstraints]
+            for p in self.points:
+                if not self.frozen(p):
+                    continue
+                resolution = self.checkAndResolveEdgeCollisions(p, edges=edges)
+                if resolution != None:
+                    for r in range(len(resolution[1])):
+                        self.points[resolution[1][r][1]].amendResolution(resolution[1][r][0])
+
+        if self.solver == "implicit":
+            self.phase("implicit springs")
+            self.resolveSpringsImplicit(dt)
+        self.phase("drags")
+        self.resolveDrags(dt)
+        self.phase("constraints")
 
         '''
         CONSTRAINT RESOLUTION
         For each constraint, identify the points involved and update their resolution based on the constraint
         '''
-        for c in self.outerConstraints + self.innerConstraints: 
+        for c in self.activeConstraints(): 
             
             # Grab position values for the two involved points
-            p0 = self.points[c.index0].position
-            p1 = self.points[c.index1].position
+            p0 = self.positionVectors[c.index0]
+            p1 = self.positionVectors[c.index1]
 
             # Find the delta and distance
             delta: pg.Vector2 = p1 - p0 # This points from p0 to p1
@@ -452,8 +1460,8 @@ class Engine:
                     normal: pg.Vector2 = delta/distance
                     # p0 should be pushed in the direction of the normal, p1 against
                     # Grab velocities
-                    v0 = self.points[c.index0].velocity
-                    v1 = self.points[c.index1].velocity
+                    v0 = self.velocityVectors[c.index0]
+                    v1 = self.velocityVectors[c.index1]
 
                     # Find relative velocity and split into components
                     relVelocity = v1 - v0
@@ -486,7 +1494,7 @@ class Engine:
                     self.points[c.index0].amendResolution(Resolution(sumPos0, -force0, pg.Vector2(0,0)))
                     self.points[c.index1].amendResolution(Resolution(sumPos1, -force1, pg.Vector2(0,0)))
                     
-            else: # If the constraint isn't hard, then apply dampened force towards the desired distance according to the spring constant
+            elif self.solver == "impulse": # If the constraint isn't hard, then apply dampened force towards the desired distance according to the spring constant
                 
                 sumPos0: pg.Vector2 = pg.Vector2(0,0)
                 sumPos1: pg.Vector2 = pg.Vector2(0,0)
@@ -496,8 +1504,8 @@ class Engine:
                 force: pg.Vector2 = (targetDelta - delta) * c.springConst # Find undampened force based on desired minus actual times constant
 
                 # Grab velocities for calculations
-                v0: pg.Vector2 = self.points[c.index0].velocity
-                v1: pg.Vector2 = self.points[c.index1].velocity
+                v0: pg.Vector2 = self.velocityVectors[c.index0]
+                v1: pg.Vector2 = self.velocityVectors[c.index1]
 
                 # Initialize sumVel vectors for both points.
                 sumVel0: pg.Vector2 = force * -dt
@@ -522,47 +1530,271 @@ class Engine:
         END CONSTRAINT RESOLUTION
         '''
 
+        self.phase("apply")
         for p in self.points: # For each point, apply its resolution
             
+            if self.frozen(p): # Frozen points are obstacles, so anything pushing on them is dropped
+                p.clearResolution()
+                continue
             #print(str(p) + " pre-resolution: " + str(p.resolution))
             p.applyResolution()
             #print(str(p) + " post-resolution: " + str(p.resolution))
 
-    # creates Collisions for particle p with respect to all other particles
-    def findCollision(self, p: PointMass) -> list[Collision]:   
+        self.phase("contacts")
+        if self.active != None:
+            deep = [key[1:3] for key in self.touchedContacts if key[0] != "wall" and self.contacts[key].depth > self.wakeDepth]
+            self.updateRegion(np.array(deep, dtype=int).reshape(-1, 2), np.linalg.norm(self.velocities(), axis=1))
+        self.ageContacts()
+        self.phase(None)
+        self.traceCounters()
 
-        #remove p from points to avoid considering consideration of self collision. 
-        #This works since structural changes aren't back propogated in a shallow copy
-        copy = self.points.copy()
-        copy.remove(p)
+    def resolveSpringsImplicit(self, dt):
+        '''
+        Integrates every soft constraint at once with backward Euler, amending each point's resolution with its velocity change.
+        
+        Each spring contributes a 2x2 block B = dt*c*nn^T + dt^2*K to the system (I + dt*D + dt^2*K) dv = dt*(f - D v - dt*K v),
+        where K is the spring's stiffness (with its transverse part clamped so the system stays positive definite) and c is half
+        the damping rate. The blocks are kept per constraint, a block sparse matrix, and the system is solved matrix free with
+        conjugate gradient.
+        '''
+        soft = ~self.constraintHard
+        i0 = self.constraintIndex0[soft]
+        i1 = self.constraintIndex1[soft]
+        if len(i0) == 0:
+            return
+        rest = self.constraintDistance[soft]
+        k = self.constraintSpring[soft]
+        pos = self.positions()
+        vel = self.velocities()
+
+        delta = pos[i1] - pos[i0]
+        length = np.maximum(np.linalg.norm(delta, axis=1), 1e-9)
+        n = delta / length[:, None]
+        nn = n[:, :, None] * n[:, None, :]
+
+        # Spring forces (on point 0; point 1 gets the opposite) and the per constraint blocks
+        force = (k * (length - rest))[:, None] * n
+        transverse = np.maximum(1 - rest / length, 0)
+        stiffness = k[:, None, None] * (nn + transverse[:, None, None] * (np.eye(2) - nn))
+        damping = self.springDamping / 2 * nn
+        dampingBlock = dt * damping
+        block = dampingBlock + dt * dt * stiffness
+
+        def apply(blocks: np.ndarray, x: np.ndarray) -> np.ndarray:
+            '''
+            Multiplies x by the assembled Laplacian-like matrix of the blocks (without the identity)
+            '''
+            rel = np.einsum("cij,cj->ci", blocks, x[i0] - x[i1])
+            result = np.zeros_like(x)
+            np.add.at(result, i0, rel)
+            np.add.at(result, i1, -rel)
+            return result
+
+        # Right hand side: dt*f - dt*D v - dt^2*K v
+        f = np.zeros_like(pos)
+        np.add.at(f, i0, force)
+        np.add.at(f, i1, -force)
+        rhs = dt * f - apply(dampingBlock, vel) - apply(dt * dt * stiffness, vel)
+
+        # Frozen points keep dv = 0, so the system is solved over the free points only
+        free = np.ones((len(pos), 1))
+        if self.active != None:
+            free[~np.isin(self.pointBody, list(self.active))] = 0
+        rhs *= free
+
+        # Conjugate gradient on (I + blocks) dv = rhs
+        dv = np.zeros_like(pos)
+        r = rhs.copy()
+        d = r.copy()
+        rr = float((r * r).sum())
+        stop = self.implicitTolerance ** 2 * max(rr, 1e-30)
+        for it in range(self.implicitIterations):
+            if rr <= stop:
+                break
+            Ad = (d + apply(block, d)) * free
+            alpha = rr / float((d * Ad).sum())
+            dv += alpha * d
+            r -= alpha * Ad
+            rrNew = float((r * r).sum())
+            d = r + (rrNew / rr) * d
+            rr = rrNew
+
+        self.store.array[:, 8:10] += dv # Added to every point's resolution velocity
+
+    def findContactsXPBD(self, pos: np.ndarray, margin: float) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        findContacts over every point, edge and wall (through the wall index). Contacts already touching are recorded in the persistent contact cache.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            (k, 2) point pairs, (k, 3) point/edge start/edge end triples, (k, 2) point/wall pairs, and the index of each edge pair's
+            outer constraint
+        '''
+        r = PointMass.radius
+        pointPairs, distance, edgePairs, edge, wallPairs = findContacts(pos, np.arange(len(pos)), np.arange(self.outerCount),
+                                                                        self.constraintIndex0, self.constraintIndex1, self.wallArray, self.wallIndex, r, margin)
+        touching = distance < 2 * r
+        for (p, q), d in zip(pointPairs[touching], distance[touching]):
+            self.touchContact(("point", int(p), int(q)), pg.Vector2(0,0), float(2 * r - d))
+        return pointPairs, edgePairs, wallPairs, edge
+
+    def updateXPBD(self, dt):
+        '''
+        Simulates one substep by projecting positions (extended position based dynamics). Every projection pass handles all
+        constraints and contacts at once, Jacobi style: corrections for each point are averaged, then applied together.
+        Soft constraints have compliance 1/springConst, hard constraints only act when stretched, and contacts only when overlapping.
+        Velocities are then read off the change in position, leaving out the contact pushes that undo overlap from before the
+        substep (see splitOverlap). Contacts get a velocity response using the engine's elasticity and friction, and soft
+        constraints get the engine's spring damping. Frozen points have zero inverse mass, so they are never moved.
+        '''
+        self.phase("integrate")
+        self.newContacts = 0
+        self.maxDepth = 0
+        r = PointMass.radius
+        pos = self.positions()
+        vel = self.velocities()
+        n = len(pos)
+        if n == 0:
+            self.phase(None)
+            return
+        speed = np.sqrt((vel * vel).sum(axis=1))
+        self.maxSpeed = float(speed.max())
+        w = np.ones(n) # Inverse mass of every point
+        if self.active != None:
+            w[~np.isin(self.pointBody, list(self.active))] = 0
+
+        prev = pos.copy()
+        pos += vel * dt
+        predicted = pos.copy()
+
+        self.phase("find contacts")
+        pointPairs, edgePairs, wallPairs, edges = self.findContactsXPBD(pos, self.maxSpeed * dt)
+        self.phase("project")
+        walls = self.wallArray[wallPairs[:, 1]]
+
+        i0, i1 = self.constraintIndex0, self.constraintIndex1
+        compliance = np.where(self.constraintHard, self.hardCompliance, 1 / np.maximum(self.constraintSpring, 1e-9)) / (dt * dt)
+        contactCompliance = self.hardCompliance / (dt * dt)
+        lambdas = np.zeros(len(i0))
+        fresh = [np.maximum(now - start, 0) for start, now in zip(contactDepths(prev, pointPairs, edgePairs, wallPairs, walls, r),
+                                                                  contactDepths(pos, pointPairs, edgePairs, wallPairs, walls, r))]
+        oldShift = np.zeros_like(pos) # How far contacts have pushed each point to undo overlap from before this substep
+        bounds = [self.WIDTH - r, self.HEIGHT - r]
+        outside = np.abs(prev - np.clip(prev, r, bounds)) # How far each point started outside the bounding box
+        dragged, targets = self.dragTargets()
+        dragCompliance = 1 / (self.dragSpring * dt * dt)
+        dragLambdas = np.zeros_like(targets)
+
+        for iteration in range(self.xpbdIterations):
+            correction = np.zeros_like(pos)
+            oldCorrection = np.zeros_like(pos)
+            counts = np.zeros(n)
+
+            projectConstraints(pos, i0, i1, self.constraintDistance, self.constraintHard, compliance, lambdas, w, correction, counts)
+            projectPointContacts(pos, pointPairs, r, contactCompliance, w, fresh[0], correction, oldCorrection, counts)
+            projectEdgeContacts(pos, edgePairs, r, contactCompliance, w, fresh[1], correction, oldCorrection, counts)
+            projectWallContacts(pos, wallPairs, walls, r, contactCompliance, w, fresh[2], correction, oldCorrection, counts)
+
+            # Drags: zero length springs to fixed targets, C = target - position on each axis
+            dl = (targets - pos[dragged] - dragCompliance * dragLambdas) / (w[dragged] + dragCompliance)[:, None]
+            dragLambdas += dl
+            np.add.at(correction, dragged, w[dragged, None] * dl)
+            np.add.at(counts, dragged, 1)
+
+            scale = self.xpbdRelaxation / np.maximum(counts, 1)[:, None]
+            pos += correction * scale
+            oldShift += oldCorrection * scale
+
+            # Bounding box. Pulling a point back in is old overlap for as far as it started outside
+            clipped = np.clip(pos, r, bounds)
+            pulled = np.clip(clipped - pos, -outside, outside)
+            outside -= np.abs(pulled)
+            oldShift += pulled
+            pos = clipped
+
+        self.phase("velocities")
+        before = vel
+        vel = pushFreeVelocity(pos - prev, oldShift, dt)
+        damping = np.zeros_like(vel)
+        soft = ~self.constraintHard
+        dampSprings(pos, vel, i0[soft], i1[soft], self.springDamping, dt, damping)
+        bounce = np.zeros_like(vel)
+        counts = np.zeros(n)
+        bouncePointContacts(pos, vel, before, pointPairs, r, self.elasticity, self.friction, bounce, counts)
+        bounceEdgeContacts(pos, vel, before, edgePairs, r, self.elasticity, self.friction, bounce, counts)
+        bounceWalls(pos, vel, before, np.arange(n), wallPairs, walls, r, self.elasticity, self.friction, self.WIDTH, self.HEIGHT, bounce, counts)
+        vel += damping + bounce / np.maximum(counts, 1)[:, None]
+        vel[dragged] *= math.exp(-self.dragDamping * dt)
+        vel *= w[:, None]
+
+        self.phase("region")
+        if self.active != None:
+            # Contacts deeper than wakeDepth, before this substep's projection pushed them apart
+            p, q = pointPairs[:, 0], pointPairs[:, 1]
+            deep = [np.stack((p, q), axis=1)[np.linalg.norm(predicted[q] - predicted[p], axis=1) < 2 * r - self.wakeDepth]]
+            p, a, b = edgePairs[:, 0], edgePairs[:, 1], edgePairs[:, 2]
+            surf = predicted[b] - predicted[a]
+            slider = ((predicted[p] - predicted[a]) * surf).sum(axis=1) / np.maximum((surf * surf).sum(axis=1), 1e-9)
+            distance = np.linalg.norm(predicted[p] - (predicted[a] + surf * slider[:, None]), axis=1)
+            deep.append(np.stack((p, a), axis=1)[(distance < 1.7 * r - self.wakeDepth) & (slider > 0) & (slider < 1)])
+            self.updateRegion(np.concatenate(deep), np.sqrt((vel * vel).sum(axis=1)))
+
+        self.phase("apply")
+        self.setState(pos, vel)
+
+        self.ageContacts()
+        self.phase(None)
+        self.traceCounters()
+
+    # creates Collisions for particle p with respect to all other particles it overlaps
+    def findCollision(self, p: PointMass) -> list[Collision]:   
 
         Collisions: list[Collision] = []
+        positions, velocities = self.positionVectors, self.velocityVectors
+        position, velocity = positions[p.id], velocities[p.id]
 
         # Find bounding collisions
-        if (p.position.x + p.radius) > self.WIDTH:
+        if (position.x + p.radius) > self.WIDTH:
             normal: pg.Vector2 = pg.Vector2(-1, 0)
-            depth: float = (p.position.x + p.radius) - self.WIDTH
-            Collisions.append(Collision(normal, depth, p.velocity, pg.Vector2(0, 0), True))
-        if (p.position.x - p.radius) < 0:
+            depth: float = (position.x + p.radius) - self.WIDTH
+            Collisions.append(Collision(normal, depth, velocity, pg.Vector2(0, 0), True))
+        if (position.x - p.radius) < 0:
             normal: pg.Vector2 = pg.Vector2(1, 0)
-            depth: float = 0 - (p.position.x - p.radius)
-            Collisions.append(Collision(normal, depth, p.velocity, pg.Vector2(0, 0), True))
-        if (p.position.y + p.radius) > self.HEIGHT:
+            depth: float = 0 - (position.x - p.radius)
+            Collisions.append(Collision(normal, depth, velocity, pg.Vector2(0, 0), True))
+        if (position.y + p.radius) > self.HEIGHT:
             normal: pg.Vector2 = pg.Vector2(0, -1)
-            depth: float = (p.position.y + p.radius) - self.HEIGHT
-            Collisions.append(Collision(normal, depth, p.velocity, pg.Vector2(0, 0), True))
-        if (p.position.y - p.radius) < 0:
+            depth: float = (position.y + p.radius) - self.HEIGHT
+            Collisions.append(Collision(normal, depth, velocity, pg.Vector2(0, 0), True))
+        if (position.y - p.radius) < 0:
             normal: pg.Vector2 = pg.Vector2(0, 1)
-            depth: float = 0 - (p.position.y - p.radius)
-            Collisions.append(Collision(normal, depth, p.velocity, pg.Vector2(0, 0), True))
+            depth: float = 0 - (position.y - p.radius)
+            Collisions.append(Collision(normal, depth, velocity, pg.Vector2(0, 0), True))
+
+        # Find Wall collisions, only checking the walls the index says are nearby
+        for w in self.wallIndex.query(position):
+            delta: pg.Vector2 = position - w.closestPoint(position)
+            distance: float = delta.length()
+            depth: float = p.radius + w.radius - distance
+            if depth > 0:
+                if distance > 0:
+                    normal: pg.Vector2 = delta/distance
+                else: # If the point is exactly on the wall, push it out along the wall's normal
+                    normal: pg.Vector2 = (w.pos1 - w.pos0).rotate(90).normalize()
+                Collisions.append(Collision(normal, depth, velocity, pg.Vector2(0, 0), True, ("wall", p.id, w.id)))
             
-        # Find PointMass collisions
-        for q in copy:
-            delta: pg.Vector2 = p.position - q.position
+        # Find PointMass collisions, only checking the points the index says are nearby, and only keeping the ones which overlap
+        for q in self.pointIndex.near(position):
+            if q == p.id:
+                continue
+            delta: pg.Vector2 = position - positions[q]
             distance: float = delta.length()
+            depth: float = p.radius + self.points[q].radius - distance
+            if depth <= 0:
+                continue
             normal: pg.Vector2 = delta/distance
-            depth: float = p.radius + q.radius - distance
-            Collisions.append(Collision(normal, depth, p.velocity, q.velocity, False))
+            Collisions.append(Collision(normal, depth, velocity, velocities[q], False, ("point", p.id, int(q))))
 
         return Collisions
 
@@ -591,9 +1823,18 @@ class Engine:
                     proportion: float = p.velocity.project(c.normal).length() / (p.velocity.project(c.normal).length() + c.v2.project(c.normal).length())
                     sumPos += c.normal * c.depth * proportion
 
+                # Warm start: if this contact persisted from the last substep, start from a fraction of its previous impulse
+                # and solve for the remainder against the velocity that impulse would leave p with
+                contact: Contact | None = None
+                warm: pg.Vector2 = pg.Vector2(0, 0)
+                if c.key != None:
+                    contact = self.touchContact(c.key, c.normal, c.depth)
+                    if contact.age > 0:
+                        warm = contact.impulse * self.warmStart
+
                 # CREDIT TO: Iksha Phipps for assistance with this math
                 #compute relative velocity (and split it into tangential and normal)
-                relVelocity = p.velocity - c.v2
+                relVelocity = p.velocity + warm - c.v2
                 relVelocityN = relVelocity.project(c.normal)
                 relVelocityT = relVelocity - relVelocityN
 
@@ -611,7 +1852,7 @@ class Engine:
                 if c.wall:
                     force += relVelocityN * self.elasticity
 
-                sumVel -= force
+                sumVel += warm - force if contact == None else contact.clamp(warm - force)
 
                 #print("Point2Point: Adding to " + str(p) + str(sumVel))
             
@@ -621,11 +1862,20 @@ class Engine:
         # and return it to the upper layer for eventual execution
         return Resolution(sumPos, sumVel, sumAccel)
     
-    def checkAndResolveEdgeCollisions(self, p: PointMass) -> tuple[Resolution, list[tuple[Resolution, int]]] | None:
+    def checkAndResolveEdgeCollisions(self, p: PointMass, touching: set[int] | None = None, edges: list[Constraint] | None = None) -> tuple[Resolution, list[tuple[Resolution, int]]] | None:
         '''
         Function that checks if the provided PointMass is colliding with any outerConstraints. If so, calculate and provide resolutions for all involved points, and indicate which points are involved.
+
+        Parameters
+        ----------
+        touching : set[int] | None (Default = None)
+            ids of the points p is already in contact with. Edges ending at one of these points are skipped, so a point resting on a vertex isn't also pushed by the two edges meeting there.
+        edges : list[Constraint] | None (Default = None)
+            The edges to check against. Defaults to every outer constraint
         '''
 
+        touching = set() if touching == None else touching
+
         # Create variables to store changes for the point
         sumPos = pg.Vector2(0, 0)
         sumVel = pg.Vector2(0, 0)
@@ -637,21 +1887,26 @@ class Engine:
         
         noCollisions = True # Set a noCollisions flag so we can return a None if it is never flipped
         otherResolutions: list[tuple[Resolution, int]] = []
+        positions, velocities = self.positionVectors, self.velocityVectors
+        position, velocity = positions[p.id], velocities[p.id]
 
-        # NOTE: Can cull duplicate/triplicate collisions by removing from consideration edges which are connected to points that have been collided with
         # Find PointMass to Edge collisions among eligible edges (all edges minus any connected to p, and any connected to a point p has collided with this frame)
-        for c in self.outerConstraints: # Each constraint acts as an edge, so we iterate through edges to check for collision
+        for c in self.outerConstraints if edges == None else edges: # Each constraint acts as an edge, so we iterate through edges to check for collision
 
             # Do not perform for constraints connected to current PointMass
             if p.id == c.index0 or p.id == c.index1:
                 continue
 
+            # Do not perform for constraints connected to a point p is already touching
+            if c.index0 in touching or c.index1 in touching:
+                continue
+
             # Can do this by projecting the point onto the edge and determining the point's distance from that projection
 
             # Surf is a vector which has the length and angle of the constraint, but casts out from the origin.
-            surf: pg.Vector2 = self.points[c.index1].position - self.points[c.index0].position
+            surf: pg.Vector2 = positions[c.index1] - positions[c.index0]
             # relocate is the point in question, but which exists relative to the origin in the same way it exists relative to the point at the beginning of the constraint
-            relocate: pg.Vector2 = p.position - self.points[c.index0].position
+            relocate: pg.Vector2 = position - positions[c.index0]
             # proj is the relocated point projected onto the vector of the surface
             proj: pg.Vector2 = relocate.project(surf)
 
@@ -665,7 +1920,7 @@ class Engine:
                 slider: float = proj.magnitude() / surf.magnitude() # this is how proportionally close the projection and point of contact is to point1 from point0
                 
                 # This is probably mathematically incorrect, but we might calculate the projection's velocity as the sum of the endpoint velocities proportional to the slider
-                projVel: pg.Vector2 = (self.points[c.index0].velocity * (1-slider)) + (self.points[c.index1].velocity * slider)
+                projVel: pg.Vector2 = (velocities[c.index0] * (1-slider)) + (velocities[c.index1] * slider)
 
                 # Check the distance between the relocated point and its projection. If it's less than radius*1.6, then collision.
                 if depth > 0: # Resolve collision
@@ -680,9 +1935,15 @@ class Engine:
                     #print(str(p) + " in static collision " + str(c) + ", removed @" + str(sumPos))
 
                     # NOTE: Want to revisit this to work in proportional removal.
+
+                    # Warm start from this contact's previous impulse, as with point to point collisions
+                    contact: Contact = self.touchContact(("edge", p.id, c.index0, c.index1), normal, depth)
+                    warm: pg.Vector2 = pg.Vector2(0, 0)
+                    if contact.age > 0:
+                        warm = contact.impulse * self.warmStart
                 
                     # Compute relative momentum (and split it into tangential and normal)
-                    relMomentum = p.velocity - momentumMult * projVel
+                    relMomentum = velocity + warm - momentumMult * projVel
                     relMomentumN = relMomentum.project(normal)
                     relMomentumT = relMomentum - relMomentumN
 
@@ -696,7 +1957,7 @@ class Engine:
                     # Tangential force (friction)
                     impulse += relMomentumT*2/3 * self.friction
 
-                    sumVel -= impulse
+                    sumVel += contact.clamp(warm - impulse)
 
                     #print("Edge: Adding to " + str(p) + str(sumVel))
                     
@@ -742,4 +2003,13 @@ class Engine:
         Function which calls scaleShapeMult on every softBody with the provided x value.
         '''
         for b in self.softBodies:
-            b.scaleShapeMult(x)
\ No newline at end of file
+            b.scaleShapeMult(x)
+        self.constraintDistance *= x
+
+    def scaleSoftBody(self, body: int, x: float):
+        '''
+        Scales a single body's constraints by x, and wakes it and its neighbours if only part of the engine is being simulated
+        '''
+        self.softBodies[body].scaleShapeMult(x)
+        self.constraintDistance[self.constraintBody == body] *= x
+        self.activate(body)
\ No newline at end of file
@@ -0,0 +1,176 @@
+# Authored by Athena Osborne
+# Headless layout generation: room graph -> seeded SoftBodies -> simulation -> partition -> layout record
+#
+# Usage: python3 Pipeline.py <layouts.jsonl or layouts.bin> [--seeds 0 100] [--solver impulse] [--capacity 17] [--cache <directory>] [--append] [--dedup]
+
+from typing import Callable, Iterable, Iterator
+from Generation import Generation, GraphDedup, RoomGraph, defaultAdjacency
+from Physics import Engine, PointMass, SoftBody, Wall, Convergence
+from Placement import seedSoftBodies, targetAreas
+import numpy as np
+import Cache
+import Export
+import Multires
+import Partition
+import Tiling
+
+# Parameters used for anything a job doesn't specify. The engine values match runSim
+DEFAULTS: dict = {"capacity": 17, "anchor": "FOYER", "WIDTH": 1000, "HEIGHT": 800,
+                  "elasticity": 0.75, "friction": 0.5, "springDamping": 2, "solver": "impulse", "xpbdIterations": 4, "multires": False, "coarseSteps": 500,
+                  "workers": 0, "dedup": False,
+                  "dt": 1/60, "maxSteps": 2000, "progressEvery": 50,
+                  "kineticEnergy": 2, "maxPenetration": 1, "strain": 0.05, "patience": 10}
+
+def graphFromLists(rooms: list[str], edges: list[list[int]]) -> RoomGraph:
+    '''
+    Builds a RoomGraph from room type names and [room, room] edges, as stored in layout records
+    '''
+    names = sorted(set(rooms))
+    G = RoomGraph(names)
+    for r in rooms:
+        G.addRoom(names.index(r))
+    for a, b in edges:
+        G.connect(a, b)
+    return G
+
+def resetIDs():
+    PointMass.IDCounter = 0
+    Wall.IDCounter = 0
+    SoftBody.IDCounter = 0
+
+def prepare(job: dict) -> tuple[dict, RoomGraph, Engine]:
+    '''
+    Fills in defaults for a job and builds its room graph and (unstepped) engine.
+    A job is a dict with a "seed", optionally a "graph" ({"rooms": [...], "edges": [...]}) and any of the keys in DEFAULTS.
+    Jobs with "dedup" set to True opt into reusing the layout of any graph which only differs from theirs by room
+    numbering, whatever seed and starting bodies it was simulated from (see cachedLayout and sweep).
+    Without a graph, one is generated from the seed and the default adjacency graph.
+    '''
+    params = dict(DEFAULTS)
+    params.update({k: v for k, v in job.items() if k in DEFAULTS})
+    seed = int(job.get("seed", 0))
+
+    if job.get("graph") != None:
+        G = graphFromLists(job["graph"]["rooms"], job["graph"]["edges"])
+    else:
+        G = Generation(defaultAdjacency(), params["capacity"], params["anchor"]).generate(seed)
+
+    resetIDs()
+    if params["multires"]:
+        bodies, sides = Multires.seedCoarseBodies(G, params["WIDTH"], params["HEIGHT"], seed=seed)
+    else:
+        bodies = seedSoftBodies(G, params["WIDTH"], params["HEIGHT"], seed=seed)
+    e = Engine(bodies, [], params["elasticity"], params["friction"], params["springDamping"], params["WIDTH"], params["HEIGHT"])
+    e.solver = params["solver"]
+    e.xpbdIterations = params["xpbdIterations"]
+    return params, G, e
+
+def simulate(params: dict, seed: int, G: RoomGraph, e: Engine, progress: Callable[[dict], None] | None = None) -> dict:
+    '''
+    Runs the engine until it converges or runs out of steps, reporting progress every progressEvery steps, and returns the layout record.
+    Multires jobs first run their coarse proxies for up to coarseSteps, then refine them and run for up to maxSteps more.
+    xpbd jobs with workers above 0 run (their fine phase) split across that many processes with Tiling.TiledEngine.
+    '''
+    steps = 0
+    if params["multires"]:
+        rest = Multires.restPositions(e)
+        steps = e.run(params["dt"], params["coarseSteps"], Multires.coarseCriteria())
+        if progress != None:
+            m = e.metrics()
+            progress({"step": steps, "phase": "coarse", "kineticEnergy": m.kineticEnergy, "maxPenetration": m.maxPenetration, "strain": m.strain})
+        Multires.refine(e, np.sqrt(targetAreas(G, params["WIDTH"], params["HEIGHT"])), rest)
+
+    convergence = Convergence(params["kineticEnergy"], params["maxPenetration"], params["strain"], params["patience"])
+    runner = e if params["workers"] <= 0 else Tiling.TiledEngine(e, params["workers"])
+    try:
+        fine = 0
+        while fine < params["maxSteps"]:
+            chunk = min(params["progressEvery"], params["maxSteps"] - fine)
+            taken = runner.run(params["dt"], chunk, convergence)
+            fine += taken
+            steps += taken
+            if progress != None:
+                m = e.lastMetrics if e.lastMetrics != None else runner.metrics()
+                progress({"step": steps, "kineticEnergy": m.kineticEnergy, "maxPenetration": m.maxPenetration, "strain": m.strain})
+            if taken < chunk:
+                break
+        final = runner.metrics()
+    finally:
+        if runner != e:
+            runner.sync()
+            runner.close()
+    return Export.layoutRecord(seed, G, Partition.extract(e), final, steps)
+
+def cachedLayout(params: dict, seed: int, G: RoomGraph, e: Engine, progress: Callable[[dict], None] | None = None, cache: Cache.LayoutCache | None = None) -> dict:
+    '''
+    simulate, through the cache if one is provided. The cache is keyed on the seed, room graph, starting bodies and engine
+    parameters (Cache.cacheKey). Only if the job opts in with dedup is it keyed on the room graph up to room numbering
+    instead (Cache.graphKey), so that any job whose graph is a relabelling of one already laid out reuses that layout.
+    '''
+    if cache == None:
+        return simulate(params, seed, G, e, progress)
+    extra = {k: params[k] for k in ("dt", "maxSteps", "kineticEnergy", "maxPenetration", "strain", "patience", "multires", "coarseSteps")}
+    if not params["dedup"]:
+        return cache.getOrCompute(Cache.cacheKey(seed, G, e, extra), lambda: simulate(params, seed, G, e, progress))
+
+    # Every graph with the same canonical hash shares the key, so its entry holds a layout for each of them
+    key = Cache.graphKey(G, e, extra)
+    entry = cache.get(key)
+    for record in [] if entry == None else entry["layouts"]:
+        mapping = graphFromLists(record["rooms"], record["edges"]).matchTo(G)
+        if mapping != None:
+            return Export.relabelRecord(record, mapping, seed, G)
+    record = simulate(params, seed, G, e, progress)
+    entry = cache.get(key) # Another worker may have added a layout while this one simulated
+    cache.put(key, {"layouts": ([] if entry == None else entry["layouts"]) + [record]})
+    return record
+
+def runLayout(job: dict, progress: Callable[[dict], None] | None = None, cache: Cache.LayoutCache | None = None) -> dict:
+    '''
+    Produces the layout record for a job, through the cache if one is provided
+    '''
+    params, G, e = prepare(job)
+    return cachedLayout(params, int(job.get("seed", 0)), G, e, progress, cache)
+
+def sweep(job: dict, seeds: Iterable[int], cache: Cache.LayoutCache | None = None, dedup: GraphDedup | None = None, writer: Export.LayoutWriter | None = None) -> Iterator[dict]:
+    '''
+    Runs the job once for each seed, yielding the layout records in order as they finish (and writing them to writer first, if provided).
+    With dedup on, seeds whose room graph is a relabelling of one already laid out in the sweep reuse that layout (see
+    GraphDedup) instead of being simulated again. Pass a GraphDedup to share it between sweeps or read its hit counts.
+    '''
+    dedup = GraphDedup() if dedup == None else dedup
+    for seed in seeds:
+        params, G, e = prepare({**job, "seed": seed})
+        if not params["dedup"]:
+            record = cachedLayout(params, seed, G, e, cache=cache)
+        else:
+            record = dedup.get(G, lambda G: cachedLayout(params, seed, G, e, cache=cache),
+                               lambda record, mapping: Export.relabelRecord(record, mapping, seed, G))
+        if writer != None:
+            writer.write(record)
+        yield record
+
+def main():
+    import argparse
+    import time
+    parser = argparse.ArgumentParser(description="Lay out a range of seeds, streaming each layout to a file as it finishes")
+    parser.add_argument("path", help="Where to write the layouts: .jsonl for JSON lines, anything else for the binary format")
+    parser.add_argument("--seeds", type=int, nargs=2, default=[0, 100], metavar=("FIRST", "END"), help="Lay out seeds FIRST up to (not including) END")
+    parser.add_argument("--solver", default=DEFAULTS["solver"])
+    parser.add_argument("--capacity", type=int, default=DEFAULTS["capacity"])
+    parser.add_argument("--cache", default=None, help="Directory for the shared layout cache")
+    parser.add_argument("--append", action="store_true", help="Add to the file instead of replacing it")
+    parser.add_argument("--dedup", action="store_true", help="Reuse the layout of any seed whose room graph is one already laid out, renumbered")
+    args = parser.parse_args()
+
+    job = {"solver": args.solver, "capacity": args.capacity, "dedup": args.dedup}
+    cache = None if args.cache == None else Cache.LayoutCache(args.cache)
+    dedup = GraphDedup()
+    start = time.perf_counter()
+    with Export.openWriter(args.path, args.append) as writer:
+        for record in sweep(job, range(*args.seeds), cache, dedup, writer):
+            print("seed", record["seed"], "steps", record["metrics"]["steps"], "KE", round(record["metrics"]["kineticEnergy"], 2))
+    print("Wrote", dedup.hits + dedup.misses, "layouts in", round(time.perf_counter() - start, 1), "s,", dedup.hits, "reused from relabelled graphs")
+
+if __name__ == "__main__":
+    main()
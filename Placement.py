@@ -0,0 +1,107 @@
+# Authored by Athena Osborne
+# Seeds SoftBody rooms from a room graph so the physics starts from a near valid arrangement instead of untangling one
+
+import math
+import numpy as np
+import pygame as pg
+from Generation import RoomGraph, bits
+from Physics import SoftBody
+
+def targetAreas(G: RoomGraph, WIDTH: int, HEIGHT: int, areas: dict[str, float] | None = None, fill: float = 0.5) -> np.ndarray:
+    '''
+    Finds the target area of every room in the graph.
+
+    Parameters
+    ----------
+    areas : dict[str, float] | None (Default = None)
+        Target area by type name. Types missing from it (or every type, if it's None) share what's left of fill * WIDTH * HEIGHT equally
+    fill : float (Default = 0.5)
+        The fraction of the generation area the rooms should cover between them
+    '''
+    if areas == None:
+        areas = {}
+    result = np.array([areas.get(G.names[t], np.nan) for t in G.types], dtype=float)
+    missing = np.isnan(result)
+    if missing.any():
+        remaining = max(fill * WIDTH * HEIGHT - np.nansum(result), 0)
+        result[missing] = remaining / missing.sum()
+    return result
+
+def adjacencyMatrix(G: RoomGraph) -> np.ndarray:
+    A = np.zeros((len(G), len(G)))
+    for r in range(len(G)):
+        A[r, list(bits(G.adjacency[r]))] = 1
+    return A
+
+def spectralLayout(A: np.ndarray) -> np.ndarray:
+    '''
+    Places rooms using the two smallest nontrivial eigenvectors of the graph Laplacian. Returns positions in [-1, 1]
+    '''
+    n = len(A)
+    if n < 3:
+        return np.array([[-1, 0], [1, 0]][:n], dtype=float)
+    L = np.diag(A.sum(axis=1)) - A
+    values, vectors = np.linalg.eigh(L)
+    pos = vectors[:, 1:3]
+    pos = pos - pos.mean(axis=0)
+    return pos / np.maximum(np.abs(pos).max(axis=0), 1e-9)
+
+def forceDirectedLayout(G: RoomGraph, radii: np.ndarray, WIDTH: int, HEIGHT: int, iterations: int = 300, seed: int | None = None) -> np.ndarray:
+    '''
+    Lays out the room graph so that adjacent rooms touch and no rooms overlap, treating each room as a disc of the provided radius.
+    Every iteration moves all rooms at once: adjacent rooms spring towards touching, every overlapping pair is pushed apart,
+    and rooms are kept inside the generation area.
+
+    Returns
+    -------
+    np.ndarray
+        (n, 2) array of room centers
+    '''
+    n = len(G)
+    rng = np.random.default_rng(seed)
+    A = adjacencyMatrix(G)
+
+    # Start from the spectral layout (plus a little noise to break symmetric ties), stretched over the generation area
+    center = np.array([WIDTH, HEIGHT]) / 2
+    pos = center + (spectralLayout(A) + rng.normal(0, 0.05, (n, 2))) * center * 0.5
+
+    rest = radii[:, None] + radii[None, :] # The distance at which each pair of rooms touch
+    np.fill_diagonal(rest, 0)
+    low = radii[:, None]
+    high = np.array([WIDTH, HEIGHT]) - radii[:, None]
+
+    for i in range(iterations):
+        cooling = 1 - i / iterations
+
+        delta = pos[None, :, :] - pos[:, None, :] # delta[a, b] points from a to b
+        distance = np.linalg.norm(delta, axis=2)
+        np.fill_diagonal(distance, 1)
+        distance = np.maximum(distance, 1e-6)
+
+        # Adjacent rooms pull (or push) towards touching. Everything else only pushes, and only when overlapping
+        weight = np.where(A > 0, 1.0, (distance < rest).astype(float))
+        stretch = weight * (distance - rest) / distance
+        active = np.maximum(weight.sum(axis=1, keepdims=True), 1)
+        pos += 0.5 * cooling * (stretch[:, :, None] * delta).sum(axis=1) / active
+
+        pos = np.clip(pos, low, high)
+
+    return pos
+
+def seedSoftBodies(G: RoomGraph, WIDTH: int, HEIGHT: int, areas: dict[str, float] | None = None, fill: float = 0.5,
+                   iterations: int = 300, seed: int | None = None) -> list[SoftBody]:
+    '''
+    Creates a square edgeSupportedRect per room in the graph, sized to its target area and placed by forceDirectedLayout.
+    PointMass.IDCounter should be reset beforehand as with any other scene.
+
+    Returns
+    -------
+    list[SoftBody]
+        One body per room, in room number order
+    '''
+    sides = np.sqrt(targetAreas(G, WIDTH, HEIGHT, areas, fill))
+    radii = sides / 2 * math.sqrt(2) * 0.8 # Somewhere between the inscribed and circumscribed circles of the square
+    pos = forceDirectedLayout(G, radii, WIDTH, HEIGHT, iterations, seed)
+
+    return [SoftBody().edgeSupportedRect(float(sides[r]), float(sides[r]), pg.Vector2(float(pos[r, 0]), float(pos[r, 1])), 2, 10)
+            for r in range(len(G))]
@@ -0,0 +1,166 @@
+# Authored by Athena Osborne
+# Headless recording: renders every stride-th step of an Engine offscreen with the viewer's visuals and hands the frames to a
+# separate encoder process, which writes them as a PNG sequence or pipes them into ffmpeg, so encoding never blocks the simulation.
+#
+# Usage: python3 Recording.py <output directory or video file> [--seed 0] [--stride 10] [--size 500 400] [--steps 2000] [--solver impulse] [--trace trace.json]
+
+import argparse
+import multiprocessing
+import os
+import queue
+import subprocess
+import pygame as pg
+from Physics import Engine, Convergence
+from Drawing import drawEngine
+from Trace import Tracer
+
+# Outputs with these extensions are encoded as video by ffmpeg. Anything else is a directory to fill with numbered PNGs
+VIDEO_SUFFIXES: tuple[str, ...] = (".mp4", ".mkv", ".webm", ".mov", ".avi", ".gif")
+
+def encodeFrames(frames, output: str, size: tuple[int, int], fps: int):
+    '''
+    Runs in the encoder process: writes raw RGB frames from the queue until it receives None
+    '''
+    encoder: subprocess.Popen | None = None
+    if output.lower().endswith(VIDEO_SUFFIXES):
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", str(size[0]) + "x" + str(size[1]), "-r", str(fps), "-i", "-"]
+        if not output.lower().endswith(".gif"):
+            command += ["-pix_fmt", "yuv420p"]
+        encoder = subprocess.Popen(command + [output], stdin=subprocess.PIPE)
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    count = 0
+    while True:
+        frame = frames.get()
+        if frame == None:
+            break
+        if encoder != None:
+            encoder.stdin.write(frame)
+        else:
+            pg.image.save(pg.image.frombytes(frame, size, "RGB"), os.path.join(output, "frame" + str(count).zfill(6) + ".png"))
+        count += 1
+
+    if encoder != None:
+        encoder.stdin.close()
+        encoder.wait()
+
+class Recorder:
+    '''
+    Renders frames of an Engine offscreen and streams them to an encoder process. Frames are passed through a bounded queue,
+    so if the encoder falls behind the simulation waits for it rather than piling up frames in memory.
+    '''
+
+    def __init__(self, output: str, WIDTH: int, HEIGHT: int, stride: int = 10, size: tuple[int, int] | None = None,
+                 fps: int = 30, queueSize: int = 16):
+        '''
+        Parameters
+        ----------
+        WIDTH, HEIGHT : int
+            Size of the engine's area, which frames are drawn at
+        stride : int (Default = 10)
+            Capture every stride-th step
+        size : tuple[int, int] | None (Default = None)
+            Size of the written frames. Defaults to the engine's size. Video frames are rounded down to even sizes, as most codecs need
+        '''
+        if size == None:
+            size = (WIDTH, HEIGHT)
+        if output.lower().endswith(VIDEO_SUFFIXES):
+            size = (size[0] - size[0] % 2, size[1] - size[1] % 2)
+        self.stride: int = stride
+        self.size: tuple[int, int] = size
+        self.canvas: pg.Surface = pg.Surface((WIDTH, HEIGHT))
+        self.frames = multiprocessing.Queue(maxsize=queueSize)
+        self.encoder = multiprocessing.Process(target=encodeFrames, args=(self.frames, output, size, fps), daemon=True)
+        self.encoder.start()
+        self.captured: int = 0
+
+    def capture(self, e: Engine, step: int | None = None) -> bool:
+        '''
+        Draws the engine and queues the frame, if step is a multiple of the stride (or step is None). Returns whether a frame was captured
+        '''
+        if step != None and step % self.stride != 0:
+            return False
+        with e.trace("render", cat="render"):
+            self.canvas.fill((255, 255, 255))
+            drawEngine(e, self.canvas)
+            frame = self.canvas if self.size == self.canvas.get_size() else pg.transform.smoothscale(self.canvas, self.size)
+            frame = pg.image.tobytes(frame, "RGB")
+        with e.trace("queue frame", cat="render"):
+            self.put(frame)
+        self.captured += 1
+        return True
+
+    def put(self, frame: bytes | None):
+        '''
+        Queues a frame for the encoder, waiting while the queue is full, unless the encoder has died (for example if ffmpeg is missing)
+        '''
+        while True:
+            try:
+                self.frames.put(frame, timeout=1)
+                return
+            except queue.Full:
+                if not self.encoder.is_alive():
+                    self.frames.cancel_join_thread() # Nothing will ever read the frames still buffered, so don't wait on them at exit
+                    raise RuntimeError("The encoder process exited with code " + str(self.encoder.exitcode))
+
+    def close(self):
+        '''
+        Waits for the encoder to write every queued frame
+        '''
+        if self.encoder.is_alive():
+            self.put(None)
+        self.encoder.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def record(e: Engine, dt: float, maxSteps: int, recorder: Recorder, convergence: Convergence | None = None) -> int:
+    '''
+    Engine.run, capturing the starting frame, every stride-th step after it, and the last step
+
+    Returns
+    -------
+    int
+        The number of steps taken
+    '''
+    captured = recorder.capture(e, 0)
+    steps = maxSteps
+    for i in range(maxSteps):
+        e.step(dt)
+        captured = recorder.capture(e, i + 1)
+        if convergence != None and convergence.check(e.metrics()):
+            steps = i + 1
+            break
+    if not captured:
+        recorder.capture(e)
+    return steps
+
+def main():
+    import Pipeline
+    parser = argparse.ArgumentParser(description="Record a headless layout simulation")
+    parser.add_argument("output", help="Directory for a PNG sequence, or a video file (" + ", ".join(VIDEO_SUFFIXES) + ") to encode with ffmpeg")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stride", type=int, default=10, help="Capture every stride-th step")
+    parser.add_argument("--size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"), help="Size of the written frames")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--steps", type=int, default=Pipeline.DEFAULTS["maxSteps"])
+    parser.add_argument("--solver", default=Pipeline.DEFAULTS["solver"])
+    parser.add_argument("--trace", default=None, help="Also write a Chrome trace event timeline of the run to this JSON file")
+    args = parser.parse_args()
+
+    params, G, e = Pipeline.prepare({"seed": args.seed, "solver": args.solver})
+    if args.trace != None:
+        e.tracer = Tracer(args.trace)
+    print(G)
+    convergence = Convergence(params["kineticEnergy"], params["maxPenetration"], params["strain"], params["patience"])
+    with Recorder(args.output, e.WIDTH, e.HEIGHT, args.stride, None if args.size == None else tuple(args.size), args.fps) as recorder:
+        steps = record(e, params["dt"], args.steps, recorder, convergence)
+    print("Recorded " + str(recorder.captured) + " frames over " + str(steps) + " steps")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,31 @@
 # Authored by Athena Osborne, with grammar conceptualization from Jess Martin and Christopher Alexander
 
-import math
+import numpy as np
+from typing import NamedTuple
 
 class Room:
 
-    index: int = 0
+    index: int = 0 # The next room ID to hand out
+    typeID: int # Index of this room type in ROOM_TYPES and STATISTICS. Set on each subclass below
 
     def __init__(self):
-        self.id = self.index
-        self.index += 1
+        self.id = Room.allocateID()
+
+    @staticmethod
+    def allocateID() -> int:
+        '''
+        Hands out the next room ID. IDs are shared by every room type, so they advance no matter which subclass is created
+        '''
+        id = Room.index
+        Room.index += 1
+        return id
+
+    @staticmethod
+    def resetIndex():
+        Room.index = 0
+
+
 
-    
-    
 class Foyer(Room):
     pass
 class Dining(Room):
@@ -49,42 +63,84 @@ class Utility(Room):
 class Pantry(Room):
     pass
 
-class Statistic: # Create a Statistic class which functions very similarly to a grammar
-
-    def __init__(self, room: Room, magicNum: int) -> None:
-        self.roomClass: bool # Whether the room is public or private
-        self.roomType: Room = room # What kind of room it is
-        self.mustAttachRoom: Room # Not sure yet what to use this for
-        self.attachingRooms: list # A list of rooms which can be attached to this room
-        self.min: int # The fewest rooms of this type which can be in the floor plan
-        self.max: int # The most rooms of this type which can be in the floor plan
-
-        match room:
-            case val if val == Foyer:
-                self.roomClass = True
-                self.attachingRooms = [Dining, Living, Kitchen, Family, Game, Stairs]
-                self.min = 1
-                self.max = 1
-            case val if val == Dining:
-                self.roomClass = True
-                self.attachingRooms = [Foyer, Living, Kitchen, Family, Stairs]
-                self.min = 1
-                self.max = 1
-            case val if val == Living:
-                self.roomClass = True
-                self.attachingRooms = [Foyer, Stairs, Office, Halfbath, Game, Dining]
-                self.min = 1
-                self.max = 1
-            case val if val == Fullbath:
-                self.roomClass = False
-                self.attachingRooms = [Masterbed, Bedroom, Guestroom]
-                self.min = 1
-                self.max = math.ceil(magicNum / 25)
-            case val if val == Halfbath:
-                self.roomClass = False
-                self.attachingRooms = [Bedroom, Guestroom, Gym, Laundry]
-                self.min = 1
-                self.max = math.ceil(magicNum / 33)
-            case val if val == Masterbed:
-                self.roomClass = False
-                self.attachingRooms = [Fullbath, ]
+# Every room type, indexed by typeID
+ROOM_TYPES: tuple[type[Room], ...] = (Foyer, Dining, Living, Fullbath, Halfbath, Masterbed, Bedroom, Guestroom, Office,
+                                     Kitchen, Family, Game, Garage, Gym, Stairs, Laundry, Utility, Pantry)
+for i, r in enumerate(ROOM_TYPES):
+    r.typeID = i
+
+# The names Generation's adjacency graphs use for each room type
+ROOM_NAMES: dict[str, type[Room]] = {"FOYER": Foyer, "DINING": Dining, "LIVING": Living, "FULLBATH": Fullbath, "HALFBATH": Halfbath,
+                                     "MASTERBED": Masterbed, "BEDROOM": Bedroom, "GUESTBED": Guestroom, "OFFICE": Office,
+                                     "KITCHEN": Kitchen, "FAMILY": Family, "GAME": Game, "GARAGE": Garage, "GYM": Gym,
+                                     "STAIRS": Stairs, "LAUNDRY": Laundry, "UTILITY": Utility, "PANTRY": Pantry}
+
+class Statistic(NamedTuple): # A Statistic functions very similarly to a grammar rule. They are built once, below, and never modified
+    roomClass: bool # Whether the room is public or private
+    roomType: type[Room] # What kind of room it is
+    attachingRooms: int # Bitmask of the typeIDs of rooms which can be attached to this room
+    min: int # The fewest rooms of this type which can be in the floor plan
+    max: int # The most rooms of this type which can be in the floor plan, if maxDivisor is 0
+    maxDivisor: int # If nonzero, the most rooms of this type is instead ceil(magicNum / maxDivisor)
+
+    def attaches(self, room: type[Room]) -> bool:
+        return bool(self.attachingRooms >> room.typeID & 1)
+
+def _statistic(room: type[Room], roomClass: bool, attachingRooms: list[type[Room]], min: int, max: int, maxDivisor: int = 0) -> Statistic:
+    mask = 0
+    for r in attachingRooms:
+        mask |= 1 << r.typeID
+    return Statistic(roomClass, room, mask, min, max, maxDivisor)
+
+# The rules for every room type, indexed by typeID.
+# Generation only connects two rooms if at least one of their types attaches the other (and the adjacency graph allows it).
+# Rooms from Masterbed onwards take their attaching rooms from Generation.defaultAdjacency, and their counts are provisional.
+STATISTICS: tuple[Statistic, ...] = (
+    _statistic(Foyer, True, [Dining, Living, Kitchen, Family, Game, Stairs], 1, 1),
+    _statistic(Dining, True, [Foyer, Living, Kitchen, Family, Stairs], 1, 1),
+    _statistic(Living, True, [Foyer, Stairs, Office, Halfbath, Game, Dining], 1, 1),
+    _statistic(Fullbath, False, [Masterbed, Bedroom, Guestroom], 1, 0, 25),
+    _statistic(Halfbath, False, [Bedroom, Guestroom, Gym, Laundry], 1, 0, 33),
+    _statistic(Masterbed, False, [Fullbath, Office, Gym], 1, 1),
+    _statistic(Bedroom, False, [Fullbath, Halfbath], 0, 0, 20),
+    _statistic(Guestroom, False, [Fullbath, Halfbath, Office, Gym, Laundry], 0, 1),
+    _statistic(Office, False, [Living, Masterbed, Guestroom, Family, Garage], 0, 1),
+    _statistic(Kitchen, True, [Foyer, Dining, Family, Stairs, Pantry], 1, 1),
+    _statistic(Family, True, [Dining, Office, Kitchen, Game, Gym, Stairs, Laundry], 0, 1),
+    _statistic(Game, True, [Living, Family, Garage, Gym, Laundry, Utility], 0, 1),
+    _statistic(Garage, False, [Foyer, Office, Game, Gym, Laundry, Utility], 0, 1),
+    _statistic(Gym, False, [Halfbath, Masterbed, Guestroom, Family, Game, Garage, Laundry, Utility], 0, 1),
+    _statistic(Stairs, True, [Foyer, Living, Kitchen, Family], 0, 1),
+    _statistic(Laundry, False, [Halfbath, Guestroom, Family, Game, Garage, Gym, Utility], 0, 1),
+    _statistic(Utility, False, [Game, Garage, Gym, Laundry], 0, 1),
+    _statistic(Pantry, False, [Kitchen], 0, 1),
+)
+
+# Columns of the table above, so that counts can be computed for many magicNums at once
+MINS: np.ndarray = np.array([s.min for s in STATISTICS])
+MAXS: np.ndarray = np.array([s.max for s in STATISTICS])
+MAX_DIVISORS: np.ndarray = np.array([s.maxDivisor for s in STATISTICS])
+
+def statistic(room: type[Room]) -> Statistic:
+    return STATISTICS[room.typeID]
+
+def canAttach(a: type[Room], b: type[Room]) -> bool:
+    '''
+    Whether rooms of the two types can be adjacent: at least one of their Statistics must attach the other
+    '''
+    return STATISTICS[a.typeID].attaches(b) or STATISTICS[b.typeID].attaches(a)
+
+def bounds(magicNum: int | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Finds the fewest and most rooms of every type for one or many magicNums.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The mins and maxes, each with shape magicNum.shape + (len(ROOM_TYPES),)
+    '''
+    magicNum = np.asarray(magicNum)[..., None]
+    mins = np.broadcast_to(MINS, magicNum.shape[:-1] + MINS.shape)
+    scaled = np.ceil(magicNum / np.where(MAX_DIVISORS > 0, MAX_DIVISORS, 1)).astype(int)
+    maxs = np.where(MAX_DIVISORS > 0, scaled, MAXS)
+    return mins, maxs
@@ -0,0 +1,240 @@
+# Authored by Athena Osborne
+# Batch scoring of finished layouts, so the best seeds of a sweep can be picked (and the worst thrown away) without scoring
+# layouts one at a time. Every room of every layout is packed into one set of arrays and each measure is computed in a single pass.
+#
+# Usage: python3 Scoring.py <layout file> [--top 10] [--width 1000] [--height 800]
+
+import numpy as np
+from Generation import RoomGraph
+from Physics import Engine, PointMass
+from Placement import targetAreas
+import Partition
+
+# How much each measure counts towards a layout's total score. Lower totals are better
+WEIGHTS: dict[str, float] = {"areaError": 1, "adjacency": 1, "overlap": 1, "utilisation": 1}
+
+class LayoutBatch:
+    '''
+    The rooms of many layouts, back to back, each layout's rooms in order. Room r of the batch belongs to layout roomLayout[r].
+    Every layout must share the same WIDTH and HEIGHT.
+    '''
+
+    def __init__(self, vertices: np.ndarray, lengths: np.ndarray, roomLayout: np.ndarray, targets: np.ndarray,
+                 required: np.ndarray, WIDTH: int, HEIGHT: int):
+        '''
+        Parameters
+        ----------
+        vertices : np.ndarray
+            (v, 2) every room's outline in ring order, back to back
+        lengths : np.ndarray
+            How many vertices each room's outline has
+        roomLayout : np.ndarray
+            Which layout each room belongs to, in nondecreasing order
+        targets : np.ndarray
+            The area each room should have
+        required : np.ndarray
+            (k, 2) pairs of rooms (batch indices) which the room graph says should share a wall
+        '''
+        self.vertices: np.ndarray = vertices
+        self.lengths: np.ndarray = lengths
+        self.roomLayout: np.ndarray = roomLayout
+        self.targets: np.ndarray = targets
+        self.required: np.ndarray = required.reshape(-1, 2)
+        self.WIDTH: int = WIDTH
+        self.HEIGHT: int = HEIGHT
+        self.layouts: int = int(roomLayout.max()) + 1 if len(roomLayout) > 0 else 0
+
+        self.offsets: np.ndarray = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(int) # Where each room's vertices start
+        self.owner: np.ndarray = np.repeat(np.arange(len(lengths)), lengths) # Which room each vertex belongs to
+        nexts = np.arange(len(vertices)) + 1
+        last = self.offsets + lengths - 1
+        nexts[last[lengths > 0]] = self.offsets[lengths > 0]
+        self.nexts: np.ndarray = nexts # The vertex each vertex connects to next around its room
+
+def batchEngines(engines: list[Engine], graphs: list[RoomGraph], areas: dict[str, float] | None = None, fill: float = 0.5) -> LayoutBatch:
+    '''
+    Packs settled engines, whose SoftBody n is room n of the matching graph, into a batch. Targets are Placement.targetAreas
+    '''
+    if len(set((e.WIDTH, e.HEIGHT) for e in engines)) > 1:
+        raise ValueError("Every engine in a batch must have the same WIDTH and HEIGHT")
+    rings: list[np.ndarray] = []
+    lengths, roomLayout, targets, required = [], [], [], []
+    roomOffset = 0
+    for l, (e, G) in enumerate(zip(engines, graphs)):
+        pos = e.positions()
+        for r in Partition.rings(e):
+            rings.append(pos[r])
+            lengths.append(len(r))
+        roomLayout.append(np.full(len(e.softBodies), l))
+        targets.append(targetAreas(G, e.WIDTH, e.HEIGHT, areas, fill))
+        required.append(np.array(G.edges(), dtype=int).reshape(-1, 2) + roomOffset)
+        roomOffset += len(e.softBodies)
+    WIDTH, HEIGHT = (engines[0].WIDTH, engines[0].HEIGHT) if len(engines) > 0 else (0, 0)
+    return LayoutBatch(np.concatenate(rings).reshape(-1, 2) if len(rings) > 0 else np.zeros((0, 2)), np.array(lengths, dtype=int),
+                       np.concatenate(roomLayout).astype(int) if len(roomLayout) > 0 else np.zeros(0, dtype=int),
+                       np.concatenate(targets) if len(targets) > 0 else np.zeros(0),
+                       np.concatenate(required) if len(required) > 0 else np.zeros((0, 2), dtype=int), WIDTH, HEIGHT)
+
+def batchRecords(records: list[dict], WIDTH: int, HEIGHT: int, areas: dict[str, float] | None = None, fill: float = 0.5) -> LayoutBatch:
+    '''
+    Packs layout records (from Export, such as those read back from a sweep's output) into a batch
+    '''
+    from Pipeline import graphFromLists
+    polygons: list[np.ndarray] = []
+    roomLayout, targets, required = [], [], []
+    roomOffset = 0
+    for l, record in enumerate(records):
+        G = graphFromLists(record["rooms"], record["edges"])
+        polygons.extend(np.asarray(p, dtype=float).reshape(-1, 2) for p in record["polygons"])
+        roomLayout.append(np.full(len(record["polygons"]), l))
+        targets.append(targetAreas(G, WIDTH, HEIGHT, areas, fill))
+        required.append(np.array(record["edges"], dtype=int).reshape(-1, 2) + roomOffset)
+        roomOffset += len(record["polygons"])
+    return LayoutBatch(np.concatenate(polygons).reshape(-1, 2) if len(polygons) > 0 else np.zeros((0, 2)),
+                       np.array([len(p) for p in polygons], dtype=int),
+                       np.concatenate(roomLayout).astype(int) if len(roomLayout) > 0 else np.zeros(0, dtype=int),
+                       np.concatenate(targets) if len(targets) > 0 else np.zeros(0),
+                       np.concatenate(required) if len(required) > 0 else np.zeros((0, 2), dtype=int), WIDTH, HEIGHT)
+
+class Scores:
+    '''
+    Every measure for every layout of a batch, indexed by layout
+    '''
+
+    def __init__(self, areaError: np.ndarray, adjacency: np.ndarray, overlap: np.ndarray, utilisation: np.ndarray, weights: dict[str, float]):
+        self.areaError: np.ndarray = areaError # Mean relative difference between each room's area and its target
+        self.adjacency: np.ndarray = adjacency # Fraction of the room graph's connections whose rooms share a wall
+        self.overlap: np.ndarray = overlap # Area covered by more than one room, relative to the total room area
+        self.utilisation: np.ndarray = utilisation # Fraction of the WIDTH x HEIGHT area covered by rooms
+        # Weighted sum of the measures, arranged so that lower is better
+        self.total: np.ndarray = (weights["areaError"] * areaError + weights["adjacency"] * (1 - adjacency)
+                                  + weights["overlap"] * overlap + weights["utilisation"] * (1 - utilisation))
+
+    def ranked(self) -> np.ndarray:
+        '''
+        Every layout, best first
+        '''
+        return np.argsort(self.total, kind="stable")
+
+    def top(self, k: int) -> np.ndarray:
+        '''
+        The k best layouts, best first. Only those k are sorted, so this is cheap for a small k and a large batch
+        '''
+        k = min(k, len(self.total))
+        if k <= 0:
+            return np.zeros(0, dtype=int)
+        best = np.argpartition(self.total, k - 1)[:k]
+        return best[np.argsort(self.total[best], kind="stable")]
+
+    def record(self, layout: int) -> dict:
+        return {"areaError": float(self.areaError[layout]), "adjacency": float(self.adjacency[layout]),
+                "overlap": float(self.overlap[layout]), "utilisation": float(self.utilisation[layout]), "total": float(self.total[layout])}
+
+def coverage(batch: LayoutBatch, cell: float) -> np.ndarray:
+    '''
+    Counts how many rooms cover the center of every cell of a grid over each layout's area, by scanline.
+    Every edge adds its winding direction to the first cell right of where it crosses each row, so a running sum along
+    each row gives, for every cell, how many rooms it is inside.
+
+    Returns
+    -------
+    np.ndarray
+        (layouts, rows, columns) room counts
+    '''
+    rows = max(int(np.ceil(batch.HEIGHT / cell)), 1)
+    columns = max(int(np.ceil(batch.WIDTH / cell)), 1)
+    counts = np.zeros((batch.layouts, rows, columns + 1))
+
+    p0, p1 = batch.vertices, batch.vertices[batch.nexts]
+    # Orient every room the same way, so each contributes +1 inside itself whichever way its ring runs
+    cross = p0[:, 0] * p1[:, 1] - p1[:, 0] * p0[:, 1]
+    orientation = np.sign(np.bincount(batch.owner, cross, len(batch.lengths)))[batch.owner]
+
+    # Rows whose centers each edge crosses, half open so a vertex exactly on a row center isn't counted twice
+    low, high = np.minimum(p0[:, 1], p1[:, 1]), np.maximum(p0[:, 1], p1[:, 1])
+    first = np.clip(np.ceil(low / cell - 0.5), 0, rows).astype(int)
+    end = np.clip(np.ceil(high / cell - 0.5), 0, rows).astype(int)
+    spans = np.maximum(end - first, 0)
+    edge = np.repeat(np.arange(len(p0)), spans)
+    row = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans) + first[edge]
+
+    y = (row + 0.5) * cell
+    dy = p1[edge, 1] - p0[edge, 1]
+    x = p0[edge, 0] + (y - p0[edge, 1]) * (p1[edge, 0] - p0[edge, 0]) / dy
+    column = np.clip(np.ceil(x / cell - 0.5), 0, columns).astype(int)
+    np.add.at(counts, (batch.roomLayout[batch.owner[edge]], row, column), np.sign(dy) * orientation[edge])
+    return np.abs(np.cumsum(counts, axis=2)[:, :, :columns])
+
+def score(batch: LayoutBatch, weights: dict[str, float] | None = None, cell: float = 5, gap: float | None = None,
+          parallel: float = 0.2, minLength: float = 1, minShared: float = 0) -> Scores:
+    '''
+    Scores every layout in the batch at once.
+
+    Parameters
+    ----------
+    weights : dict[str, float] | None (Default = None)
+        Weight of each measure in the total. Defaults to WEIGHTS
+    cell : float (Default = 5)
+        Side of the grid cells overlap and utilisation are sampled on
+    gap, parallel, minLength :
+        As in Partition.extract, for finding shared walls
+    minShared : float (Default = 0)
+        A connection in the room graph counts as satisfied once its rooms share more than this length of wall
+    '''
+    if weights == None:
+        weights = WEIGHTS
+    if gap == None:
+        gap = PointMass.radius * 0.7 * 4 + PointMass.radius
+    L = batch.layouts
+    roomCount = np.maximum(np.bincount(batch.roomLayout, minlength=L), 1)
+
+    # Area error
+    p0, p1 = batch.vertices, batch.vertices[batch.nexts]
+    cross = p0[:, 0] * p1[:, 1] - p1[:, 0] * p0[:, 1]
+    areas = np.abs(np.bincount(batch.owner, cross, len(batch.lengths))) / 2
+    relative = np.abs(areas - batch.targets) / np.maximum(batch.targets, 1e-9)
+    areaError = np.bincount(batch.roomLayout, relative, L) / roomCount
+
+    # Adjacency. Layouts are spread out along x first so that one sweep over every edge never pairs edges of different layouts
+    shift = (np.arange(L) * (batch.WIDTH + 2 * gap + 1))[batch.roomLayout[batch.owner]]
+    keep = batch.nexts != np.arange(len(p0))
+    shifted0 = p0 + np.stack((shift, np.zeros_like(shift)), axis=1)
+    shifted1 = p1 + np.stack((shift, np.zeros_like(shift)), axis=1)
+    wallRooms, segments = Partition.sharedWalls(shifted0[keep], shifted1[keep], batch.owner[keep], gap, parallel, minLength)
+    R = len(batch.lengths)
+    wallKeys, inverse = np.unique(wallRooms[:, 0] * R + wallRooms[:, 1], return_inverse=True)
+    sharedLength = np.bincount(inverse.reshape(-1), np.linalg.norm(segments[:, 1] - segments[:, 0], axis=1), len(wallKeys))
+    required = np.sort(batch.required, axis=1)
+    satisfied = np.isin(required[:, 0] * R + required[:, 1], wallKeys[sharedLength > minShared])
+    requiredLayout = batch.roomLayout[required[:, 0]]
+    requiredCount = np.bincount(requiredLayout, minlength=L)
+    adjacency = np.where(requiredCount > 0, np.bincount(requiredLayout, satisfied, L) / np.maximum(requiredCount, 1), 1)
+
+    # Overlap and utilisation, from how many rooms cover each grid cell
+    counts = coverage(batch, cell)
+    cellArea = cell * cell
+    roomArea = np.maximum(np.bincount(batch.roomLayout, areas, L), 1e-9)
+    overlap = np.maximum(counts - 1, 0).sum(axis=(1, 2)) * cellArea / roomArea
+    utilisation = (counts >= 1).mean(axis=(1, 2))
+
+    return Scores(areaError, adjacency, overlap, utilisation, weights)
+
+def main():
+    import argparse
+    import json
+    import Export
+    from Pipeline import DEFAULTS
+    parser = argparse.ArgumentParser(description="Rank the layouts in an exported file")
+    parser.add_argument("path", help="A .jsonl or binary layout file written by Export")
+    parser.add_argument("--top", type=int, default=10, help="How many of the best layouts to print")
+    parser.add_argument("--width", type=int, default=DEFAULTS["WIDTH"])
+    parser.add_argument("--height", type=int, default=DEFAULTS["HEIGHT"])
+    args = parser.parse_args()
+
+    records = list(Export.readLayouts(args.path))
+    scores = score(batchRecords(records, args.width, args.height))
+    for l in scores.top(args.top):
+        print(json.dumps({"seed": records[l]["seed"], **scores.record(int(l))}))
+
+if __name__ == "__main__":
+    main()
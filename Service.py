@@ -0,0 +1,198 @@
+# Authored by Athena Osborne
+# Local layout generation service. Jobs are POSTed as JSON to /jobs over localhost HTTP (or a Unix socket), queued with a bounded
+# queue, and run on a pool of worker processes which import the physics modules once at startup. Each request gets a chunked
+# stream of JSON lines back: a "queued" event, "progress" events as the simulation runs, then a "result" or "error" event.
+# Finished layouts can also be appended to an Export file as each job completes.
+#
+# Usage: python3 Service.py [--port 8765] [--socket <path>] [--workers <n>] [--queue 64] [--cache <directory>] [--export <layouts.jsonl>]
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Set in each worker process by warmWorker
+workerCache = None
+
+def warmWorker(cacheDirectory: str | None):
+    '''
+    Runs once per worker process: pays for the imports (and the first, slowest, engine construction) up front
+    '''
+    global workerCache
+    import Pipeline
+    import Cache
+    if cacheDirectory != None:
+        workerCache = Cache.LayoutCache(cacheDirectory)
+    Pipeline.prepare({"seed": 0, "capacity": 2})
+
+def runJob(jobID: int, job: dict, updates) -> dict:
+    '''
+    Runs in a worker process, posting progress for the job to the shared updates queue
+    '''
+    import Pipeline
+    return Pipeline.runLayout(job, lambda p: updates.put((jobID, p)), workerCache)
+
+class Service:
+
+    def __init__(self, workers: int, queueSize: int, cacheDirectory: str | None = None, exportPath: str | None = None):
+        self.workers: int = workers
+        self.jobs: asyncio.Queue = asyncio.Queue(maxsize=queueSize) # Jobs waiting for a worker. Requests are turned away when it's full
+        self.streams: dict[int, asyncio.Queue] = {} # Events for each job's client, by job ID
+        self.ids = itertools.count()
+        self.manager = multiprocessing.Manager()
+        self.updates = self.manager.Queue() # Progress from the worker processes
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warmWorker, initargs=(cacheDirectory,))
+        self.running: int = 0
+        self.exporter = None # Export.LayoutWriter every finished layout is appended to, if any
+        if exportPath != None:
+            import Export
+            self.exporter = Export.openWriter(exportPath, append=True)
+
+    async def dispatch(self):
+        '''
+        Feeds queued jobs to the pool. One of these runs per worker, so at most that many jobs are in the pool at once
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            jobID, job = await self.jobs.get()
+            try:
+                if self.streams.get(jobID) == None:
+                    continue # The client disconnected while the job was queued, so nobody wants it anymore
+                self.running += 1
+                try:
+                    event = {"event": "result", "layout": await loop.run_in_executor(self.pool, runJob, jobID, job, self.updates)}
+                except Exception as error:
+                    event = {"event": "error", "message": repr(error)}
+                finally:
+                    self.running -= 1
+                if self.exporter != None and event["event"] == "result":
+                    self.exporter.write(event["layout"])
+                    self.exporter.flush() # So readers of the file see every finished job, not just whole buffers of them
+                stream = self.streams.get(jobID) # The client may also have disconnected while the job ran
+                if stream != None:
+                    await stream.put(event)
+            finally:
+                self.jobs.task_done()
+
+    async def relay(self):
+        '''
+        Moves progress from the workers' shared queue onto each job's own stream
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            jobID, progress = await loop.run_in_executor(None, self.updates.get)
+            stream = self.streams.get(jobID)
+            if stream != None:
+                progress["event"] = "progress"
+                await stream.put(progress)
+
+    async def respond(self, writer: asyncio.StreamWriter, status: str, body: dict):
+        data = json.dumps(body).encode()
+        writer.write(("HTTP/1.1 " + status + "\r\nContent-Type: application/json\r\nContent-Length: " + str(len(data)) + "\r\nConnection: close\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    async def sendChunk(self, writer: asyncio.StreamWriter, event: dict):
+        data = json.dumps(event).encode() + b"\n"
+        writer.write(format(len(data), "x").encode() + b"\r\n" + data + b"\r\n")
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            requestLine = (await reader.readline()).decode().split()
+            headers: dict[str, str] = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if line == "":
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if len(requestLine) < 2:
+                return
+            method, path = requestLine[0], requestLine[1]
+
+            if method == "GET" and path == "/status":
+                await self.respond(writer, "200 OK", {"queued": self.jobs.qsize(), "capacity": self.jobs.maxsize,
+                                                       "running": self.running, "workers": self.workers})
+                return
+            if method != "POST" or path != "/jobs":
+                await self.respond(writer, "404 Not Found", {"error": "POST jobs to /jobs"})
+                return
+
+            try:
+                job = json.loads(await reader.readexactly(int(headers.get("content-length", "0"))))
+            except (ValueError, asyncio.IncompleteReadError):
+                await self.respond(writer, "400 Bad Request", {"error": "body must be a JSON job"})
+                return
+
+            # Backpressure: rather than growing without bound, turn the job away if the queue is full
+            jobID = next(self.ids)
+            stream: asyncio.Queue = asyncio.Queue()
+            self.streams[jobID] = stream
+            try:
+                self.jobs.put_nowait((jobID, job))
+            except asyncio.QueueFull:
+                del self.streams[jobID]
+                await self.respond(writer, "503 Service Unavailable", {"error": "queue full", "capacity": self.jobs.maxsize})
+                return
+
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            try:
+                await self.sendChunk(writer, {"event": "queued", "job": jobID, "position": self.jobs.qsize()})
+                while True:
+                    event = await stream.get()
+                    await self.sendChunk(writer, event)
+                    if event["event"] != "progress":
+                        break
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+            finally:
+                del self.streams[jobID]
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int, socketPath: str | None = None):
+        tasks = [asyncio.create_task(self.dispatch()) for i in range(self.workers)]
+        tasks.append(asyncio.create_task(self.relay()))
+        if socketPath != None:
+            if os.path.exists(socketPath):
+                os.remove(socketPath)
+            server = await asyncio.start_unix_server(self.handle, path=socketPath)
+            print("Serving on " + socketPath)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print("Serving on http://" + host + ":" + str(port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for t in tasks:
+                t.cancel()
+            self.pool.shutdown(cancel_futures=True)
+            self.manager.shutdown()
+            if self.exporter != None:
+                self.exporter.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local layout generation service")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", default=None, help="Serve on this Unix socket instead of localhost")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queue", type=int, default=64, help="Most jobs waiting for a worker before requests are turned away")
+    parser.add_argument("--cache", default=None, help="Directory for the shared layout cache")
+    parser.add_argument("--export", default=None, help="Append every finished layout to this file (.jsonl for JSON lines, anything else for binary)")
+    args = parser.parse_args()
+
+    service = Service(args.workers, args.queue, args.cache, args.export)
+    try:
+        asyncio.run(service.serve("127.0.0.1", args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
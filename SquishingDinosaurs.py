@@ -10,7 +10,11 @@ import io
 import sys
 import math
 import random
-from Physics import Engine, PointMass, Wall, SoftBody
+from Physics import Engine, PointMass, PointIndex, Wall, SoftBody
+from Generation import Generation, RoomGraph, defaultAdjacency
+from Placement import seedSoftBodies
+from Drawing import drawEngine
+from Trace import Tracer
 
 
 # Initialize global events
@@ -37,13 +41,25 @@ def main():
     WIDTH = int(sys.argv[1])
     HEIGHT = int(sys.argv[2])
 
+    # If one of the optional args is "graph", generate a room graph from the seed and seed the rooms from it
+    graph: RoomGraph | None = None
+    if "graph" in sys.argv[5:]:
+        graph = Generation(defaultAdjacency(), 17, "FOYER").generate(int(sys.argv[4]))
+        print(graph)
+
+    # If one of the optional args is trace=<file>, record a timeline of the run to that file, written when the program exits
+    tracer: Tracer | None = None
+    for arg in sys.argv[5:]:
+        if arg.startswith("trace="):
+            tracer = Tracer(arg[len("trace="):])
+
     # Run the sim for the first time, setting the reset flag on its return value 
-    reset = runSim(WIDTH, HEIGHT)
+    reset = runSim(WIDTH, HEIGHT, graph, tracer)
     while reset: # If the reset flag is on, reset globals for relevant classes and run the sim again.
         resetSim()
-        reset = runSim(WIDTH, HEIGHT)
+        reset = runSim(WIDTH, HEIGHT, graph, tracer)
 
-def runSim(WIDTH, HEIGHT) -> bool:
+def runSim(WIDTH, HEIGHT, graph: RoomGraph | None = None, tracer: Tracer | None = None) -> bool:
 
     # Initialize the main window
     window = pg.display.set_mode((WIDTH, HEIGHT))
@@ -80,22 +96,29 @@ def runSim(WIDTH, HEIGHT) -> bool:
     elapsedFrames = 0 
     reset = False
 
-    # Create a list of SoftBodies
-    softBodies: list[SoftBody] = [
-                                  SoftBody().dottedRect(100, 100, pg.Vector2(100,100)),
-                                  SoftBody().ngon(50, 10, pg.Vector2(1200, 200), centerPoint=False, lattice=2, interiorSpringConst=5),
-                                  SoftBody().edgeSupportedRect(100, 100, pg.Vector2(400, 600), 2, 10),
-                                  SoftBody().edgeSupportedRect(150, 100, pg.Vector2(200, 700), 2, 10),
-                                  SoftBody().edgeSupportedRect(100, 100, pg.Vector2(400, 150), 2)
-                                  ]
-
-    # Provide initial walls (NOT CURRENTLY IN USE)
+    # Create a list of SoftBodies, either seeded from the room graph or the default test scene
+    if graph != None:
+        softBodies: list[SoftBody] = seedSoftBodies(graph, WIDTH-400, HEIGHT, seed=int(sys.argv[4]))
+    else:
+        softBodies: list[SoftBody] = [
+                                      SoftBody().dottedRect(100, 100, pg.Vector2(100,100)),
+                                      SoftBody().ngon(50, 10, pg.Vector2(1200, 200), centerPoint=False, lattice=2, interiorSpringConst=5),
+                                      SoftBody().edgeSupportedRect(100, 100, pg.Vector2(400, 600), 2, 10),
+                                      SoftBody().edgeSupportedRect(150, 100, pg.Vector2(200, 700), 2, 10),
+                                      SoftBody().edgeSupportedRect(100, 100, pg.Vector2(400, 150), 2)
+                                      ]
+
+    # Provide initial walls
     walls: list[Wall] = [Wall(pg.Vector2(0,0), pg.Vector2(100,0), 5)]
 
     
     # Initialize the engine
     e = Engine(softBodies, walls, 0.75, 0.5, 2, WIDTH-400, HEIGHT)
+    e.tracer = tracer
     drawEngine(e, simWindow)
+
+    # Points are picked for dragging through an index of their positions, rebuilt once per frame
+    pointIndex = PointIndex(e.positions(), PointMass.radius * 2)
     pg.display.update()
 
     '''
@@ -142,8 +165,12 @@ def runSim(WIDTH, HEIGHT) -> bool:
     #Run the sim loop
     while running:
         #Event handling
+        if tracer != None:
+            tracer.phase("events", "app")
         events = pg.event.get()
         for event in events:
+            if tracer != None:
+                tracer.instant(pg.event.event_name(event.type))
             if event.type == pg.QUIT: # If the event is a quit, stop running the program
                 running = False
             
@@ -156,10 +183,30 @@ def runSim(WIDTH, HEIGHT) -> bool:
                 print(type(event.scale))
                 softBodyScale(e, event.scale)
 
+            # Left click and drag pulls a point, right click and drag pulls its whole room
+            if event.type == pg.MOUSEBUTTONDOWN and event.button in (1, 3) and event.pos[0] < WIDTH-400:
+                picked = pointIndex.nearest(pg.Vector2(event.pos), PointMass.radius * 2)
+                if picked != None:
+                    if event.button == 3:
+                        e.grab([p.id for p in e.softBodies[int(e.pointBody[picked])].points], pg.Vector2(event.pos))
+                    else:
+                        e.grab([picked], pg.Vector2(event.pos))
+            if event.type == pg.MOUSEMOTION:
+                e.moveGrab(pg.Vector2(event.pos))
+            if event.type == pg.MOUSEBUTTONUP and event.button in (1, 3):
+                e.release()
+
             if event.type == pg.KEYDOWN: # If a key is pressed...
                 if event.key == pg.K_r: # If r is pressed, set flags for reset
                     reset = True
                     running = False
+                if event.key == pg.K_i: # If i is pressed, toggle incremental mode, where only edited bodies and what they disturb are simulated
+                    if e.active == None:
+                        e.freeze()
+                        print("Incremental mode on")
+                    else:
+                        e.thaw()
+                        print("Incremental mode off")
                 if event.key == pg.K_SPACE: # If space is pressed, pause
                     paused = True
                     dt = 60/1000
@@ -192,14 +239,22 @@ def runSim(WIDTH, HEIGHT) -> bool:
                                     running = False
                                     break
 
+        if tracer != None:
+            tracer.phase(None)
         if reset:
             break
-        # Quarter step the update so that it's harder for fast moving things to break
-        for i in range(4):
-            e.update(dt/4)
+        # Substep the update so that it's harder for fast moving things to break. Settled scenes take fewer substeps
+        e.step(dt)
         elapsedFrames += 1
+        if tracer != None:
+            tracer.phase("frame wait", "app")
         dt = clock.tick(60)/1000
+        if tracer != None:
+            tracer.phase("point index", "app")
+        pointIndex = PointIndex(e.positions(), PointMass.radius * 2)
 
+        if tracer != None:
+            tracer.phase("render", "render")
         # Code for drawing the app. Really needs to be cleaned up.
         simWindow.fill((255,255,255)) # Fills the sim window to wipe previous frame.
         drawEngine(e, simWindow) # Draws the softbodies in the simWindow
@@ -212,6 +267,8 @@ def runSim(WIDTH, HEIGHT) -> bool:
         
         pw.update(events)
         pg.display.update() 
+        if tracer != None:
+            tracer.phase(None)
         
 
     print("Sim ended.")
@@ -233,7 +290,11 @@ def getScaleFromTextBox(box: TextBox):
         return 1
     
 def softBodyScale(e: Engine, factor: float):
-    e.scaleSoftBodies(factor)
+    if e.active == None:
+        e.scaleSoftBodies(factor)
+    else: # In incremental mode, scale each body separately so they all wake
+        for b in range(len(e.softBodies)):
+            e.scaleSoftBody(b, factor)
 
 def drawApp(WIDTH, HEIGHT, base: pg.Surface, engineWindow: pg.Surface, sidePanel: pg.Surface):
     
@@ -242,59 +303,6 @@ def drawApp(WIDTH, HEIGHT, base: pg.Surface, engineWindow: pg.Surface, sidePanel
     base.blit(sidePanel, (WIDTH-400, 0))
 
 
-def drawEngine(e: Engine, window):
-
-    for b in e.softBodies:
-
-        for c in b.innerConstraints: # Loop to draw inner constraints as single lines
-        
-            # Get points so we can grab their position and also calculate the distance between them
-            point0: PointMass = e.points[c.index0]
-            point1: PointMass = e.points[c.index1]
-
-            if c.hard: # The coloring procedure we want to use for hard constraints
-                deltaLength = (point0.position - point1.position).length()
-                # Use the distance to scale the color of the constraint from 0 to 1: 
-                # 0 is as close together as possible (GREEN) (not possible because they'd be inside each other)
-                # 1 is as far apart as possible (RED)
-                colorScale = deltaLength/c.distance
-                if colorScale > 1: colorScale = 1
-                #print(colorScale)
-                # Draw a line from point0 to point1, colored according to how close they are to violating the constraint
-                pg.draw.aaline(window, (int(255*colorScale), int(255*(1-colorScale)), 0), point0.position, point1.position)
-            else:
-                deltaLength = (point0.position - point1.position).length()
-                # Use the distance to scale the color of the constraint along the parabola.
-                # 2 * c.distance is max, 0 is also max, c.distance is min
-                colorScale = (((deltaLength - c.distance) * (1/c.distance))  ** 2)
-                if colorScale > 1: colorScale = 1 # Cap the value at 1
-                
-                # Draw a line from point0 to point1, colored according to how far away from neutral they are
-                pg.draw.aaline(window, (50, 50, int(255 * colorScale)), point0.position, point1.position)
-
-        for c in b.outerConstraints: # Loop to draw the outer constraints as a filled
-            
-            # Get points so we can grab their position and also calculate the distance between them
-            point0: PointMass = e.points[c.index0]
-            point1: PointMass = e.points[c.index1]
-
-            offset: pg.Vector2 = (point1.position - point0.position).rotate(90) # Grab the delta between them rotate that delta 90 degrees to get the offset vector
-            offset.scale_to_length(point0.radius * 0.7) # Scale the offset to nearly the radius length
-
-            # Create the four points based on the position +/- the offset
-            point0L: pg.Vector2 = point0.position + offset
-            point0R: pg.Vector2 = point0.position - offset
-            point1L: pg.Vector2 = point1.position - offset
-            point1R: pg.Vector2 = point1.position + offset
-
-            # Draw the two lines
-            pg.draw.aaline(window, (0,0,0), point0L, point1R)
-            pg.draw.polygon(window, b.color, [point0L, point0R, point1L, point1R])
-
-    for p in e.points: # Loop to draw each point
-        #print(str(p) + " @ " + str(p.position))
-        pg.draw.circle(window, (0, 0, 0), p.position, p.radius)
-
 def drawSidePanel(window: pg.Surface):
     pg.font.init()
     font = pg.font.Font("resources/Exo2-Regular.ttf", 200)
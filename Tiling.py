@@ -0,0 +1,440 @@
+# Authored by Athena Osborne
+# Spatial domain decomposition of the xpbd solver across worker processes, so one large scene can use every core. The area is split
+# into a grid of tiles, one per worker. Point state lives in shared memory: each worker finds the contacts of the points in its tile,
+# looking into a halo around it for anything they could touch, projects the constraints and contacts its points own into its own
+# correction buffers, and then moves its own points by what every worker accumulated for them. Workers meet at barriers between passes.
+#
+# Usage: python3 Tiling.py [--seed 0] [--plans 8] [--workers <cores>] [--steps 200] [--serial]
+
+import argparse
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import traceback
+import numpy as np
+import pygame as pg
+from Physics import (Engine, PointMass, Metrics, Convergence, findContacts, projectConstraints, projectPointContacts, projectEdgeContacts,
+                     projectWallContacts, contactDepths, pushFreeVelocity, dampSprings, bouncePointContacts, bounceEdgeContacts, bounceWalls)
+
+# Engine settings sent to the workers with every step, so changing them on the engine takes effect without restarting the workers
+SETTINGS: tuple[str, ...] = ("elasticity", "friction", "springDamping", "xpbdIterations", "xpbdRelaxation", "hardCompliance", "dragSpring", "dragDamping")
+
+# Sent back by workers whose barrier was broken because another worker failed, so the master can report the original error instead
+ABORTED: str = "aborted by another worker"
+
+def tileGrid(workers: int, WIDTH: int, HEIGHT: int) -> tuple[int, int]:
+    '''
+    The columns and rows of tiles for the provided number of workers, making the tiles as close to square as the count allows
+    '''
+    shapes = [(c, workers // c) for c in range(1, workers + 1) if workers % c == 0]
+    return min(shapes, key=lambda s: abs(math.log(WIDTH / s[0]) - math.log(HEIGHT / s[1])))
+
+def tileBounds(pos: np.ndarray, columns: int, rows: int, column: int, row: int) -> tuple[float, float, float, float]:
+    '''
+    The x and y range of a tile. Columns are cut at quantiles of every point's x, and each column into rows at quantiles of its own
+    points' y, so every tile holds about as many points however the scene is spread out. Ranges include their start but not their end,
+    and the outer tiles extend to infinity, so every point is in exactly one tile.
+
+    Returns
+    -------
+    tuple[float, float, float, float]
+        x start, x end, y start, y end
+    '''
+    x = pos[:, 0]
+    xCuts = np.concatenate(([-np.inf], np.quantile(x, np.arange(1, columns) / columns), [np.inf]))
+    y = pos[(x >= xCuts[column]) & (x < xCuts[column + 1]), 1]
+    yCuts = np.concatenate(([-np.inf], np.quantile(y, np.arange(1, rows) / rows) if len(y) > 0 else np.zeros(rows - 1), [np.inf]))
+    return float(xCuts[column]), float(xCuts[column + 1]), float(yCuts[row]), float(yCuts[row + 1])
+
+def sharedArrays(buffer, n: int, workers: int) -> dict[str, np.ndarray]:
+    '''
+    Views of the shared buffer as the arrays the master and workers use. Called with buffer None, returns how many doubles the buffer needs instead
+    '''
+    shapes = {"pos": (n, 2), "vel": (n, 2),
+              "prev": (n, 2), # Positions at the start of the substep
+              "shift": (n, 2), # How far contacts have pushed each point this substep to undo overlap from before it
+              "before": (n, 2), # Velocities at the start of the substep
+              # Each worker's accumulated corrections, and then its velocity changes
+              "correction": (workers, n, 2), "oldCorrection": (workers, n, 2), "counts": (workers, n),
+              "stats": (workers, 3)} # Each worker's deepest contact, fastest point and new contacts during its last substep
+    if buffer == None:
+        return sum(math.prod(shape) for shape in shapes.values())
+    arrays = {}
+    offset = 0
+    for name, shape in shapes.items():
+        size = math.prod(shape)
+        arrays[name] = np.frombuffer(buffer, dtype=float, count=size, offset=offset * 8).reshape(shape)
+        offset += size
+    return arrays
+
+class Tile:
+    '''
+    The state of one worker: which tile it owns, its views of the shared arrays and the engine's fixed constraints and walls
+    '''
+
+    def __init__(self, index: int, columns: int, rows: int, arrays: dict[str, np.ndarray], static: dict, barrier):
+        self.index: int = index
+        self.columns: int = columns
+        self.rows: int = rows
+        self.column: int = index % columns
+        self.row: int = index // columns
+        self.arrays: dict[str, np.ndarray] = arrays
+        self.static: dict = static
+        self.barrier = barrier
+        self.touched: np.ndarray = np.zeros(0, dtype=int) # Points this worker wrote corrections for during its last substep
+        self.touching: np.ndarray = np.zeros(0, dtype=int) # Keys of the point contacts in its tile and halo which were touching during its last substep
+        self.bounds: tuple[float, float, float, float] = (-np.inf, np.inf, -np.inf, np.inf) # The tile's x and y range, as cut at the start of the step
+        self.ownMask: np.ndarray = np.zeros(0, dtype=bool)
+        self.own: np.ndarray = np.zeros(0, dtype=int) # The points in the tile when it was cut
+        self.drift: float = 0 # How far any point can have moved since the tile was cut
+
+    def partition(self):
+        '''
+        Cuts the tiles from the current positions, which every worker sees the same at the start of a step, and takes the points in this one
+        '''
+        pos = self.arrays["pos"]
+        self.bounds = tileBounds(pos, self.columns, self.rows, self.column, self.row)
+        x0, x1, y0, y1 = self.bounds
+        self.ownMask = (pos[:, 0] >= x0) & (pos[:, 0] < x1) & (pos[:, 1] >= y0) & (pos[:, 1] < y1)
+        self.own = np.flatnonzero(self.ownMask)
+        self.drift = 0
+
+    def clear(self):
+        '''
+        Zeroes this worker's correction buffers wherever the last substep wrote to them
+        '''
+        k = self.index
+        self.arrays["correction"][k, self.touched] = 0
+        self.arrays["oldCorrection"][k, self.touched] = 0
+        self.arrays["counts"][k, self.touched] = 0
+
+    def substep(self, dt: float, settings: dict, dragged: np.ndarray, targets: np.ndarray):
+        '''
+        Engine.updateXPBD for the points in this tile. Each constraint is owned by the tile of its first point and each contact
+        by the tile of its (first) point, so every constraint and contact is projected by exactly one worker. The tiles stay as
+        they were cut at the start of the step, with the halo growing to cover how far their points could have moved since.
+        '''
+        k = self.index
+        a, s = self.arrays, self.static
+        pos, vel, prev, shift, before = a["pos"], a["vel"], a["prev"], a["shift"], a["before"]
+        i0, i1, w = s["i0"], s["i1"], s["w"]
+        r = PointMass.radius
+        n = len(pos)
+
+        x0, x1, y0, y1 = self.bounds
+        ownMask, own = self.ownMask, self.own
+        self.barrier.wait() # Every worker is done with the last substep, so every velocity is final and the correction buffers are free
+        self.clear()
+
+        a["stats"][k, 1] = float(np.sqrt((vel[own] * vel[own]).sum(axis=1)).max()) if len(own) > 0 else 0
+        prev[own] = pos[own]
+        before[own] = vel[own]
+        pos[own] += vel[own] * dt
+        shift[own] = 0
+        bounds = [s["WIDTH"] - r, s["HEIGHT"] - r]
+        outside = np.abs(prev[own] - np.clip(prev[own], r, bounds)) # How far each point started outside the bounding box
+        self.barrier.wait() # Every point is at its predicted position and every worker has recorded its fastest point
+
+        # The halo: anything a point in this tile could touch this substep, allowing for the edges' length and for every point
+        # having moved since the tiles were cut
+        margin = float(a["stats"][:, 1].max()) * dt
+        self.drift += margin
+        reach = r * 1.7 + margin
+        edges = np.arange(s["outerCount"])
+        maxEdge = float(np.linalg.norm(pos[i1[edges]] - pos[i0[edges]], axis=1).max()) if len(edges) > 0 else 0
+        halo = 2 * reach + self.drift + maxEdge
+        points = np.flatnonzero(ownMask | ((pos[:, 0] >= x0 - halo) & (pos[:, 0] < x1 + halo) & (pos[:, 1] >= y0 - halo) & (pos[:, 1] < y1 + halo)))
+        inHalo = np.zeros(n, dtype=bool)
+        inHalo[points] = True
+        edges = edges[inHalo[i0[edges]] | inHalo[i1[edges]]]
+
+        pointPairs, distance, edgePairs, edge, wallPairs = findContacts(pos, points, edges, i0, i1, s["walls"], s["wallIndex"], r, margin)
+
+        # A contact is new if this worker didn't see it touching last substep. Contacts whose owner changed since were in this tile's halo then
+        touching = distance < 2 * r
+        keys = pointPairs[:, 0] * n + pointPairs[:, 1]
+        mine = ownMask[pointPairs[:, 0]]
+        a["stats"][k, 0] = float((2 * r - distance[touching & mine]).max()) if (touching & mine).any() else 0
+        a["stats"][k, 2] = float((~np.isin(keys[touching & mine], self.touching)).sum())
+        self.touching = keys[touching]
+
+        pointPairs = pointPairs[mine]
+        edgePairs = edgePairs[ownMask[edgePairs[:, 0]]]
+        wallPairs = wallPairs[ownMask[wallPairs[:, 0]]]
+        walls = s["walls"][wallPairs[:, 1]]
+
+        constraints = np.flatnonzero(ownMask[i0])
+        c0, c1, hard = i0[constraints], i1[constraints], s["hard"][constraints]
+        distances = s["distance"][constraints]
+        compliance = np.where(hard, settings["hardCompliance"], 1 / np.maximum(s["spring"][constraints], 1e-9)) / (dt * dt)
+        contactCompliance = settings["hardCompliance"] / (dt * dt)
+        lambdas = np.zeros(len(constraints))
+        ownDrags = ownMask[dragged]
+        dragged, targets = dragged[ownDrags], targets[ownDrags]
+        dragCompliance = 1 / (settings["dragSpring"] * dt * dt)
+        dragLambdas = np.zeros_like(targets)
+        self.touched = np.unique(np.concatenate((own, c0, c1, pointPairs.ravel(), edgePairs.ravel(), dragged)))
+
+        fresh = [np.maximum(now - start, 0) for start, now in zip(contactDepths(prev, pointPairs, edgePairs, wallPairs, walls, r),
+                                                                  contactDepths(pos, pointPairs, edgePairs, wallPairs, walls, r))]
+
+        correction, oldCorrection, counts = a["correction"][k], a["oldCorrection"][k], a["counts"][k]
+        for iteration in range(settings["xpbdIterations"]):
+            projectConstraints(pos, c0, c1, distances, hard, compliance, lambdas, w, correction, counts)
+            projectPointContacts(pos, pointPairs, r, contactCompliance, w, fresh[0], correction, oldCorrection, counts)
+            projectEdgeContacts(pos, edgePairs, r, contactCompliance, w, fresh[1], correction, oldCorrection, counts)
+            projectWallContacts(pos, wallPairs, walls, r, contactCompliance, w, fresh[2], correction, oldCorrection, counts)
+            dl = (targets - pos[dragged] - dragCompliance * dragLambdas) / (w[dragged] + dragCompliance)[:, None]
+            dragLambdas += dl
+            np.add.at(correction, dragged, w[dragged, None] * dl)
+            np.add.at(counts, dragged, 1)
+            self.barrier.wait() # Every worker's corrections are in
+
+            scale = settings["xpbdRelaxation"] / np.maximum(a["counts"][:, own].sum(axis=0), 1)[:, None]
+            moved = pos[own] + a["correction"][:, own].sum(axis=0) * scale
+            clipped = np.clip(moved, r, bounds)
+            pulled = np.clip(clipped - moved, -outside, outside) # As in Engine.updateXPBD
+            outside -= np.abs(pulled)
+            shift[own] += a["oldCorrection"][:, own].sum(axis=0) * scale + pulled
+            pos[own] = clipped
+            self.barrier.wait() # Every point has moved, and every worker is done reading the corrections
+            self.clear()
+
+        vel[own] = pushFreeVelocity(pos[own] - prev[own], shift[own], dt)
+        self.barrier.wait() # Every point has its new velocity
+        damping, bounce = correction, oldCorrection
+        soft = ~hard
+        dampSprings(pos, vel, c0[soft], c1[soft], settings["springDamping"], dt, damping)
+        bouncePointContacts(pos, vel, before, pointPairs, r, settings["elasticity"], settings["friction"], bounce, counts)
+        bounceEdgeContacts(pos, vel, before, edgePairs, r, settings["elasticity"], settings["friction"], bounce, counts)
+        bounceWalls(pos, vel, before, own, wallPairs, walls, r, settings["elasticity"], settings["friction"], s["WIDTH"], s["HEIGHT"], bounce, counts)
+        self.barrier.wait() # Every worker's damping and bounces are in
+
+        v = vel[own] + a["correction"][:, own].sum(axis=0) + a["oldCorrection"][:, own].sum(axis=0) / np.maximum(a["counts"][:, own].sum(axis=0), 1)[:, None]
+        v[np.isin(own, dragged)] *= math.exp(-settings["dragDamping"] * dt)
+        vel[own] = v * w[own, None]
+        # The damping buffers are cleared at the start of the next substep, once every worker is past this point
+
+def runTile(index: int, columns: int, rows: int, buffer, n: int, workers: int, static: dict, barrier, connection):
+    '''
+    Runs in each worker process: simulates its tile for every step the master sends, replying None after each step, or the error
+    if the step failed. A None step stops the worker
+    '''
+    tile = Tile(index, columns, rows, sharedArrays(buffer, n, workers), static, barrier)
+    while True:
+        command = connection.recv()
+        if command == None:
+            break
+        dt, substeps, settings, dragged, targets = command
+        try:
+            tile.partition()
+            for i in range(substeps):
+                tile.substep(dt / substeps, settings, dragged, targets)
+            connection.send(None)
+        except threading.BrokenBarrierError:
+            connection.send(ABORTED)
+        except Exception:
+            barrier.abort() # Wake every other worker waiting on this one
+            connection.send("A tile worker failed:\n" + traceback.format_exc())
+
+class TiledEngine:
+    '''
+    Steps an Engine's bodies with the xpbd solver split across worker processes by spatial tiles. Step this instead of the engine, then
+    sync() to copy the results back into the engine's points. The engine's settings and drags are read at every step, but its bodies,
+    walls and active region are fixed when this is created (frozen bodies stay frozen, and the region doesn't grow or shrink).
+    Contacts aren't cached between substeps, so nothing is warm started. Corrections are summed in a different order than the
+    single process solver, so results only match it up to rounding.
+    '''
+
+    def __init__(self, e: Engine, workers: int | None = None):
+        '''
+        Parameters
+        ----------
+        workers : int | None (Default = None)
+            How many worker processes (and tiles) to use. Defaults to one per core
+        '''
+        if e.solver != "xpbd":
+            raise ValueError("TiledEngine runs the xpbd solver, but the engine's solver is " + e.solver)
+        if workers == None:
+            workers = os.cpu_count()
+        self.engine: Engine = e
+        self.columns, self.rows = tileGrid(workers, e.WIDTH, e.HEIGHT)
+        n = len(e.points)
+        self.buffer = multiprocessing.RawArray("d", sharedArrays(None, n, workers))
+        self.arrays: dict[str, np.ndarray] = sharedArrays(self.buffer, n, workers)
+        self.load()
+
+        w = np.ones(n)
+        if e.active != None:
+            w[~np.isin(e.pointBody, list(e.active))] = 0
+        static = {"i0": e.constraintIndex0, "i1": e.constraintIndex1, "hard": e.constraintHard, "distance": e.constraintDistance,
+                  "spring": e.constraintSpring, "outerCount": e.outerCount, "walls": e.wallArray, "wallIndex": e.wallIndex, "w": w, "WIDTH": e.WIDTH, "HEIGHT": e.HEIGHT}
+
+        self.barrier = multiprocessing.Barrier(workers)
+        self.connections: list = []
+        self.workers: list[multiprocessing.Process] = []
+        for k in range(workers):
+            parent, child = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=runTile, args=(k, self.columns, self.rows, self.buffer, n, workers, static, self.barrier, child), daemon=True)
+            worker.start()
+            child.close()
+            self.connections.append(parent)
+            self.workers.append(worker)
+
+    def load(self):
+        '''
+        Copies the engine's point positions and velocities into shared memory, for example after moving points directly
+        '''
+        self.arrays["pos"][:] = self.engine.positions()
+        self.arrays["vel"][:] = self.engine.velocities()
+
+    def sync(self):
+        '''
+        Copies the simulated positions and velocities back into the engine's points. The engine's contacts are forgotten, since they are out of date
+        '''
+        self.engine.setState(self.arrays["pos"], self.arrays["vel"])
+        self.engine.contacts.clear()
+        self.engine.touchedContacts.clear()
+
+    def step(self, dt) -> int:
+        '''
+        Engine.step across the workers, dropping to minSubsteps while the scene is settled
+
+        Returns
+        -------
+        int
+            The number of substeps taken
+        '''
+        e = self.engine
+        substeps = e.minSubsteps if e.settled(dt) else e.substeps
+        if len(e.points) == 0:
+            return substeps
+        dragged, targets = e.dragTargets()
+        settings = {name: getattr(e, name) for name in SETTINGS}
+        with e.trace("tiled step", {"substeps": substeps, "workers": len(self.workers)}):
+            for connection in self.connections:
+                connection.send((dt, substeps, settings, dragged, targets))
+            self.wait()
+        stats = self.arrays["stats"]
+        e.maxDepth = float(stats[:, 0].max())
+        e.maxSpeed = float(stats[:, 1].max())
+        e.newContacts = int(stats[:, 2].sum())
+        e.stepped = True
+        return substeps
+
+    def wait(self):
+        '''
+        Waits for every worker to finish the step, raising if any of them failed or died
+        '''
+        pending = list(self.connections)
+        errors = []
+        while len(pending) > 0:
+            ready = multiprocessing.connection.wait(pending, timeout=1)
+            for connection in ready:
+                pending.remove(connection)
+                try:
+                    reply = connection.recv()
+                except (EOFError, OSError): # The worker died mid step
+                    worker = self.workers[self.connections.index(connection)]
+                    worker.join(1)
+                    reply = "A tile worker exited with code " + str(worker.exitcode)
+                if reply != None:
+                    errors.append(reply)
+                    self.barrier.abort() # Wake every worker still waiting on it
+        if len(errors) > 0:
+            raise RuntimeError(next((error for error in errors if error != ABORTED), errors[0]))
+
+    def metrics(self) -> Metrics:
+        '''
+        Engine.metrics for the shared state. Penetration is the deepest point contact during the last substep
+        '''
+        e = self.engine
+        vel = self.arrays["vel"]
+        e.lastMetrics = Metrics(0.5 * float((vel * vel).sum()), e.maxDepth, e.strain(self.arrays["pos"]), len(e.points))
+        return e.lastMetrics
+
+    def run(self, dt: float, maxSteps: int, convergence: Convergence | None = None, checkEvery: int = 1) -> int:
+        '''
+        Engine.run across the workers
+
+        Returns
+        -------
+        int
+            The number of steps taken
+        '''
+        for i in range(maxSteps):
+            self.step(dt)
+            if convergence != None and (i + 1) % checkEvery == 0 and convergence.check(self.metrics()):
+                return i + 1
+        return maxSteps
+
+    def close(self):
+        '''
+        Stops the workers
+        '''
+        for connection, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                connection.send(None)
+            connection.close()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def planRow(seed: int, plans: int) -> tuple[dict, Engine]:
+    '''
+    One xpbd engine holding plans generated layouts side by side, each seeded as Pipeline would with consecutive seeds, as a stand in for a large building
+
+    Returns
+    -------
+    tuple[dict, Engine]
+        The default job parameters and the engine
+    '''
+    import Pipeline
+    from Generation import Generation, defaultAdjacency
+    from Placement import seedSoftBodies
+    params = dict(Pipeline.DEFAULTS)
+    Pipeline.resetIDs()
+    bodies = []
+    for i in range(plans):
+        G = Generation(defaultAdjacency(), params["capacity"], params["anchor"]).generate(seed + i)
+        for b in seedSoftBodies(G, params["WIDTH"], params["HEIGHT"], seed=seed + i):
+            for p in b.points:
+                p.position += pg.Vector2(i * params["WIDTH"], 0)
+            bodies.append(b)
+    e = Engine(bodies, [], params["elasticity"], params["friction"], params["springDamping"], params["WIDTH"] * plans, params["HEIGHT"])
+    e.solver = "xpbd"
+    e.xpbdIterations = params["xpbdIterations"]
+    return params, e
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a layout simulation split across worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--plans", type=int, default=8, help="How many generated plans to simulate side by side as one scene")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--serial", action="store_true", help="Also time the single process xpbd solver for comparison")
+    args = parser.parse_args()
+
+    params, e = planRow(args.seed, args.plans)
+    print(str(len(e.softBodies)) + " rooms, " + str(len(e.points)) + " points")
+    if args.serial:
+        start = time.perf_counter()
+        e.run(params["dt"], args.steps)
+        print("1 process: " + str(round(time.perf_counter() - start, 2)) + " s, " + str(e.metrics()))
+        params, e = planRow(args.seed, args.plans)
+
+    with TiledEngine(e, args.workers) as tiled:
+        start = time.perf_counter()
+        tiled.run(params["dt"], args.steps)
+        print(str(args.workers) + " processes: " + str(round(time.perf_counter() - start, 2)) + " s, " + str(tiled.metrics()))
+
+if __name__ == "__main__":
+    main()
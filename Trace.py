@@ -0,0 +1,95 @@
+# Authored by Athena Osborne
+# Timeline tracing in the Chrome trace event format, for viewing in chrome://tracing or ui.perfetto.dev.
+# Events are kept as tuples in a bounded ring, so long runs keep only the most recent events, and written out as JSON on flush (and at exit).
+
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Stands in for a span when there is no tracer, so traced code can always use a with block
+NO_TRACE = contextlib.nullcontext()
+
+class Span:
+    '''
+    A with block which records a complete ("X") event covering its body
+    '''
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: dict | None):
+        self.tracer: Tracer = tracer
+        self.name: str = name
+        self.cat: str = cat
+        self.args: dict | None = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self.tracer.events.append(("X", self.name, self.cat, self.start, end - self.start, self.args))
+
+class Tracer:
+
+    def __init__(self, path: str, capacity: int = 1000000):
+        '''
+        Parameters
+        ----------
+        path : str
+            The JSON file the timeline is written to
+        capacity : int (Default = 1000000)
+            Most events kept in memory. Once full, the oldest events are dropped
+        '''
+        self.path: str = path
+        self.events: deque = deque(maxlen=capacity)
+        self.start: int = time.perf_counter_ns()
+        self.pid: int = os.getpid()
+        self.tid: int = threading.get_ident()
+        self.phaseName: str | None = None
+        self.phaseCat: str = ""
+        self.phaseStart: int = 0
+        atexit.register(self.flush)
+
+    def span(self, name: str, cat: str = "engine", args: dict | None = None) -> Span:
+        return Span(self, name, cat, args)
+
+    def phase(self, name: str | None, cat: str = "engine"):
+        '''
+        Ends the current phase, if any, as a complete event, and starts the next one. None just ends the current phase.
+        Lets a long function be split into phases without wrapping each in a with block.
+        '''
+        now = time.perf_counter_ns()
+        if self.phaseName != None:
+            self.events.append(("X", self.phaseName, self.phaseCat, self.phaseStart, now - self.phaseStart, None))
+        self.phaseName = name
+        self.phaseCat = cat
+        self.phaseStart = now
+
+    def counter(self, name: str, values: dict, cat: str = "engine"):
+        '''
+        Records a counter ("C") event. Each key of values is drawn as its own series
+        '''
+        self.events.append(("C", name, cat, time.perf_counter_ns(), 0, values))
+
+    def instant(self, name: str, cat: str = "events", args: dict | None = None):
+        self.events.append(("i", name, cat, time.perf_counter_ns(), 0, args))
+
+    def flush(self):
+        '''
+        Writes every event still in the ring to the trace file, replacing it
+        '''
+        events = []
+        for ph, name, cat, ts, dur, args in self.events:
+            event = {"ph": ph, "name": name, "cat": cat, "ts": (ts - self.start) / 1000, "pid": self.pid, "tid": self.tid}
+            if ph == "X":
+                event["dur"] = dur / 1000
+            elif ph == "i":
+                event["s"] = "t"
+            if args != None:
+                event["args"] = args
+            events.append(event)
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,72 @@
+# Authored by Athena Osborne
+# Checks that cache keys only depend on what changes a layout, and the cache's eviction order.
+
+import json
+import os
+import subprocess
+import sys
+import Cache
+import Pipeline
+
+def keys(job: dict) -> tuple[str, str]:
+    '''
+    The job's exact and graph keys, as runLayout would compute them
+    '''
+    params, G, e = Pipeline.prepare(job)
+    return Cache.cacheKey(int(job.get("seed", 0)), G, e), Cache.graphKey(G, e)
+
+def test_keysAreStable():
+    assert keys({"seed": 3}) == keys({"seed": 3})
+    # A different hash seed makes every str hash differ, which mustn't reach the keys of entries already on disk
+    script = "import Pipeline, Cache; params, G, e = Pipeline.prepare({'seed': 3}); print(Cache.cacheKey(3, G, e), Cache.graphKey(G, e))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for hashSeed in ("1", "2"):
+        out = subprocess.run([sys.executable, "-c", script], cwd=root, env={**os.environ, "PYTHONHASHSEED": hashSeed},
+                             capture_output=True, text=True, check=True).stdout
+        assert tuple(out.split()[-2:]) == keys({"seed": 3})
+
+def test_keysChangeWithTheirInputs():
+    exact, graph = keys({"seed": 3})
+    assert keys({"seed": 4})[0] != exact
+    assert keys({"seed": 3, "elasticity": 0.5})[0] != exact
+    assert keys({"seed": 3, "elasticity": 0.5})[1] != graph
+    # The same graph from another seed only shares the graph key
+    params, G, e = Pipeline.prepare({"seed": 3})
+    job = {"seed": 4, "graph": {"rooms": [G.names[t] for t in G.types], "edges": G.edges()}}
+    assert keys(job)[0] != exact
+    assert keys(job)[1] == graph
+
+def test_evictsLeastRecentlyUsed(tmp_path):
+    record = {"polygons": [[0.0] * 100]}
+    size = len(json.dumps(record, separators=(",", ":")))
+    cache = Cache.LayoutCache(str(tmp_path), maxBytes=2 * size + size // 2) # Room for two entries
+    cache.put("aa", record)
+    cache.put("bb", record)
+    os.utime(cache.path("aa"), (1, 1))
+    os.utime(cache.path("bb"), (2, 2))
+    assert cache.get("aa") == record # Reading aa makes bb the least recently used
+    cache.put("cc", record)
+    assert cache.get("bb") == None
+    assert cache.get("aa") == record
+    assert cache.get("cc") == record
+
+def test_everyEngineSettingChangesTheKey():
+    params, G, e = Pipeline.prepare({"seed": 3})
+    before = Cache.cacheKey(3, G, e)
+    for name in ("elasticity", "friction", "springDamping", "substeps", "minSubsteps", "warmStart", "settledDepth", "xpbdIterations",
+                 "implicitIterations", "implicitTolerance", "xpbdRelaxation", "hardCompliance", "wakeDepth", "sleepSpeed", "sleepSteps"):
+        value = getattr(e, name)
+        setattr(e, name, value * 2 + 1)
+        assert Cache.cacheKey(3, G, e) != before, name
+        assert Cache.graphKey(G, e) != Cache.graphKey(G, Pipeline.prepare({"seed": 3})[2]), name
+        setattr(e, name, value)
+    assert Cache.cacheKey(3, G, e) == before
+
+def test_seedsDoNotShareLayoutsUnlessDeduplicated(tmp_path):
+    cache = Cache.LayoutCache(str(tmp_path))
+    params, G, e = Pipeline.prepare({"seed": 3, "capacity": 4})
+    graph = {"rooms": [G.names[t] for t in G.types], "edges": G.edges()}
+    first = Pipeline.runLayout({"seed": 3, "graph": graph, "maxSteps": 100}, cache=cache)
+    assert Pipeline.runLayout({"seed": 7, "graph": graph, "maxSteps": 100}, cache=cache)["polygons"] != first["polygons"]
+    first = Pipeline.runLayout({"seed": 3, "graph": graph, "maxSteps": 100, "dedup": True}, cache=cache)
+    assert Pipeline.runLayout({"seed": 7, "graph": graph, "maxSteps": 100, "dedup": True}, cache=cache)["polygons"] == first["polygons"]
@@ -0,0 +1,48 @@
+# Authored by Athena Osborne
+# Checks that both export formats give back what was written, one layout at a time through their index or all in order.
+
+import numpy as np
+import pytest
+import Export
+import Pipeline
+
+def records(count: int) -> list[dict]:
+    rng = np.random.default_rng(0)
+    return [{"seed": seed,
+             "rooms": ["FOYER", "LIVING", "KITCHEN"][:seed % 3 + 1],
+             "edges": [[0, room] for room in range(1, seed % 3 + 1)],
+             "polygons": [rng.uniform(0, 800, (4 + room, 2)).tolist() for room in range(seed % 3 + 1)],
+             "metrics": {"kineticEnergy": 1.5 * seed, "maxPenetration": 0.25, "strain": 0.01, "steps": 10 * seed}}
+            for seed in range(count)]
+
+def same(a: dict, b: dict):
+    assert (a["seed"], a["rooms"], a["edges"], a["metrics"]) == (b["seed"], b["rooms"], b["edges"], b["metrics"])
+    assert len(a["polygons"]) == len(b["polygons"])
+    for p, q in zip(a["polygons"], b["polygons"]):
+        assert np.allclose(p, q, atol=1e-3) # The binary format stores vertices as float32
+
+@pytest.mark.parametrize("name", ["layouts.jsonl", "layouts.bin"])
+def test_roundTrip(tmp_path, name):
+    path = str(tmp_path / name)
+    written = records(7)
+    with Export.openWriter(path) as writer:
+        for record in written[:4]:
+            writer.write(record)
+    with Export.openWriter(path, append=True) as writer:
+        for record in written[4:]:
+            writer.write(record)
+
+    assert Export.isBinary(path) == name.endswith(".bin")
+    assert Export.count(path) == len(written)
+    for record, read in zip(written, Export.readLayouts(path)):
+        same(record, read)
+    for i in (6, 0, 4, 3):
+        same(written[i], Export.readLayout(path, i))
+
+def test_sweepWritesEachLayout(tmp_path):
+    path = str(tmp_path / "layouts.bin")
+    with Export.openWriter(path) as writer:
+        swept = list(Pipeline.sweep({"capacity": 3, "maxSteps": 100}, [0, 1, 2], writer=writer))
+    assert Export.count(path) == 3
+    for record, read in zip(swept, Export.readLayouts(path)):
+        same(record, read)
@@ -0,0 +1,86 @@
+# Authored by Athena Osborne
+# Checks that generated room graphs follow the Statistic table, are recognised up to room numbering, and that layouts are reused for such graphs.
+
+import random
+from Generation import Generation, GraphDedup, RoomGraph, defaultAdjacency
+from Pipeline import graphFromLists
+import Cache
+import Pipeline
+import Room
+
+# FOYER - LIVING - KITCHEN with DINING off LIVING, and the same graph with its rooms numbered the other way round
+ROOMS, EDGES = ["FOYER", "LIVING", "KITCHEN", "DINING"], [[0, 1], [1, 2], [1, 3]]
+RELABELLED_ROOMS, RELABELLED_EDGES = ["DINING", "KITCHEN", "LIVING", "FOYER"], [[3, 2], [2, 1], [2, 0]]
+
+def relabelled(G, seed: int):
+    '''
+    G with its rooms shuffled
+    '''
+    order = list(range(len(G)))
+    random.Random(seed).shuffle(order)
+    rooms = [None] * len(G)
+    for room, moved in enumerate(order):
+        rooms[moved] = G.names[G.types[room]]
+    return graphFromLists(rooms, [[order[a], order[b]] for a, b in G.edges()])
+
+def test_canonicalHashIgnoresRoomNumbering():
+    generator = Generation(defaultAdjacency(), 17, "FOYER")
+    for seed in range(5):
+        G = generator.generate(seed)
+        for shuffle in range(3):
+            H = relabelled(G, shuffle)
+            assert H.canonicalHash() == G.canonicalHash()
+            mapping = G.matchTo(H)
+            assert mapping != None
+            assert all(G.names[G.types[room]] == H.names[H.types[mapping[room]]] for room in range(len(G)))
+            assert sorted(tuple(sorted((mapping[a], mapping[b]))) for a, b in G.edges()) == sorted(H.edges())
+
+def test_differentGraphsDoNotMatch():
+    G = graphFromLists(ROOMS, EDGES)
+    moved = graphFromLists(ROOMS, [[0, 1], [1, 2], [2, 3]]) # DINING off KITCHEN instead
+    assert G.canonicalHash() != moved.canonicalHash()
+    assert G.matchTo(moved) == None
+
+def test_graphDedupRenumbersStoredLayouts():
+    dedup = GraphDedup()
+    G, H = graphFromLists(ROOMS, EDGES), graphFromLists(RELABELLED_ROOMS, RELABELLED_EDGES)
+    assert dedup.get(G, lambda G: [G.names[t] for t in G.types]) == ROOMS
+    assert dedup.get(H, lambda G: None) == RELABELLED_ROOMS
+    assert (dedup.hits, dedup.misses) == (1, 1)
+
+def test_sweepReusesLayoutsOfRelabelledGraphs():
+    dedup = GraphDedup()
+    records = list(Pipeline.sweep({"graph": {"rooms": ROOMS, "edges": EDGES}, "maxSteps": 200, "dedup": True}, [0, 1], dedup=dedup))
+    assert (dedup.hits, dedup.misses) == (1, 1)
+    assert [r["seed"] for r in records] == [0, 1]
+    assert records[1]["polygons"] == records[0]["polygons"]
+
+def test_cacheRenumbersLayoutsOfRelabelledGraphs(tmp_path):
+    cache = Cache.LayoutCache(str(tmp_path))
+    first = Pipeline.runLayout({"seed": 0, "graph": {"rooms": ROOMS, "edges": EDGES}, "maxSteps": 200, "dedup": True}, cache=cache)
+    second = Pipeline.runLayout({"seed": 7, "graph": {"rooms": RELABELLED_ROOMS, "edges": RELABELLED_EDGES}, "maxSteps": 200, "dedup": True}, cache=cache)
+    assert second["seed"] == 7
+    assert second["rooms"] == RELABELLED_ROOMS
+    assert second["metrics"] == first["metrics"]
+    assert [second["polygons"][3 - room] for room in range(4)] == first["polygons"]
+
+def test_generatedRoomsFollowTheStatisticTable():
+    generator = Generation(defaultAdjacency(), 17, "FOYER")
+    assert not generator.allowed[generator.ids["DINING"]] >> generator.ids["HALFBATH"] & 1 # In the adjacency graph, but neither rule allows it
+    for seed in range(20):
+        G = generator.generate(seed)
+        for a, b in G.edges():
+            assert Room.canAttach(Room.ROOM_NAMES[G.names[G.types[a]]], Room.ROOM_NAMES[G.names[G.types[b]]])
+
+def test_cacheKeepsLayoutsOfCollidingGraphs(tmp_path, monkeypatch):
+    # Make every graph hash the same, so both jobs land on one cache key
+    monkeypatch.setattr(RoomGraph, "canonicalHash", lambda self, iterations=3: "collision")
+    simulated = []
+    simulate = Pipeline.simulate
+    monkeypatch.setattr(Pipeline, "simulate", lambda params, seed, *args: simulated.append(seed) or simulate(params, seed, *args))
+    cache = Cache.LayoutCache(str(tmp_path))
+    jobs = [{"seed": 0, "graph": {"rooms": ROOMS, "edges": EDGES}, "maxSteps": 200, "dedup": True},
+            {"seed": 1, "graph": {"rooms": ROOMS, "edges": [[0, 1], [1, 2], [2, 3]]}, "maxSteps": 200, "dedup": True}]
+    for job in jobs + jobs:
+        assert Pipeline.runLayout(job, cache=cache)["edges"] == job["graph"]["edges"]
+    assert simulated == [0, 1]
@@ -0,0 +1,51 @@
+# Authored by Athena Osborne
+# Checks the room polygons, shared walls and doors read off a settled Engine.
+
+import numpy as np
+import pygame as pg
+from Physics import Engine, SoftBody
+from Pipeline import resetIDs
+import Partition
+
+def rects(centers: list[tuple[float, float]]) -> Engine:
+    '''
+    An unstepped engine with a 60x60 edgeSupportedRect at each center
+    '''
+    resetIDs()
+    return Engine([SoftBody().edgeSupportedRect(60, 60, pg.Vector2(x, y), 2, 10) for x, y in centers], [], 0.75, 0.5, 2, 1000, 800)
+
+def test_touchingRectsShareOneWall():
+    partition = Partition.extract(rects([(400, 400), (460, 400)]))
+    assert np.allclose(partition.areas, [3600, 3600])
+    assert [len(p) for p in partition.polygons] == [8, 8] # Corners and edge midpoints, in ring order
+    assert np.array_equal(np.unique(partition.wallRooms, axis=0), [[0, 1]])
+    assert np.allclose(partition.sharedLength, [[0, 60], [60, 0]])
+    assert np.allclose(partition.wallSegments[:, :, 0], 430) # Every piece of the wall runs down x = 430
+    assert np.array_equal(partition.adjacency(), [[False, True], [True, False]])
+
+    doors = partition.doors(20)
+    assert len(doors) == 1
+    assert doors[0][:2] == (0, 1)
+    assert doors[0][2][0] == 430 and 370 < doors[0][2][1] < 430
+    assert partition.doors(40) == [] # No single piece of the wall is wide enough
+
+def test_offsetRectsShareTheOverlap():
+    partition = Partition.extract(rects([(400, 400), (460, 430)]))
+    assert np.isclose(partition.sharedLength[0, 1], 30)
+    assert not partition.adjacency(30)[0, 1]
+
+def test_separateRectsShareNothing():
+    partition = Partition.extract(rects([(400, 400), (500, 400), (400, 500)]))
+    assert len(partition.wallRooms) == 0
+    assert not partition.adjacency().any()
+    assert partition.doors(1) == []
+
+def test_sharedWallsIgnoreCrossingAndSameRoomEdges():
+    p0 = np.array([[0, 0], [0, -1], [5, -5], [0, 1]], dtype=float)
+    p1 = np.array([[10, 0], [10, -1], [5, 5], [10, 1]], dtype=float)
+    owner = np.array([0, 0, 1, 2])
+    wallRooms, segments = Partition.sharedWalls(p0, p1, owner, 1.5, 0.2, 1)
+    # Only edges 0 and 3 run alongside each other closer than the gap: edge 2 crosses them, edge 1 belongs to the same room
+    # as edge 0 and is too far from edge 3
+    assert np.array_equal(wallRooms, [[0, 2]])
+    assert np.allclose(segments, [[[0, 0.5], [10, 0.5]]])
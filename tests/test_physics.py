@@ -0,0 +1,177 @@
+# Authored by Athena Osborne
+# Checks of the Engine's solvers on small scenes.
+
+import numpy as np
+import pygame as pg
+import pytest
+from Physics import Engine, SoftBody, Metrics, Convergence, PointIndex, Wall, WallIndex
+from Pipeline import resetIDs
+
+def scene(bodies: list[tuple[float, float]], solver: str = "xpbd", walls: list[Wall] | None = None) -> Engine:
+    '''
+    An engine with a 60x60 edgeSupportedRect at each (x, y)
+    '''
+    resetIDs()
+    e = Engine([SoftBody().edgeSupportedRect(60, 60, pg.Vector2(x, y), 2, 10) for x, y in bodies], [] if walls == None else walls, 0.75, 0.5, 2, 1000, 800)
+    e.solver = solver
+    return e
+
+def kineticEnergies(e: Engine, steps: int, dt: float = 1/60) -> np.ndarray:
+    '''
+    The engine's kinetic energy before stepping, then after every step
+    '''
+    energies = [e.metrics().kineticEnergy]
+    for i in range(steps):
+        e.step(dt)
+        energies.append(e.metrics().kineticEnergy)
+    return np.array(energies)
+
+def test_xpbdFreeBodyNeverGainsEnergy():
+    e = scene([(500, 400)])
+    rng = np.random.default_rng(1)
+    for p in e.points:
+        arm = p.position - pg.Vector2(500, 400)
+        p.velocity = pg.Vector2(-arm.y, arm.x) * 0.5 + pg.Vector2(*rng.normal(0, 20, 2))
+    energies = kineticEnergies(e, 200)
+    assert energies.max() <= energies[0]
+    assert energies[-1] < energies[0] / 4
+
+def test_xpbdOverlapIsNotFlungApart():
+    # Overlapping bodies at rest are pushed apart without picking up the speed of the push
+    e = scene([(400, 400), (470, 405)])
+    energies = kineticEnergies(e, 200)
+    assert energies.max() < 10 * len(e.points)
+    assert e.metrics().maxPenetration < 1
+
+def test_xpbdCollisionSettles():
+    e = scene([(400, 400), (470, 405)])
+    for p in e.points:
+        p.velocity = pg.Vector2(40 if p.position.x < 435 else -40, 0)
+    energies = kineticEnergies(e, 300)
+    assert energies[1:].max() <= energies[0]
+    assert energies[-1] < energies[0] / 100
+
+def test_xpbdCrowdSettles():
+    # Three bodies overlapping each other keep pushing apart for many substeps, none of which may add energy
+    e = scene([(400, 400), (440, 400), (420, 435)])
+    energies = kineticEnergies(e, 400)
+    assert energies.max() < 5 * len(e.points)
+    assert energies[-1] < 2 * len(e.points) # Pipeline's default convergence threshold
+
+def test_spinUpWaitsForTheEnergyToPeak():
+    energies = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2]
+    plain, spinUp = Convergence(kineticEnergy=1, patience=3), Convergence(kineticEnergy=1, patience=3, spinUp=True)
+    done = [[c.check(Metrics(ke, 0, 0, 20)) for ke in energies] for c in (plain, spinUp)]
+    assert done[0].index(True) == 2
+    assert done[1].index(True) == 15
+
+def test_freshEngineIsNotSettled():
+    e = scene([(400, 400), (470, 405)], "impulse")
+    assert not e.settled(1/60)
+    assert e.step(1/60) == e.substeps
+    e.setSoftBodies(e.softBodies)
+    assert not e.settled(1/60)
+
+def test_impulseCollisionSettles():
+    # Warm started contacts must not keep pushing once their points separate
+    e = scene([(400, 400), (490, 405)], "impulse")
+    for p in e.points:
+        p.velocity = (pg.Vector2(445, 402) - p.position).normalize() * 40
+    energies = kineticEnergies(e, 300)
+    assert energies[-1] < energies[0] / 100
+
+def test_findCollisionOnlyReturnsOverlaps():
+    e = scene([(400, 400), (455, 400)], "impulse")
+    e.step(1/60)
+    pos = np.array([(v.x, v.y) for v in e.positionVectors]) # The positions the last substep collided
+    for p in e.points:
+        found = {c.key[2] for c in e.findCollision(p) if c.key != None}
+        overlapping = set(np.flatnonzero(np.linalg.norm(pos - pos[p.id], axis=1) < 2 * p.radius)) - {p.id}
+        assert found == overlapping
+
+def test_bodiesMustBeNumberedFromZero():
+    e = scene([(400, 400)])
+    stale = SoftBody().edgeSupportedRect(60, 60, pg.Vector2(600, 400), 2, 10) # Numbered after the scene's points, without a reset
+    with pytest.raises(ValueError):
+        e.setSoftBodies([stale])
+    e.setSoftBodies(e.softBodies + [stale])
+    assert [p.id for p in e.points] == list(range(len(e.points)))
+    assert np.array_equal(e.positions()[-1], [stale.points[-1].position.x, stale.points[-1].position.y])
+
+def test_pointIndexSkipsNonFinitePositions():
+    pos = np.array([[10, 10], [np.nan, 5], [12, 11], [np.inf, -np.inf], [1e300, 3], [500, 500]], dtype=float)
+    index = PointIndex(pos, 20)
+    assert list(index.near(pg.Vector2(10, 10))) == [0, 2]
+    assert len(index.near(pg.Vector2(float("nan"), 0))) == 0
+    assert list(index.near(pg.Vector2(1e300, 3))) == [4]
+
+def test_blownUpImpulseRunKeepsStepping():
+    e = scene([(400, 400), (455, 400)], "impulse")
+    e.points[0].position = pg.Vector2(float("nan"), float("nan"))
+    e.step(1/60)
+    assert np.isfinite(e.positions()[len(e.points) // 2:]).all() # The other body never touches the blown up one
+
+def footprint() -> list[Wall]:
+    '''
+    A vertical wall at x = 500 built from many short segments, like one side of a detailed building footprint
+    '''
+    return [Wall(pg.Vector2(500, y), pg.Vector2(500, y + 10), 3) for y in range(0, 800, 10)]
+
+@pytest.mark.parametrize("solver", ["impulse", "implicit", "xpbd"])
+def test_wallsStopPoints(solver):
+    e = scene([(400, 400)], solver, footprint())
+    for p in e.points:
+        p.velocity = pg.Vector2(150, 0)
+    for i in range(120):
+        e.step(1/60)
+    assert e.positions()[:, 0].max() < 500
+    assert e.velocities()[:, 0].mean() < 150 / 2 # Bounced or stopped rather than sliding through
+
+def test_wallIndexPairsMatchEveryWall():
+    rng = np.random.default_rng(0)
+    walls = [Wall(pg.Vector2(*rng.uniform(0, 500, 2)), pg.Vector2(*rng.uniform(0, 500, 2)), float(rng.uniform(1, 5))) for i in range(60)]
+    index = WallIndex(walls, 2)
+    pos = np.concatenate((rng.uniform(-50, 550, (300, 2)), [[np.nan, 0], [1e300, 1e300]]))
+    for reach in (2, 7, 30):
+        found = {tuple(pair) for pair in index.pairs(pos, np.arange(len(pos)), reach).tolist()}
+        for i, p in enumerate(pos[:300]):
+            for j, w in enumerate(walls):
+                if pg.Vector2(*p).distance_to(w.closestPoint(pg.Vector2(*p))) <= w.radius + reach:
+                    assert (i, j) in found
+
+def stiffRect(solver: str) -> Engine:
+    '''
+    A 100x100 edgeSupportedRect with springConst 5000 inner springs, stretched by a tenth, taking one substep per step. The rect is large enough
+    that its points don't touch its own edges, so only the springs move it
+    '''
+    resetIDs()
+    e = Engine([SoftBody().edgeSupportedRect(100, 100, pg.Vector2(400, 400), 2, 5000)], [], 0.75, 0.5, 2, 1000, 800)
+    e.solver = solver
+    e.substeps = e.minSubsteps = 1
+    for p in e.points:
+        p.position = pg.Vector2(400, 400) + (p.position - pg.Vector2(400, 400)) * 1.1
+    return e
+
+def test_implicitSpringsSettleWhereImpulsesBlowUp():
+    implicit = kineticEnergies(stiffRect("implicit"), 120, 1/30)
+    assert implicit[-1] < 1e-6
+    impulse = kineticEnergies(stiffRect("impulse"), 10, 1/30) # Stopped before the points pile on top of each other
+    assert impulse[-1] > 1e12
+
+def test_regionSettlesWithoutMovingFarBodies():
+    # Body 0 rests against body 1, while body 2 stands well apart. Growing body 0 should only resettle its neighbourhood
+    e = scene([(400, 400), (465, 400), (700, 400)])
+    kineticEnergies(e, 60)
+    e.freeze()
+    before = [[tuple(p.position) for p in b.points] for b in e.softBodies]
+    e.scaleSoftBody(0, 1.2)
+    assert e.active == {0, 1}
+    woken = set(e.active)
+    for i in range(2000):
+        if not e.active:
+            break
+        e.step(1/60)
+        woken |= e.active
+    assert e.active == set()
+    assert woken == {0, 1}
+    assert [tuple(p.position) for p in e.softBodies[2].points] == before[2]
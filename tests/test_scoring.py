@@ -0,0 +1,35 @@
+# Authored by Athena Osborne
+# Checks the batch scores of small hand made layouts whose overlap, coverage and adjacency are known.
+
+import numpy as np
+import Scoring
+
+def squares(layouts: list[list[tuple[float, float]]], required: list[list[tuple[int, int]]]) -> Scoring.LayoutBatch:
+    '''
+    A batch of 2x2 layouts of unit squares, each given by its lower left corner, with the given room graph connections per layout
+    '''
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+    rooms = [np.array(c) + corners for layout in layouts for c in layout]
+    roomLayout = np.repeat(np.arange(len(layouts)), [len(layout) for layout in layouts])
+    offsets = np.concatenate(([0], np.cumsum([len(layout) for layout in layouts])[:-1]))
+    pairs = [(a + offset, b + offset) for offset, connections in zip(offsets, required) for a, b in connections]
+    return Scoring.LayoutBatch(np.concatenate(rooms), np.full(len(rooms), 4), roomLayout, np.ones(len(rooms)),
+                               np.array(pairs, dtype=int), 2, 2)
+
+def test_coverageCountsOverlapByHalf():
+    # Two unit squares overlapping by half: the middle half square is covered twice
+    counts = Scoring.coverage(squares([[(0, 0), (0.5, 0)]], [[]]), 0.25)
+    assert counts.shape == (1, 8, 8)
+    assert np.array_equal(counts[0, :4, :6], np.repeat([[1, 1, 2, 2, 1, 1]], 4, axis=0))
+    assert counts[0, 4:].sum() == 0 and counts[0, :, 6:].sum() == 0
+
+def test_scoreMeasuresOverlapAndAdjacency():
+    # Layout 0 overlaps by half. In layout 1, room 0 touches room 1 but is required to touch room 2 as well, which stands apart
+    batch = squares([[(0, 0), (0.5, 0)], [(0, 0), (1, 0), (0.5, 1.5)]], [[], [(0, 1), (0, 2)]])
+    scores = Scoring.score(batch, {**Scoring.WEIGHTS, "overlap": 2}, cell=0.25, gap=0.1, minLength=0.1)
+    assert np.allclose(scores.areaError, [0, 0])
+    assert np.allclose(scores.overlap, [0.5 / 2, 0])
+    assert np.allclose(scores.utilisation, [1.5 / 4, 2.5 / 4]) # Room 2 of layout 1 pokes out above the top by half
+    assert np.allclose(scores.adjacency, [1, 0.5])
+    assert np.allclose(scores.total, [2 * 0.25 + 1 - 0.375, 1 - 0.5 + 1 - 0.625])
+    assert list(scores.ranked()) == [1, 0]
@@ -0,0 +1,49 @@
+# Authored by Athena Osborne
+# Checks of the layout service's job dispatch.
+
+import asyncio
+import Export
+from Service import Service
+
+def test_dispatchSkipsJobsWhoseClientLeft():
+    async def run():
+        service = Service(1, 4)
+        try:
+            dispatcher = asyncio.create_task(service.dispatch())
+            stream: asyncio.Queue = asyncio.Queue()
+            service.streams[1] = stream
+            service.jobs.put_nowait((0, {"seed": 0, "capacity": 2})) # Its client disconnected while it was queued
+            service.jobs.put_nowait((1, {"seed": 0, "capacity": 2}))
+            event = await asyncio.wait_for(stream.get(), 120)
+            await asyncio.wait_for(service.jobs.join(), 10)
+            assert not dispatcher.done()
+            dispatcher.cancel()
+            return event
+        finally:
+            service.pool.shutdown(cancel_futures=True)
+            service.manager.shutdown()
+
+    event = asyncio.run(run())
+    assert event["event"] == "result"
+    assert event["layout"]["seed"] == 0
+
+def test_finishedLayoutsAreExported(tmp_path):
+    path = str(tmp_path / "layouts.jsonl")
+
+    async def run():
+        service = Service(1, 4, exportPath=path)
+        try:
+            dispatcher = asyncio.create_task(service.dispatch())
+            for jobID in range(2):
+                service.streams[jobID] = asyncio.Queue()
+                service.jobs.put_nowait((jobID, {"seed": jobID, "capacity": 2}))
+            await asyncio.wait_for(service.jobs.join(), 120)
+            dispatcher.cancel()
+        finally:
+            service.pool.shutdown(cancel_futures=True)
+            service.manager.shutdown()
+            service.exporter.close()
+
+    asyncio.run(run())
+    assert [record["seed"] for record in Export.readLayouts(path)] == [0, 1]
+    assert Export.readLayout(path, 1)["seed"] == 1
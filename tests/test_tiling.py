@@ -0,0 +1,38 @@
+# Authored by Athena Osborne
+# Checks that splitting the xpbd solver across tiles doesn't change its results.
+
+import numpy as np
+import pygame as pg
+import Pipeline
+import Tiling
+from Physics import Engine, SoftBody, Wall
+
+def test_tiledEngineMatchesEngine():
+    params, G, e = Pipeline.prepare({"seed": 3, "solver": "xpbd"})
+    params, G, tiled = Pipeline.prepare({"seed": 3, "solver": "xpbd"})
+    with Tiling.TiledEngine(tiled, 4) as runner:
+        for i in range(20):
+            e.step(params["dt"])
+            runner.step(params["dt"])
+        runner.sync()
+    assert np.abs(e.positions() - tiled.positions()).max() < 1e-9
+    assert np.abs(e.velocities() - tiled.velocities()).max() < 1e-9
+
+def test_tiledEngineMatchesEngineAgainstWalls():
+    def engine() -> Engine:
+        Pipeline.resetIDs()
+        walls = [Wall(pg.Vector2(500, y), pg.Vector2(500, y + 10), 3) for y in range(0, 800, 10)]
+        e = Engine([SoftBody().edgeSupportedRect(60, 60, pg.Vector2(x, y), 2, 10) for x in (380, 440) for y in (300, 400, 500)], walls, 0.75, 0.5, 2, 1000, 800)
+        e.solver = "xpbd"
+        for p in e.points:
+            p.velocity = pg.Vector2(150, 0)
+        return e
+
+    e, tiled = engine(), engine()
+    with Tiling.TiledEngine(tiled, 4) as runner:
+        for i in range(60):
+            e.step(1/60)
+            runner.step(1/60)
+        runner.sync()
+    assert e.positions()[:, 0].max() < 500
+    assert np.abs(e.positions() - tiled.positions()).max() < 1e-9